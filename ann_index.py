@@ -0,0 +1,207 @@
+"""
+Indeks approximate nearest neighbour (IVF) untuk galeri wajah besar.
+Embedding dibagi ke partisi hasil k-means (spherical) pada embedding ter-normalisasi;
+query hanya dibandingkan ke embedding di `nprobe` partisi terdekat.
+Semantik strategi tetap: closest (embedding terbaik), voting (terbaik per identitas),
+centroid (identitas kandidat dinilai dengan centroid penuh).
+"""
+import copy
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from face_db import normalize_rows, top_k_columns
+
+# Maksimal elemen matriks skor (query x kandidat) per chunk pencarian (~32 MB float32)
+_SEARCH_BUDGET = 8_000_000
+
+
+def default_nlist(n_rows: int) -> int:
+    """Jumlah partisi default: ~sqrt(N), minimal 1."""
+    return max(1, int(np.sqrt(max(n_rows, 1))))
+
+
+def assign_to_lists(matrix: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Partisi terdekat (inner product) untuk tiap baris, diproses per chunk agar hemat memori."""
+    out = np.empty(len(matrix), dtype=np.int32)
+    for s in range(0, len(matrix), chunk):
+        out[s:s + chunk] = np.argmax(np.asarray(matrix[s:s + chunk], dtype=np.float32) @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted file index: centroid partisi (nlist, D) + daftar baris per partisi.
+    Baris merujuk ke baris matriks GalleryIndex (sudah ter-normalisasi).
+    """
+
+    def __init__(self, centroids: np.ndarray, assign: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        # Assignment per baris dalam buffer berkapasitas (add tidak menyalin ulang seluruh array tiap kali)
+        self._assign = np.array(assign, dtype=np.int32)
+        self._n = len(self._assign)
+        self._build_lists()
+
+    @property
+    def assign(self) -> np.ndarray:
+        return self._assign[:self._n]
+
+    def _build_lists(self) -> None:
+        assign = self.assign
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self.lists: List[np.ndarray] = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def copy(self) -> "IVFIndex":
+        """Salinan untuk add tanpa mengubah daftar partisi yang sedang dibaca (buffer assignment dipakai bersama)."""
+        out = copy.copy(self)
+        out.lists = list(self.lists)
+        return out
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        nlist: Optional[int] = None,
+        iters: int = 10,
+        sample_per_list: int = 64,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Latih partisi dengan spherical k-means pada sampel baris, lalu assign semua baris.
+        - matrix: embedding ter-normalisasi (M, D); boleh matriks terkuantisasi (float16/int8 berskala
+          per baris), karena sampel dinormalisasi ulang dan assignment tidak bergantung skala baris
+        - nlist: jumlah partisi (default ~sqrt(M))
+        """
+        n = len(matrix)
+        nlist = min(nlist or default_nlist(n), n)
+        rng = np.random.default_rng(seed)
+        n_sample = min(n, nlist * sample_per_list)
+        sample = matrix[rng.choice(n, n_sample, replace=False)] if n_sample < n else matrix
+        sample = normalize_rows(np.asarray(sample, dtype=np.float32))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iters):
+            a = assign_to_lists(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, a, sample)
+            counts = np.bincount(a, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Partisi kosong diisi ulang dengan baris acak
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums)
+        return cls(centroids, assign_to_lists(matrix, centroids))
+
+    def add(self, rows: np.ndarray) -> None:
+        """
+        Tambah baris baru (ter-normalisasi) di akhir matriks galeri; centroid partisi tidak dilatih ulang.
+        Hanya daftar partisi yang menerima baris baru yang diperbarui (tanpa mengurutkan ulang semua baris).
+        """
+        if len(rows) == 0:
+            return
+        new = assign_to_lists(rows, self.centroids)
+        n_new = self._n + len(new)
+        if n_new > len(self._assign):
+            buf = np.empty(max(n_new, 2 * len(self._assign), 1024), dtype=np.int32)
+            buf[:self._n] = self.assign
+            self._assign = buf
+        self._assign[self._n:n_new] = new
+        ids = np.arange(self._n, n_new, dtype=np.int64)
+        self._n = n_new
+        order = np.argsort(new, kind="stable")
+        parts, starts = np.unique(new[order], return_index=True)
+        for p, group in zip(parts, np.split(ids[order], starts[1:])):
+            self.lists[p] = np.concatenate([self.lists[p], group])
+
+    def _probes(self, queries_norm: np.ndarray, nprobe: int) -> np.ndarray:
+        return top_k_columns(queries_norm @ self.centroids.T, max(1, min(nprobe, self.nlist)))
+
+    def candidates(self, queries_norm: np.ndarray, nprobe: int) -> List[np.ndarray]:
+        """Baris kandidat per query: gabungan daftar dari `nprobe` partisi terdekat."""
+        return [np.concatenate([self.lists[p] for p in row]) for row in self._probes(queries_norm, nprobe)]
+
+    def search(
+        self,
+        gallery,
+        queries_norm: np.ndarray,
+        strategy: str,
+        top_k: int = 1,
+        nprobe: int = 8,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k approximate untuk batch query (N, D) terhadap `gallery` (GalleryIndex).
+        Semua query dalam satu chunk dinilai sekaligus terhadap gabungan kandidatnya (satu perkalian
+        matriks); baris di luar partisi yang di-probe query tersebut di-mask.
+        Returns: (label (N, k), similarity (N, k)); slot tanpa kandidat berisi label -1, similarity 0.
+        """
+        n = queries_norm.shape[0]
+        labels_out = np.full((n, top_k), -1, dtype=np.int32)
+        sims_out = np.zeros((n, top_k), dtype=np.float32)
+        probes = self._probes(queries_norm, nprobe)
+        sizes = np.array([len(lst) for lst in self.lists], dtype=np.int64)
+        # Batasi ukuran matriks skor (query x kandidat gabungan) per chunk
+        per_query = int(sizes[probes].sum(axis=1).max()) if n else 0
+        step = max(1, _SEARCH_BUDGET // max(per_query, 1))
+        for s in range(0, n, step):
+            self._search_chunk(gallery, queries_norm[s:s + step], probes[s:s + step], strategy,
+                               labels_out[s:s + step], sims_out[s:s + step])
+        return labels_out, sims_out
+
+    def _search_chunk(self, gallery, queries, probes, strategy, labels_out, sims_out) -> None:
+        parts = np.unique(probes)
+        cand = np.concatenate([self.lists[p] for p in parts])
+        if len(cand) == 0:
+            return
+        # mask[i, j]: kandidat j ada di partisi yang di-probe query i
+        probed = np.zeros((len(queries), self.nlist), dtype=bool)
+        np.put_along_axis(probed, probes, True, axis=1)
+        mask = probed[:, self.assign[cand]]
+        col_labels = gallery.labels[cand]
+        if strategy == "centroid":
+            # Identitas kandidat per query dinilai dengan centroid penuh
+            order = np.argsort(col_labels, kind="stable")
+            col_labels, mask = col_labels[order], mask[:, order]
+            starts = np.flatnonzero(np.r_[True, col_labels[1:] != col_labels[:-1]])
+            mask = np.logical_or.reduceat(mask, starts, axis=1)
+            col_labels = col_labels[starts]
+            sims = np.clip(queries @ gallery.centroid_rows(col_labels).T, 0.0, 1.0)
+        else:
+            sims = np.clip(queries @ gallery.rows(cand).T, 0.0, 1.0)
+            if strategy == "voting":
+                # Similarity terbaik per identitas di antara kandidat
+                order = np.argsort(col_labels, kind="stable")
+                col_labels, sims, mask = col_labels[order], sims[:, order], mask[:, order]
+                sims = np.where(mask, sims, -1.0)
+                starts = np.flatnonzero(np.r_[True, col_labels[1:] != col_labels[:-1]])
+                sims = np.maximum.reduceat(sims, starts, axis=1)
+                mask = np.logical_or.reduceat(mask, starts, axis=1)
+                col_labels = col_labels[starts]
+        sims = np.where(mask, sims, -1.0)
+        k = min(labels_out.shape[1], sims.shape[1])
+        cols = top_k_columns(sims, k)
+        best = np.take_along_axis(sims, cols, axis=1)
+        found = best >= 0.0
+        labels_out[:, :k] = np.where(found, col_labels[cols], -1)
+        sims_out[:, :k] = np.where(found, best, 0.0)
+
+    def save(self, path: str, fingerprint: str) -> None:
+        """
+        Simpan centroid + assignment per baris (urutan record di database).
+        `fingerprint` mengenali isi database yang tercakup (lihat face_db).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, centroids=self.centroids, assign=self.assign, fingerprint=np.array(fingerprint))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str) -> Optional[Tuple[np.ndarray, np.ndarray, str]]:
+        """Muat (centroids, assignment per baris, fingerprint); None jika tidak ada/rusak."""
+        try:
+            with np.load(path) as data:
+                return data["centroids"], data["assign"], str(data["fingerprint"])
+        except Exception:
+            return None
@@ -2,27 +2,106 @@
 """
 Aplikasi Face Recognition - CLI.
 Perintah:
-  - register: daftarkan wajah dari gambar atau folder
+  - register: daftarkan wajah dari gambar, folder, atau seluruh tree known_faces
+  - sync: sinkronkan database dengan known_faces (hanya file baru/berubah/terhapus)
   - recognize: kenali wajah dari gambar
   - verify: bandingkan dua gambar (apakah wajah sama)
-  - webcam: deteksi & kenali wajah dari webcam
+  - webcam: deteksi & kenali wajah dari webcam atau file video (opsional dengan tracking)
+  - video: pipeline bertahap untuk webcam/file/RTSP, bisa headless (event JSON)
+  - serve-streams: layanan banyak kamera dalam satu proses (model & galeri dimuat sekali)
+  - serve: HTTP API (recognize / verify / register / identities) dengan model tetap dimuat
+  - cache: statistik / kosongkan cache embedding
   - remove: hapus satu identitas dari database
+Opsi global (sebelum nama perintah): --timing, --metrics, --metrics-out FILE, --profile FILE
 """
 import argparse
 import os
 import sys
-import cv2
 import config
 import face_db
-import recognition_engine as engine
+import metrics
+
+# recognition_engine (DeepFace/TensorFlow, OpenCV) diimpor di dalam perintah yang melakukan inferensi saja,
+# agar perintah database (list, remove, cache) langsung jalan.
+
+
+def _print_enroll_progress(stats):
+    done, total = stats["images"], stats["total"]
+    if done == total or done % 25 == 0:
+        print(
+            f"  [{done}/{total}] {stats['images_per_sec']:.1f} gambar/detik, {stats['faces']} wajah",
+            flush=True,
+        )
+
+
+def _print_detector_stats(stats, out=sys.stdout):
+    """Pemakaian tingkat cascade detektor per jalur (hanya dicetak jika cascade benar-benar dipakai)."""
+    for mode, st in stats.items():
+        if len(st["tiers"]) < 2 and not st["fallback"]:
+            continue
+        total = sum(st["tiers"].values()) or 1
+        tiers = ", ".join(f"{backend} {n} ({100.0 * n / total:.0f}%)" for backend, n in st["tiers"].items())
+        print(f"Detektor ({mode}): {tiers}", file=out)
+        if st["fallback"]:
+            reasons = ", ".join(f"{key} {n}" for key, n in sorted(st["fallback"].items()))
+            print(f"  lanjut ke tingkat berikutnya: {reasons}", file=out)
+
+
+def _print_quality_stats(stats, out=sys.stdout):
+    """Wajah yang dibuang penyaringan kualitas sebelum embedding, per jalur dan alasan."""
+    for mode, st in stats.items():
+        dropped = sum(st["dropped"].values())
+        if not dropped:
+            continue
+        reasons = ", ".join(f"{reason} {n}" for reason, n in sorted(st["dropped"].items(), key=lambda kv: -kv[1]))
+        print(f"Kualitas ({mode}): {st['passed']} wajah lolos, {dropped} dibuang ({reasons})", file=out)
+
+
+def _print_identity_cache_stats(stats, out=sys.stdout):
+    """Wajah video yang memakai identitas dari cache (embedding dihemat) vs dikenali penuh."""
+    total = stats.get("hits", 0) + stats.get("misses", 0)
+    if not total:
+        return
+    print(
+        f"Cache identitas: {stats['hits']} dari {total} wajah tanpa embedding ({100 * stats['hits'] / total:.0f}%); "
+        f"dikenali penuh: {stats['misses']} (refresh TTL {stats['refreshes']}), entri dibuang: {stats['evictions']}",
+        file=out,
+    )
 
 
 def cmd_register(args):
-    if args.folder:
+    import quality
+    import recognition_engine as engine
+
+    if args.tree:
+        stats = engine.register_tree(
+            args.tree,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            augment=getattr(args, "augment", None),
+            progress=_print_enroll_progress,
+            force=args.force,
+        )
+        by_id = stats["by_identity"]
+        print(f"Terdaftar: {stats['embeddings']} embedding, {len(by_id)} orang dari '{args.tree}'.")
+        for name in sorted(by_id):
+            print(f"  - {name}: {by_id[name]} embedding")
+        print(
+            f"{stats['images']} gambar dalam {stats['seconds']:.1f} detik "
+            f"({stats['images_per_sec']:.1f} gambar/detik); "
+            f"tanpa wajah: {stats['no_face']}, ditolak (kualitas): {stats['rejected']}, gagal: {stats['errors']}"
+        )
+        if stats["skipped"] or stats["cached"]:
+            print(
+                f"Dilewati (sudah terdaftar): {stats['skipped']}, dari cache embedding: {stats['cached']}"
+                + (" (pakai --force untuk mendaftarkan ulang)" if stats["skipped"] else "")
+            )
+    elif args.folder:
         count = engine.register_face_from_folder(
             args.folder,
             args.name,
             augment=getattr(args, "augment", None),
+            force=args.force,
         )
         name = args.name or os.path.basename(os.path.normpath(args.folder))
         print(f"Terdaftar: {count} embedding dari folder '{args.folder}' sebagai '{name}'.")
@@ -35,13 +114,50 @@ def cmd_register(args):
         if count > 0:
             print(f"Berhasil mendaftarkan {count} wajah.")
         else:
-            print("Gagal (pastikan file ada dan berisi wajah).")
+            print("Gagal (pastikan file ada dan berisi wajah yang cukup besar, tajam, dan menghadap kamera).")
     else:
-        print("Untuk register: berikan --image PATH --name NAMA, atau --folder PATH [--name NAMA].")
+        print("Untuk register: berikan --image PATH --name NAMA, --folder PATH [--name NAMA], atau --tree PATH.")
+        sys.exit(1)
+    _print_detector_stats(engine.detector_stats())
+    _print_quality_stats(quality.stats())
+
+
+def cmd_sync(args):
+    import quality
+    import recognition_engine as engine
+
+    root = args.tree or config.KNOWN_FACES_DIR
+    if not os.path.isdir(root):
+        print(f"Folder tidak ditemukan: {root}")
         sys.exit(1)
+    stats = engine.sync_tree(
+        root,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        augment=args.augment,
+        dry_run=args.dry_run,
+        progress=_print_enroll_progress,
+    )
+    prefix = "Rencana sinkronisasi" if args.dry_run else "Sinkronisasi selesai"
+    print(
+        f"{prefix} '{root}' ({stats['files']} file, {stats['seconds']:.1f} detik): "
+        f"baru {stats['new']}, berubah {stats['changed']}, dihapus {stats['deleted']}, "
+        f"dipindah {stats['moved']}, pindah identitas {stats['relabeled']}, tetap {stats['unchanged']}"
+    )
+    print(
+        f"  Embedding: +{stats['records_added']} / -{stats['records_removed']}, "
+        f"metadata diperbarui: {stats['records_updated']}"
+    )
+    enroll = stats.get("enroll")
+    if enroll and (enroll["no_face"] or enroll["rejected"] or enroll["errors"]):
+        print(f"  Tanpa wajah: {enroll['no_face']}, ditolak (kualitas): {enroll['rejected']}, gagal: {enroll['errors']}")
+    _print_detector_stats(engine.detector_stats())
+    _print_quality_stats(quality.stats())
 
 
 def cmd_recognize(args):
+    import recognition_engine as engine
+
     path = args.image
     if not path or not os.path.isfile(path):
         print("Berikan path gambar yang valid (--image PATH).")
@@ -56,9 +172,68 @@ def cmd_recognize(args):
         print(f"Wajah {i+1}: {identity} (similarity: {sim:.3f})")
 
 
+def _read_pairs_csv(path):
+    """Pasangan (gambar1, gambar2) dari CSV; header opsional, path relatif terhadap folder CSV."""
+    import csv
+
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or not row[0].strip() or row[0].startswith("#"):
+                continue
+            p1, p2 = row[0].strip(), row[1].strip()
+            if not pairs and p1.lower() in ("image1", "img1", "probe"):
+                continue
+            pairs.append(tuple(p if os.path.isabs(p) else os.path.join(base, p) for p in (p1, p2)))
+    return pairs
+
+
+def _print_verify_progress(done, total):
+    if done == total or done % 100 == 0:
+        print(f"  [{done}/{total}] gambar unik di-embed", file=sys.stderr, flush=True)
+
+
 def cmd_verify(args):
+    import recognition_engine as engine
+
+    if args.pairs or args.references:
+        import csv
+
+        if args.pairs:
+            pairs = _read_pairs_csv(args.pairs)
+        else:
+            if not args.image1:
+                print("Mode 1:N: berikan --image1 PATH (probe) dan --references PATH...")
+                sys.exit(1)
+            refs = []
+            for r in args.references:
+                refs.extend(engine.list_images(r) if os.path.isdir(r) else [r])
+            pairs = [(args.image1, r) for r in refs]
+        results = engine.verify_pairs(
+            pairs, workers=args.workers or 0, progress=_print_verify_progress
+        )
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        try:
+            writer = csv.writer(out)
+            writer.writerow(["image1", "image2", "verified", "distance", "similarity", "error"])
+            for r in results:
+                dist = "" if r["distance"] is None else f"{r['distance']:.4f}"
+                sim = "" if r["similarity"] is None else f"{r['similarity']:.4f}"
+                writer.writerow([r["image1"], r["image2"], r["verified"], dist, sim, r["error"] or ""])
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        n_ok = sum(r["verified"] for r in results)
+        n_err = sum(1 for r in results if r["error"])
+        print(
+            f"{len(results)} pasangan: {n_ok} cocok, {len(results) - n_ok - n_err} tidak cocok, {n_err} error "
+            f"(threshold: {engine.verify_threshold():.4f})",
+            file=sys.stderr,
+        )
+        return
     if not args.image1 or not args.image2:
-        print("Berikan --image1 PATH dan --image2 PATH.")
+        print("Berikan --image1 PATH dan --image2 PATH (atau --references / --pairs).")
         sys.exit(1)
     try:
         result = engine.verify_two_faces(args.image1, args.image2)
@@ -73,24 +248,197 @@ def cmd_verify(args):
 
 
 def cmd_webcam(args):
-    cap = cv2.VideoCapture(args.camera)
+    import cv2
+    import identity_cache
+    import quality
+    import recognition_engine as engine
+
+    source = args.video if args.video else args.camera
+    cap = cv2.VideoCapture(source)
     if not cap.isOpened():
-        print("Tidak dapat membuka kamera.")
+        print("Tidak dapat membuka kamera." if not args.video else f"Tidak dapat membuka video: {args.video}")
         sys.exit(1)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
-    print("Webcam aktif. Tekan 'q' untuk keluar.")
+    if not args.video:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
+    tracker = cache = None
+    if args.track:
+        import video
+        tracker = video.TrackingRecognizer(detect_every=args.detect_every)
+    else:
+        # Dengan --track, TrackingRecognizer membuat cache identitasnya sendiri untuk frame deteksi
+        cache = identity_cache.create()
+    writer = None
+    display = not args.no_display
+    if display:
+        print("Webcam aktif. Tekan 'q' untuk keluar.")
     while True:
         ret, frame = cap.read()
         if not ret:
             break
-        recognitions = engine.recognize(frame)
+        recognitions = tracker.process(frame) if tracker else engine.recognize(frame, mode="video", identity_cache=cache)
         frame = engine.draw_results(frame, recognitions)
-        cv2.imshow("Face Recognition", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+        if args.output:
+            if writer is None:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+            writer.write(frame)
+        if display:
+            cv2.imshow("Face Recognition", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
     cap.release()
-    cv2.destroyAllWindows()
+    if writer is not None:
+        writer.release()
+    if display:
+        cv2.destroyAllWindows()
+    if tracker:
+        print(f"{tracker.frames} frame, deteksi + pengenalan pada {tracker.detections} frame.")
+    _print_detector_stats(engine.detector_stats())
+    _print_quality_stats(quality.stats())
+    _print_identity_cache_stats(identity_cache.stats())
+
+
+def _print_stage_stats(result, out=sys.stdout):
+    c = result["counters"]
+    print(
+        f"{c['captured']} frame ditangkap, {c['processed']} diproses, {c['emitted']} dikeluarkan "
+        f"({result['fps']:.1f} FPS); dibuang: {result['dropped']['frames']} frame, "
+        f"{result['dropped']['results']} hasil, {c['late']} terlambat",
+        file=out,
+    )
+    print(f"  {'tahap':<12}{'n':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}", file=out)
+    for stage, st in result["stages"].items():
+        print(
+            f"  {stage:<12}{st['count']:>7}{st['mean_ms']:>10.1f}{st['p50_ms']:>10.1f}"
+            f"{st['p95_ms']:>10.1f}{st['max_ms']:>10.1f}",
+            file=out,
+        )
+    _print_detector_stats(result.get("detectors", {}), out=out)
+    _print_quality_stats(result.get("quality", {}), out=out)
+    _print_identity_cache_stats(result.get("identity_cache", {}), out=out)
+
+
+def cmd_video(args):
+    import video
+
+    events = None
+    if args.events == "-":
+        events = sys.stdout
+    elif args.events:
+        events = open(args.events, "a", encoding="utf-8")
+    pipeline = video.VideoPipeline(
+        args.source,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        display=args.display,
+        output_path=args.output,
+        events=events,
+        track=args.track,
+        detect_every=args.detect_every,
+        max_frames=args.max_frames,
+    )
+    try:
+        result = pipeline.run()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pipeline.stop()
+        return
+    finally:
+        if events is not None and events is not sys.stdout:
+            events.close()
+    # Statistik ke stderr jika event JSON ditulis ke stdout
+    _print_stage_stats(result, out=sys.stderr if events is sys.stdout else sys.stdout)
+
+
+def cmd_serve_streams(args):
+    import json
+    import stream_server
+
+    events = None
+    if args.events == "-":
+        events = sys.stdout
+    elif args.events:
+        events = open(args.events, "a", encoding="utf-8")
+    stats_out = sys.stderr if events is sys.stdout else sys.stdout
+    server = stream_server.StreamServer(
+        args.source,
+        max_batch=args.max_batch,
+        max_latency_ms=args.max_latency_ms,
+        events=events,
+    )
+
+    def tick(counters):
+        print(
+            f"[{counters['seconds']:.0f}s] {counters['frames_per_sec']:.1f} frame/detik, "
+            f"{counters['faces_per_sec']:.1f} wajah/detik, "
+            f"rata-rata batch {counters['batcher'].get('mean_batch', 0):.1f}",
+            file=stats_out,
+            flush=True,
+        )
+
+    try:
+        server.start()
+        server.wait(args.duration, on_tick=tick, tick_seconds=args.stats_every)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if events is not None and events is not sys.stdout:
+            events.close()
+    print(json.dumps(server.counters(), indent=2), file=stats_out)
+
+
+def cmd_serve(args):
+    import http_api
+
+    def ready(host, port):
+        print(f"HTTP API siap di http://{host}:{port} (Ctrl+C untuk berhenti)", flush=True)
+
+    print("Memuat model dan galeri...", flush=True)
+    try:
+        http_api.run(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            max_batch=args.max_batch,
+            max_latency_ms=args.max_latency_ms,
+            ready=ready,
+        )
+    except OSError as e:
+        print(f"Gagal menjalankan server: {e}")
+        sys.exit(1)
+
+
+def cmd_cache(args):
+    import json
+    import embedding_cache
+
+    cache = embedding_cache.get_cache()
+    if cache is None:
+        print("Cache embedding nonaktif (config.EMBED_CACHE_ENABLED = False).")
+        return
+    if args.clear:
+        cache.clear()
+        print(f"Cache embedding dikosongkan: {cache.path}")
+        return
+    stats = cache.stats()
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    total = stats["total"]
+    print(f"Cache embedding: {cache.path}")
+    print(f"  Entri: {stats['entries']} / {stats['max_entries']} ({stats['file_bytes'] / 1e6:.1f} MB)")
+    print(
+        f"  Hit: {total['hits']}, miss: {total['misses']} (hit rate {100 * stats['total_hit_rate']:.1f}%), "
+        f"dibuang (LRU): {total['evictions']}"
+    )
 
 
 def cmd_remove(args):
@@ -121,17 +469,34 @@ def cmd_list(args):
 
 def main():
     parser = argparse.ArgumentParser(description="Face Recognition (DeepFace + ArcFace)")
+    parser.add_argument("--timing", action="store_true", help="Cetak rincian latensi per tahap (decode, detect, embed, match, ...) ke stderr di akhir")
+    parser.add_argument("--metrics", action="store_true", help="Aktifkan pengumpulan metrik (mis. untuk GET /metrics pada serve)")
+    parser.add_argument("--metrics-out", default=None, metavar="FILE", help="Tambahkan snapshot metrik sebagai satu baris JSON ke FILE di akhir")
+    parser.add_argument("--profile", default=None, metavar="FILE", help="Jalankan perintah di bawah cProfile; simpan ke FILE (.prof) atau '-' untuk cetak fungsi teratas")
     sub = parser.add_subparsers(dest="command", help="Perintah")
 
     # register
     p_register = sub.add_parser("register", help="Daftarkan wajah")
     p_register.add_argument("--image", "-i", help="Path gambar wajah")
     p_register.add_argument("--folder", "-f", help="Path folder berisi gambar satu orang")
+    p_register.add_argument("--tree", "-t", help="Registrasi massal: folder berisi subfolder per orang (mis. known_faces)")
+    p_register.add_argument("--workers", "-w", type=int, default=None, help="Dengan --tree: jumlah process decode/preprocess (default: jumlah CPU)")
+    p_register.add_argument("--batch-size", type=int, default=None, help="Dengan --tree: jumlah wajah per batch embedding")
     p_register.add_argument("--name", "-n", help="Nama identitas (wajib untuk --image)")
     p_register.add_argument("--augment", "-a", action="store_true", help="Dari folder: tambah embedding dari flip & variasi brightness (lebih akurat)")
     p_register.add_argument("--all-faces", action="store_true", help="Dari satu gambar: daftarkan semua wajah terdeteksi sebagai nama yang sama")
+    p_register.add_argument("--force", action="store_true", help="Dari folder/tree: daftarkan ulang file yang sudah terdaftar (default: dilewati)")
     p_register.set_defaults(func=cmd_register)
 
+    # sync
+    p_sync = sub.add_parser("sync", help="Sinkronkan database dengan folder known_faces (hanya file baru/berubah/terhapus)")
+    p_sync.add_argument("--tree", "-t", default=None, help="Folder berisi subfolder per orang (default: config.KNOWN_FACES_DIR)")
+    p_sync.add_argument("--workers", "-w", type=int, default=None, help="Jumlah process hash/decode/preprocess (default: jumlah CPU)")
+    p_sync.add_argument("--batch-size", type=int, default=None, help="Jumlah wajah per batch embedding")
+    p_sync.add_argument("--augment", "-a", action="store_true", help="Tambah embedding augmentasi untuk file baru/berubah")
+    p_sync.add_argument("--dry-run", action="store_true", help="Tampilkan rencana perubahan tanpa menulis database")
+    p_sync.set_defaults(func=cmd_sync)
+
     # recognize
     p_rec = sub.add_parser("recognize", help="Kenali wajah dari gambar")
     p_rec.add_argument("--image", "-i", required=True, help="Path gambar")
@@ -139,15 +504,62 @@ def main():
 
     # verify
     p_ver = sub.add_parser("verify", help="Bandingkan dua gambar (wajah sama atau tidak)")
-    p_ver.add_argument("--image1", required=True, help="Path gambar pertama")
-    p_ver.add_argument("--image2", required=True, help="Path gambar kedua")
+    p_ver.add_argument("--image1", help="Path gambar pertama (probe untuk --references)")
+    p_ver.add_argument("--image2", help="Path gambar kedua")
+    p_ver.add_argument("--references", "-r", nargs="+", help="Mode 1:N: gambar/folder referensi yang dibandingkan dengan --image1")
+    p_ver.add_argument("--pairs", help="Mode batch: CSV berisi pasangan gambar1,gambar2 per baris")
+    p_ver.add_argument("--output", "-o", help="Dengan --references/--pairs: tulis hasil CSV ke file (default: stdout)")
+    p_ver.add_argument("--workers", "-w", type=int, default=None, help="Dengan --references/--pairs: jumlah process decode/preprocess")
     p_ver.set_defaults(func=cmd_verify)
 
     # webcam
     p_cam = sub.add_parser("webcam", help="Deteksi & kenali wajah dari webcam")
     p_cam.add_argument("--camera", "-c", type=int, default=0, help="Index kamera (default: 0)")
+    p_cam.add_argument("--video", "-v", help="Pakai file video sebagai sumber (bukan kamera)")
+    p_cam.add_argument("--track", action="store_true", help="Mode tracking: deteksi & kenali tiap N frame, track di antaranya")
+    p_cam.add_argument("--detect-every", type=int, default=None, help="Dengan --track: deteksi tiap N frame (default: config.VIDEO_DETECT_EVERY)")
+    p_cam.add_argument("--output", "-o", help="Simpan video hasil (dengan bbox & label) ke file")
+    p_cam.add_argument("--no-display", action="store_true", help="Tanpa jendela tampilan (headless)")
     p_cam.set_defaults(func=cmd_webcam)
 
+    # video (pipeline bertahap)
+    p_vid = sub.add_parser("video", help="Pipeline video bertahap (capture / inferensi / output di thread terpisah)")
+    p_vid.add_argument("--source", "-s", default="0", help="Index webcam, path file video, atau URL RTSP/HTTP (default: 0)")
+    p_vid.add_argument("--workers", "-w", type=int, default=1, help="Jumlah thread inferensi (default: 1)")
+    p_vid.add_argument("--queue-size", type=int, default=2, help="Kapasitas antrian frame, frame tertua dibuang jika penuh (default: 2)")
+    p_vid.add_argument("--display", action="store_true", help="Tampilkan jendela video")
+    p_vid.add_argument("--output", "-o", help="Simpan video hasil ke file")
+    p_vid.add_argument("--events", "-e", help="Tulis event JSON lines per frame ke file ('-' = stdout)")
+    p_vid.add_argument("--track", action="store_true", help="Mode tracking (deteksi tiap N frame)")
+    p_vid.add_argument("--detect-every", type=int, default=None, help="Dengan --track: deteksi tiap N frame")
+    p_vid.add_argument("--max-frames", type=int, default=None, help="Berhenti setelah N frame")
+    p_vid.set_defaults(func=cmd_video)
+
+    # serve-streams (banyak kamera, satu proses)
+    p_srv = sub.add_parser("serve-streams", help="Layanan multi-stream: model & galeri dimuat sekali, embedding di-batch lintas stream")
+    p_srv.add_argument("--source", "-s", action="append", required=True, help="Sumber stream, bisa diulang; format 'nama=sumber' atau sumber saja")
+    p_srv.add_argument("--max-batch", type=int, default=None, help="Maksimal wajah per batch embedding (default: config.SERVER_MAX_BATCH)")
+    p_srv.add_argument("--max-latency-ms", type=float, default=None, help="Batas tunggu pengisian batch (default: config.SERVER_MAX_LATENCY_MS)")
+    p_srv.add_argument("--events", "-e", default="-", help="Tujuan event JSON lines ('-' = stdout, default)")
+    p_srv.add_argument("--duration", type=float, default=None, help="Berhenti setelah N detik (default: sampai semua stream selesai)")
+    p_srv.add_argument("--stats-every", type=float, default=10.0, help="Interval ringkasan throughput (detik)")
+    p_srv.set_defaults(func=cmd_serve_streams)
+
+    # serve (HTTP API)
+    p_api = sub.add_parser("serve", help="HTTP API pengenalan wajah (model & galeri tetap dimuat, request di-batch)")
+    p_api.add_argument("--host", default=None, help="Alamat bind (default: config.API_HOST)")
+    p_api.add_argument("--port", "-p", type=int, default=None, help="Port (default: config.API_PORT)")
+    p_api.add_argument("--workers", "-w", type=int, default=None, help="Thread decode & deteksi (default: config.API_WORKERS / jumlah CPU)")
+    p_api.add_argument("--max-batch", type=int, default=None, help="Maksimal wajah per batch embedding (default: config.SERVER_MAX_BATCH)")
+    p_api.add_argument("--max-latency-ms", type=float, default=None, help="Batas tunggu pengisian batch (default: config.SERVER_MAX_LATENCY_MS)")
+    p_api.set_defaults(func=cmd_serve)
+
+    # cache embedding
+    p_cache = sub.add_parser("cache", help="Statistik cache embedding (hit/miss, jumlah entri)")
+    p_cache.add_argument("--clear", action="store_true", help="Kosongkan cache")
+    p_cache.add_argument("--json", action="store_true", help="Cetak statistik sebagai JSON")
+    p_cache.set_defaults(func=cmd_cache)
+
     # list
     p_list = sub.add_parser("list", help="Tampilkan daftar wajah terdaftar")
     p_list.set_defaults(func=cmd_list)
@@ -161,7 +573,21 @@ def main():
     if not args.command:
         parser.print_help()
         sys.exit(0)
-    args.func(args)
+    config.ensure_dirs()
+    if args.timing or args.metrics or args.metrics_out:
+        metrics.enable()
+    try:
+        if args.profile:
+            with metrics.profile(args.profile):
+                args.func(args)
+        else:
+            args.func(args)
+    finally:
+        if args.timing:
+            print("\nRincian waktu per tahap:", file=sys.stderr)
+            print(metrics.report(), file=sys.stderr)
+        if args.metrics_out:
+            metrics.write_jsonl(args.metrics_out, command=args.command)
 
 
 if __name__ == "__main__":
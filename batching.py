@@ -0,0 +1,114 @@
+"""
+Dynamic batching: menggabungkan permintaan dari banyak thread (stream kamera, request HTTP)
+menjadi satu batch untuk model, dengan batas latensi.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    Item yang di-submit dikumpulkan lalu diproses bersama oleh `fn(items) -> results`
+    (satu hasil per item, urutan sama). Batch dijalankan saat berisi `max_batch` item atau
+    saat item tertua sudah menunggu `max_latency_ms`.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_latency_ms: float = 20.0,
+        name: str = "batcher",
+    ):
+        self._fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_latency = max(0.0, max_latency_ms) / 1000.0
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"batches": 0, "items": 0, "max_batch_seen": 0, "wait_s": 0.0, "run_s": 0.0, "errors": 0}
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Antrikan satu item; hasilnya lewat Future."""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: List[Any]) -> List[Future]:
+        """Antrikan beberapa item sekaligus (mis. semua wajah dalam satu frame)."""
+        futures = [Future() for _ in items]
+        now = time.perf_counter()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher sudah ditutup")
+            self._items.extend((item, fut, now) for item, fut in zip(items, futures))
+            self._cond.notify()
+        return futures
+
+    def _next_batch(self) -> Optional[list]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed)
+            if not self._items:
+                return None
+            deadline = self._items[0][2] + self.max_latency
+            while len(self._items) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._items), self.max_batch)
+            return [self._items.popleft() for _ in range(n)]
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                results = list(self._fn([item for item, _, _ in batch]))
+                # Hasil yang kurang/lebih tidak bisa dipasangkan ke item; tanpa ini sebagian Future tak pernah selesai
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Fungsi batch mengembalikan {len(results)} hasil untuk {len(batch)} item")
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                self._stats["errors"] += 1
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            t1 = time.perf_counter()
+            with self._cond:
+                s = self._stats
+                s["batches"] += 1
+                s["items"] += len(batch)
+                s["max_batch_seen"] = max(s["max_batch_seen"], len(batch))
+                s["wait_s"] += sum(t0 - t_submit for _, _, t_submit in batch)
+                s["run_s"] += t1 - t0
+
+    def stats(self) -> dict:
+        """Statistik batching: jumlah batch/item, rata-rata ukuran batch, rata-rata tunggu & waktu proses."""
+        with self._cond:
+            s = dict(self._stats)
+            pending = len(self._items)
+        batches = max(s["batches"], 1)
+        return {
+            "batches": s["batches"],
+            "items": s["items"],
+            "pending": pending,
+            "errors": s["errors"],
+            "mean_batch": s["items"] / batches,
+            "max_batch_seen": s["max_batch_seen"],
+            "mean_wait_ms": 1000.0 * s["wait_s"] / max(s["items"], 1),
+            "mean_run_ms": 1000.0 * s["run_s"] / batches,
+        }
+
+    def close(self) -> None:
+        """Proses sisa item lalu hentikan thread batching."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark pencarian approximate (IVF) vs exact pada galeri sintetis 512-d.
+Melaporkan recall@1 (identitas top-1 sama dengan hasil exact) dan query/detik per nprobe.
+
+Contoh:
+  python benchmarks/bench_ann.py --identities 20000 --per-identity 5 --queries 1000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ann_index  # noqa: E402
+import face_db  # noqa: E402
+
+
+def make_gallery(n_ids: int, per_id: int, dim: int, seed: int = 0):
+    """
+    Galeri sintetis: pusat identitas dengan struktur low-rank (mirip sebaran embedding wajah)
+    + noise per foto. Returns: (nama identitas per baris, embedding, pusat identitas).
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(64, dim)).astype(np.float32)
+    centers = rng.normal(size=(n_ids, 64)).astype(np.float32) @ basis
+    centers += rng.normal(size=(n_ids, dim)).astype(np.float32) * 4.0
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    labels = np.repeat(np.arange(n_ids), per_id)
+    noise = rng.normal(size=(len(labels), dim)).astype(np.float32) * (0.9 / np.sqrt(dim))
+    embs = centers[labels] + noise
+    return [f"id{i}" for i in labels], embs, centers
+
+
+def make_queries(centers: np.ndarray, n: int, seed: int = 1, return_ids: bool = False):
+    """Query ter-normalisasi di sekitar pusat identitas acak; return_ids=True juga mengembalikan identitas aslinya."""
+    rng = np.random.default_rng(seed)
+    dim = centers.shape[1]
+    picks = rng.integers(len(centers), size=n)
+    q = centers[picks] + rng.normal(size=(n, dim)).astype(np.float32) * (0.9 / np.sqrt(dim))
+    q = (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+    return (q, picks) if return_ids else q
+
+
+def run_search(index, queries, strategy, batch):
+    labels = []
+    t0 = time.perf_counter()
+    for s in range(0, len(queries), batch):
+        lab, _ = index.search(queries[s:s + batch], strategy, top_k=1)
+        labels.append(lab[:, 0])
+    elapsed = time.perf_counter() - t0
+    return np.concatenate(labels), len(queries) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF vs exact")
+    parser.add_argument("--identities", type=int, default=20000)
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=16, help="Query per panggilan search")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--strategy", nargs="+", default=["closest", "voting", "centroid"])
+    args = parser.parse_args()
+
+    names, embs, centers = make_gallery(args.identities, args.per_identity, args.dim)
+    queries = make_queries(centers, args.queries)
+    index = face_db.GalleryIndex(names, embs)
+    print(f"Galeri: {len(index)} embedding, {len(index.identities)} identitas, dim {args.dim}")
+
+    t0 = time.perf_counter()
+    ivf = ann_index.IVFIndex.train(index.matrix, args.nlist)
+    print(f"Latih IVF: nlist={ivf.nlist}, {time.perf_counter() - t0:.2f}s\n")
+
+    print(f"{'strategi':<10}{'mode':<14}{'recall@1':>10}{'query/s':>12}")
+    for strategy in args.strategy:
+        index.ann = None
+        exact, qps = run_search(index, queries, strategy, args.batch)
+        print(f"{strategy:<10}{'exact':<14}{1.0:>10.3f}{qps:>12.1f}")
+        index.ann = ivf
+        for nprobe in args.nprobe:
+            face_db.config.ANN_NPROBE = nprobe
+            approx, qps = run_search(index, queries, strategy, args.batch)
+            recall = float(np.mean(approx == exact))
+            print(f"{strategy:<10}{f'ivf/{nprobe}':<14}{recall:>10.3f}{qps:>12.1f}")
+        index.ann = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Throughput dan recall deteksi bertingkat (DETECTOR_CASCADE) dibanding RetinaFace saja, pada set gambar lokal.
+- recall : bagian wajah hasil referensi yang juga ditemukan (IoU >= --iou), dihitung per gambar
+- ekstra : wajah yang tidak ada di referensi (false positive atau wajah yang terlewat referensi)
+- tingkat: persentase gambar yang diselesaikan tiap backend; alasan lanjut ke tingkat berikutnya
+Gambar didecode + dipreprocess sekali di awal; yang diukur hanya deteksi + alignment (penyaringan
+kualitas dimatikan agar recall detektor tidak tercampur). Butuh DeepFace.
+
+Contoh:
+  python benchmarks/bench_detectors.py --images known_faces --cascade opencv,retinaface ssd,retinaface
+  python benchmarks/bench_detectors.py --images rekaman_frames --cascade opencv mediapipe,retinaface --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import quality  # noqa: E402
+import recognition_engine as engine  # noqa: E402
+from preprocessing import load_and_preprocess  # noqa: E402
+from video import area_to_box, iou  # noqa: E402
+
+
+def load_images(folder: str, limit: int):
+    """Gambar (sudah dipreprocess seperti jalur recognize) dari folder, rekursif."""
+    paths = engine.list_images(folder, recursive=True)[:limit or None]
+    images = []
+    for path in paths:
+        try:
+            images.append((path, load_and_preprocess(path)))
+        except ValueError:
+            print(f"  Dilewati (tidak bisa dibaca): {path}", file=sys.stderr)
+    return images
+
+
+def boxes(faces, shape):
+    return [area_to_box(f["facial_area"]) for f in faces if not quality.is_whole_image(f["facial_area"], shape)]
+
+
+def run_chain(chain, images, rounds: int):
+    """Deteksi semua gambar dengan satu rantai detektor. Returns: (box per gambar, gambar/detik, statistik tingkat)."""
+    config.DETECTOR_CASCADE = {"image": chain}
+    for _, img in images[:2]:
+        engine.extract_faces(img)  # muat model detektor sebelum diukur
+    engine.detector_stats(reset=True)
+    best = float("inf")
+    found = []
+    for _ in range(rounds):
+        found = []
+        t0 = time.perf_counter()
+        for _, img in images:
+            found.append(boxes(engine.extract_faces(img), img.shape))
+        best = min(best, time.perf_counter() - t0)
+    stats = engine.detector_stats().get("image", {"tiers": {}, "fallback": {}})
+    return found, len(images) / best, stats
+
+
+def match(reference, candidate, min_iou: float):
+    """(wajah referensi yang ditemukan, jumlah referensi, wajah ekstra) untuk satu gambar (greedy IoU)."""
+    used = set()
+    hit = 0
+    for ref in reference:
+        best, best_j = min_iou, None
+        for j, box in enumerate(candidate):
+            if j not in used and iou(ref, box) >= best:
+                best, best_j = iou(ref, box), j
+        if best_j is not None:
+            used.add(best_j)
+            hit += 1
+    return hit, len(reference), len(candidate) - len(used)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cascade detektor vs RetinaFace saja")
+    parser.add_argument("--images", required=True, help="Folder gambar (rekursif)")
+    parser.add_argument("--limit", type=int, default=0, help="Maksimal jumlah gambar (0 = semua)")
+    parser.add_argument("--reference", default="retinaface", help="Backend referensi (default retinaface)")
+    parser.add_argument("--cascade", nargs="+", default=["opencv,retinaface"],
+                        help="Rantai detektor dipisah koma, mis. opencv,retinaface (satu backend = tanpa fallback)")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU minimal agar wajah dianggap sama")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="Cetak hasil sebagai JSON")
+    args = parser.parse_args()
+
+    config.QUALITY_GATE_ENABLED = False
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"Tidak ada gambar di {args.images}")
+        sys.exit(1)
+    ref_found, ref_rate, _ = run_chain([args.reference], images, args.rounds)
+    n_ref = sum(len(b) for b in ref_found)
+    results = {args.reference: {"images_per_sec": ref_rate, "speedup": 1.0, "recall": 1.0, "extra": 0, "faces": n_ref}}
+    for spec in args.cascade:
+        chain = [b.strip() for b in spec.split(",") if b.strip()]
+        found, rate, stats = run_chain(chain, images, args.rounds)
+        hits = extra = 0
+        for ref, cand in zip(ref_found, found):
+            h, _, e = match(ref, cand, args.iou)
+            hits += h
+            extra += e
+        total = sum(stats["tiers"].values()) or 1
+        results[" > ".join(chain)] = {
+            "images_per_sec": rate,
+            "speedup": rate / ref_rate,
+            "recall": hits / n_ref if n_ref else 1.0,
+            "extra": extra,
+            "faces": sum(len(b) for b in found),
+            "tiers": {b: n / total for b, n in stats["tiers"].items()},
+            "fallback": stats["fallback"],
+        }
+
+    if args.json:
+        print(json.dumps({"images": len(images), "reference_faces": n_ref, "results": results}, indent=2))
+        return
+    print(f"{len(images)} gambar, {n_ref} wajah referensi ({args.reference}), IoU >= {args.iou}")
+    print(f"{'rantai':<28}{'gambar/dtk':>11}{'speedup':>9}{'recall':>8}{'ekstra':>8}  tingkat")
+    for name, r in results.items():
+        tiers = ", ".join(f"{b} {100 * p:.0f}%" for b, p in r.get("tiers", {}).items())
+        print(f"{name:<28}{r['images_per_sec']:>11.1f}{r['speedup']:>8.2f}x{r['recall']:>8.3f}{r['extra']:>8}  {tiers}")
+        if r.get("fallback"):
+            print(f"{'':<28}  lanjut: " + ", ".join(f"{k} {n}" for k, n in sorted(r["fallback"].items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark presisi matriks galeri (EMBEDDING_PRECISION) pada galeri sintetis 512-d:
+memori indeks, waktu bangun, query/detik, dan akurasi dibanding float32.
+- setuju@1 : identitas top-1 sama dengan hasil float32
+- akurasi  : identitas top-1 sama dengan identitas asli query
+- err sim  : rata-rata |similarity top-1 - similarity float32|
+Re-rank memakai embedding float32 mentah (di produksi: memmap file database, tidak dihitung
+sebagai memori indeks).
+
+Contoh:
+  python benchmarks/bench_quantized.py --identities 50000 --per-identity 2 --rerank 0 32
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+import face_db  # noqa: E402
+from bench_ann import make_gallery, make_queries  # noqa: E402
+
+
+def run_search(index, queries, strategy, batch, rounds):
+    """Label & similarity top-1 semua query, serta query/detik terbaik dari beberapa putaran."""
+    best = float("inf")
+    for _ in range(rounds):
+        labels, sims = [], []
+        t0 = time.perf_counter()
+        for s in range(0, len(queries), batch):
+            lab, sim = index.search(queries[s:s + batch], strategy, top_k=1)
+            labels.append(lab[:, 0])
+            sims.append(sim[:, 0])
+        best = min(best, time.perf_counter() - t0)
+    return np.concatenate(labels), np.concatenate(sims), len(queries) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark galeri float32 vs float16 vs int8")
+    parser.add_argument("--identities", type=int, default=20000)
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=8, help="Query per panggilan search (mis. wajah per frame)")
+    parser.add_argument("--precision", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 32],
+                        help="Nilai RERANK_TOP_N yang diuji (0 = tanpa re-rank)")
+    parser.add_argument("--strategy", nargs="+", default=["voting", "closest", "centroid"])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    names, embs, centers = make_gallery(args.identities, args.per_identity, args.dim)
+    queries, truth = make_queries(centers, args.queries, return_ids=True)
+    print(f"Galeri: {len(names)} embedding, {args.identities} identitas, dim {args.dim}; "
+          f"float32 mentah = {embs.nbytes / 2**20:.1f} MB\n")
+
+    indexes = {}
+    print(f"{'presisi':<10}{'memori MB':>10}{'matriks MB':>12}{'bangun s':>10}")
+    for precision in args.precision:
+        t0 = time.perf_counter()
+        index = face_db.GalleryIndex(names, embs, precision=precision)
+        build = time.perf_counter() - t0
+        index.exact = embs
+        indexes[precision] = index
+        print(f"{precision:<10}{index.nbytes / 2**20:>10.1f}{index.stored_matrix.nbytes / 2**20:>12.1f}{build:>10.2f}")
+
+    reference = face_db.GalleryIndex(names, embs, precision="float32")
+    print(f"\n{'strategi':<10}{'presisi':<10}{'rerank':>7}{'setuju@1':>10}{'akurasi':>9}{'err sim':>10}{'query/s':>10}")
+    for strategy in args.strategy:
+        config.RERANK_TOP_N = 0
+        ref_labels, ref_sims, _ = run_search(reference, queries, strategy, args.batch, 1)
+        for precision, index in indexes.items():
+            for rerank in args.rerank:
+                if rerank and (precision == "float32" or strategy == "centroid"):
+                    continue
+                config.RERANK_TOP_N = rerank
+                labels, sims, qps = run_search(index, queries, strategy, args.batch, args.rounds)
+                names_ok = np.array([index.identities[l] if l >= 0 else "" for l in labels])
+                truth_names = np.array([f"id{i}" for i in truth])
+                print(
+                    f"{strategy:<10}{precision:<10}{rerank:>7d}{np.mean(labels == ref_labels):>10.3f}"
+                    f"{np.mean(names_ok == truth_names):>9.3f}{np.mean(np.abs(sims - ref_sims)):>10.5f}{qps:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark pencarian ter-shard (SEARCH_MODE = "sharded") vs satu proses pada galeri sintetis 512-d.
+Untuk tiap jumlah worker: query/detik, speedup terhadap satu proses, dan apakah hasil top-k
+(label + similarity) identik dengan pencarian satu proses.
+
+Contoh:
+  python benchmarks/bench_shards.py --identities 400000 --per-identity 5 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import face_db  # noqa: E402
+import shard_search  # noqa: E402
+from bench_ann import make_gallery, make_queries  # noqa: E402
+
+
+def run_search(index, queries, strategy, batch, top_k, rounds):
+    """Hasil semua query (label, similarity) dan query/detik terbaik dari beberapa putaran."""
+    best = float("inf")
+    for _ in range(rounds):
+        labels, sims = [], []
+        t0 = time.perf_counter()
+        for s in range(0, len(queries), batch):
+            lab, sim = index.search(queries[s:s + batch], strategy, top_k=top_k)
+            labels.append(lab)
+            sims.append(sim)
+        best = min(best, time.perf_counter() - t0)
+    return np.concatenate(labels), np.concatenate(sims), len(queries) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pencarian galeri ter-shard")
+    parser.add_argument("--identities", type=int, default=100000)
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16, help="Query per panggilan search")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--precision", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Jumlah worker yang diuji (default: 1, 2, 4, ... sampai jumlah core)")
+    parser.add_argument("--strategy", nargs="+", default=["voting", "closest"])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    names, embs, centers = make_gallery(args.identities, args.per_identity, args.dim)
+    queries = make_queries(centers, args.queries)
+    index = face_db.GalleryIndex(names, embs, precision=args.precision)
+    del embs
+    print(f"Galeri: {len(index)} embedding {args.precision}, {len(index.identities)} identitas; "
+          f"{cores} core; batch {args.batch}, top-{args.top_k}\n")
+
+    print(f"{'strategi':<10}{'mode':<14}{'query/s':>10}{'speedup':>9}{'identik':>9}")
+    for strategy in args.strategy:
+        ref_labels, ref_sims, base = run_search(index, queries, strategy, args.batch, args.top_k, args.rounds)
+        print(f"{strategy:<10}{'1 proses':<14}{base:>10.1f}{1.0:>9.2f}{'-':>9}")
+        for w in workers:
+            index.shards = shard_search.ShardedSearch(index, w)
+            labels, sims, qps = run_search(index, queries, strategy, args.batch, args.top_k, args.rounds)
+            same = np.array_equal(labels, ref_labels) and np.array_equal(sims, ref_sims)
+            print(f"{strategy:<10}{f'{len(index.shards)} shard':<14}{qps:>10.1f}{qps / base:>9.2f}{str(same):>9}")
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
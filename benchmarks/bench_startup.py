@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Waktu start (wall clock) tiap subcommand app.py, diukur sebagai proses baru seperti dipakai dari shell.
+Perintah database (list, remove, cache) tidak memuat TensorFlow; perintah inferensi (recognize, verify)
+diukur jika --image diberikan. Juga mengukur biaya import modul berat secara terpisah.
+
+Contoh:
+  python benchmarks/bench_startup.py --runs 5
+  python benchmarks/bench_startup.py --image known_faces/John/1.jpg
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+IMPORTS = {
+    "import config, face_db": "import config, face_db",
+    "import recognition_engine": "import recognition_engine",
+    "+ DeepFace/TensorFlow": "import recognition_engine; recognition_engine._DeepFace()",
+}
+
+
+def commands(image=None):
+    """(label, argumen app.py) yang diukur."""
+    out = [
+        ("--help", ["--help"]),
+        ("list", ["list"]),
+        ("remove (nama tidak ada)", ["remove", "--name", "__bench_startup_tidak_ada__"]),
+        ("cache", ["cache"]),
+        ("sync --dry-run", ["sync", "--dry-run"]),
+    ]
+    if image:
+        out += [
+            ("recognize", ["recognize", "--image", image]),
+            ("verify", ["verify", "--image1", image, "--image2", image]),
+        ]
+    return out
+
+
+def time_command(argv, runs: int) -> dict:
+    """Median / min wall time (ms) dari `runs` eksekusi proses baru."""
+    times = []
+    code = 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(1000.0 * (time.perf_counter() - t0))
+        code = proc.returncode
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "exit_code": code}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark waktu start app.py per subcommand")
+    parser.add_argument("--runs", type=int, default=3, help="Jumlah eksekusi per perintah")
+    parser.add_argument("--image", help="Gambar untuk mengukur recognize/verify (memuat model)")
+    parser.add_argument("--json", action="store_true", help="Cetak hasil sebagai JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for label, code in IMPORTS.items():
+        results[label] = time_command([sys.executable, "-c", code], args.runs)
+    for label, cmd in commands(args.image):
+        results[f"app.py {label}"] = time_command([sys.executable, APP] + cmd, args.runs)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    width = max(len(k) for k in results)
+    for label, r in results.items():
+        note = "" if r["exit_code"] == 0 else f"  (exit {r['exit_code']})"
+        print(f"{label:<{width}}  median {r['median_ms']:8.1f} ms  min {r['min_ms']:8.1f} ms{note}")
+
+
+if __name__ == "__main__":
+    main()
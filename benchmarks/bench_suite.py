@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Suite benchmark yang bisa diulang, dengan hasil JSON dan perbandingan ke baseline.
+Bagian (--parts):
+- matcher : GalleryIndex.search pada galeri sintetis (ukuran x jumlah query x strategi),
+            plus waktu bangun dan memori indeks. Tanpa model.
+- db      : simpan (tulis ulang), append, load record, bangun indeks dari file, dan memori puncak
+            seiring database tumbuh; juga format lama representations.pkl (pickle) + migrasinya. Tanpa model.
+- e2e     : register_face_from_folder, recognize per gambar, dan loop webcam (app.py webcam) yang
+            dijalankan dari file video: tanpa cache identitas, dengan cache identitas (+ persentase
+            embedding yang dihemat), dan dengan tracking. Butuh DeepFace + model;
+            --model / --detector / --strategy menimpa config untuk membandingkan pilihan.
+Semua bagian memakai database sementara (folder face_database tidak disentuh).
+
+Setiap hasil: {"value", "unit", "better": "lower"/"higher"}; --out menyimpan JSON (juga info mesin & config),
+--baseline membandingkan dengan JSON lama dan keluar dengan kode 1 jika ada regresi di atas --tolerance.
+
+Contoh:
+  python benchmarks/bench_suite.py --parts matcher db --out hasil.json
+  python benchmarks/bench_suite.py --parts matcher --sizes 1000 10000 100000 1000000 --queries 1 8 64
+  python benchmarks/bench_suite.py --parts e2e --folder known_faces/John --video rekaman.mp4 --detector opencv
+  python benchmarks/bench_suite.py --parts matcher db --baseline hasil.json
+  python benchmarks/bench_suite.py --compare hasil_baru.json --baseline hasil.json
+"""
+import argparse
+import gc
+import json
+import os
+import pickle
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config  # noqa: E402
+import face_db  # noqa: E402
+import metrics  # noqa: E402
+from bench_ann import make_gallery, make_queries  # noqa: E402
+
+STRATEGIES = ["closest", "voting", "centroid"]
+
+
+def _result(value: float, unit: str, better: str = "lower", **extra) -> dict:
+    out = {"value": float(value), "unit": unit, "better": better}
+    out.update(extra)
+    return out
+
+
+def _time_calls(fn, min_time: float, min_calls: int = 3) -> list:
+    """Waktu (ms) tiap panggilan fn(); diulang sampai min_time detik dan minimal min_calls kali."""
+    times = []
+    t_end = time.perf_counter() + min_time
+    while len(times) < min_calls or time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        fn()
+        times.append(1000.0 * (time.perf_counter() - t0))
+    return times
+
+
+def _peak_mb(fn):
+    """(hasil fn(), alokasi puncak Python + NumPy dalam MB selama fn) lewat tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        out = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return out, peak / 2**20
+
+
+_DB_FILES = {
+    "FACE_DB_FILE": "representations.pkl",
+    "FACE_DB_EMBEDDINGS_FILE": "embeddings.f32",
+    "FACE_DB_RECORDS_FILE": "records.jsonl",
+    "ANN_INDEX_FILE": "ann_ivf.npz",
+    "EMBED_CACHE_FILE": "embedding_cache.sqlite",
+}
+
+
+@contextmanager
+def _temp_db(prefix: str):
+    """Arahkan semua file database ke folder sementara (dihapus setelahnya); config dikembalikan."""
+    saved = {k: getattr(config, k) for k in ["FACE_DB_PATH", "EMBED_CACHE_ENABLED", *_DB_FILES]}
+    folder = tempfile.mkdtemp(prefix=prefix)
+    face_db._invalidate_index()
+    config.FACE_DB_PATH = folder
+    for key, name in _DB_FILES.items():
+        setattr(config, key, os.path.join(folder, name))
+    try:
+        yield folder
+    finally:
+        face_db._invalidate_index()
+        for k, v in saved.items():
+            setattr(config, k, v)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# --- matcher -------------------------------------------------------------------------------
+
+def bench_matcher(args):
+    results = {}
+    for n in args.sizes:
+        n_ids = max(1, n // args.per_identity)
+        identities, embs, centers = make_gallery(n_ids, args.per_identity, args.dim)
+        embs, identities = embs[:n], identities[:n]
+        t0 = time.perf_counter()
+        index = face_db.GalleryIndex(identities, embs, precision=args.precision)
+        build_ms = 1000.0 * (time.perf_counter() - t0)
+        del embs
+        results[f"matcher/build/n={n}"] = _result(build_ms, "ms")
+        results[f"matcher/index_mb/n={n}"] = _result(index.nbytes / 2**20, "MB")
+        for q in args.queries:
+            queries = make_queries(centers, q, seed=q)
+            for strategy in args.strategy:
+                times = _time_calls(lambda: index.search(queries, strategy, top_k=1), args.min_time)
+                ms = statistics.median(times)
+                results[f"matcher/{strategy}/n={n}/q={q}"] = _result(
+                    ms, "ms", per_query_ms=ms / q, qps=1000.0 * q / ms, calls=len(times),
+                )
+                print(f"  matcher {strategy:<8} n={n:<8} q={q:<3} {ms:9.2f} ms/batch  {1000.0 * q / ms:10.0f} query/detik")
+        index.close()
+        del index, centers
+        gc.collect()
+    return results, {}
+
+
+# --- db ------------------------------------------------------------------------------------
+
+def _records(identities, embs) -> list:
+    return [
+        {"identity": name, "embedding": emb, "image_path": f"{name}/{i}.jpg", "content_hash": f"{i:016x}"}
+        for i, (name, emb) in enumerate(zip(identities, embs))
+    ]
+
+
+def _folder_mb(folder: str) -> float:
+    return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)) / 2**20
+
+
+def bench_db(args):
+    results = {}
+    for n in args.db_sizes:
+        identities, embs, _ = make_gallery(max(1, n // args.per_identity), args.per_identity, args.dim)
+        records = _records(identities[:n], embs[:n])
+        append = _records(identities[:args.append], embs[:args.append])
+        del embs
+        with _temp_db("bench_db_") as tmp:
+            t0 = time.perf_counter()
+            face_db._save_db(records)
+            results[f"db/save/n={n}"] = _result(1000.0 * (time.perf_counter() - t0), "ms")
+            results[f"db/disk_mb/n={n}"] = _result(_folder_mb(tmp), "MB")
+
+            times = _time_calls(face_db._load_db, args.min_time)
+            results[f"db/load_records/n={n}"] = _result(statistics.median(times), "ms")
+            _, peak = _peak_mb(face_db._load_db)
+            results[f"db/load_records_peak_mb/n={n}"] = _result(peak, "MB")
+
+            def build_index():
+                face_db._invalidate_index()
+                return face_db.get_index()
+
+            times = _time_calls(build_index, args.min_time)
+            results[f"db/build_index/n={n}"] = _result(statistics.median(times), "ms")
+            _, peak = _peak_mb(build_index)
+            results[f"db/build_index_peak_mb/n={n}"] = _result(peak, "MB")
+
+            if append:
+                t0 = time.perf_counter()
+                face_db.add_faces(append)
+                results[f"db/append/n={n}"] = _result(1000.0 * (time.perf_counter() - t0), "ms", records=len(append))
+                t0 = time.perf_counter()
+                face_db.get_index()
+                results[f"db/index_refresh_after_append/n={n}"] = _result(1000.0 * (time.perf_counter() - t0), "ms")
+
+            # Format lama: seluruh list record di-pickle ulang tiap perubahan
+            pkl = os.path.join(tmp, "legacy.pkl")
+            t0 = time.perf_counter()
+            with open(pkl, "wb") as f:
+                pickle.dump(records, f)
+            results[f"db/pickle_save/n={n}"] = _result(1000.0 * (time.perf_counter() - t0), "ms")
+            results[f"db/pickle_disk_mb/n={n}"] = _result(os.path.getsize(pkl) / 2**20, "MB")
+
+            def load_pickle():
+                with open(pkl, "rb") as f:
+                    return pickle.load(f)
+
+            times = _time_calls(load_pickle, args.min_time)
+            results[f"db/pickle_load/n={n}"] = _result(statistics.median(times), "ms")
+            _, peak = _peak_mb(load_pickle)
+            results[f"db/pickle_load_peak_mb/n={n}"] = _result(peak, "MB")
+            t0 = time.perf_counter()
+            face_db.migrate_from_pickle(pkl)
+            results[f"db/pickle_migrate/n={n}"] = _result(1000.0 * (time.perf_counter() - t0), "ms")
+        print(
+            f"  db n={n:<8} simpan {results[f'db/save/n={n}']['value']:8.1f} ms  "
+            f"load {results[f'db/load_records/n={n}']['value']:8.1f} ms  "
+            f"indeks {results[f'db/build_index/n={n}']['value']:8.1f} ms  "
+            f"pickle load {results[f'db/pickle_load/n={n}']['value']:8.1f} ms"
+        )
+        del records, append
+        gc.collect()
+    return results, {}
+
+
+# --- e2e -----------------------------------------------------------------------------------
+
+def _latency_results(prefix: str, times: list) -> dict:
+    return {
+        f"{prefix}/p50": _result(statistics.median(times), "ms", samples=len(times)),
+        f"{prefix}/p95": _result(float(np.percentile(times, 95)), "ms", samples=len(times)),
+    }
+
+
+def _webcam_loop(engine, path: str, max_frames: int, track: bool, cache: bool) -> list:
+    """
+    Loop app.py webcam (baca frame -> recognize / tracking -> gambar hasil) tanpa tampilan; waktu per frame (ms).
+    cache: pakai IdentityCache (mode tracking memakai default TrackingRecognizer, lihat IDENTITY_CACHE_ENABLED).
+    """
+    import cv2
+    import identity_cache
+
+    tracker = None
+    if track:
+        import video
+        tracker = video.TrackingRecognizer()
+    frame_cache = identity_cache.IdentityCache() if cache else None
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Tidak dapat membuka video: {path}")
+    times = []
+    try:
+        while len(times) < max_frames:
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if tracker:
+                recognitions = tracker.process(frame)
+            else:
+                recognitions = engine.recognize(frame, mode="video", identity_cache=frame_cache)
+            engine.draw_results(frame, recognitions)
+            times.append(1000.0 * (time.perf_counter() - t0))
+    finally:
+        cap.release()
+    return times
+
+
+def bench_e2e(args):
+    """Returns: (hasil, rincian waktu per tahap dari metrics per skenario)."""
+    if not args.folder:
+        raise SystemExit("Bagian e2e butuh --folder (gambar satu orang untuk registrasi)")
+    results, stages = {}, {}
+    with _temp_db("bench_e2e_"):
+        # Tanpa cache embedding (default): setiap gambar benar-benar dideteksi + di-embed
+        config.EMBED_CACHE_ENABLED = args.cache
+        import recognition_engine as engine
+
+        metrics.enable()
+        try:
+            t0 = time.perf_counter()
+            engine.warmup()
+            results["e2e/warmup"] = _result(1000.0 * (time.perf_counter() - t0), "ms")
+
+            metrics.reset()
+            images = engine.list_images(args.folder)
+            t0 = time.perf_counter()
+            added = engine.register_face_from_folder(args.folder, augment=False, force=True)
+            elapsed = 1000.0 * (time.perf_counter() - t0)
+            results["e2e/register_folder"] = _result(elapsed, "ms", images=len(images), embeddings=added)
+            results["e2e/register_per_image"] = _result(elapsed / max(1, len(images)), "ms")
+            stages["register"] = metrics.snapshot()["stages"]
+            print(f"  register {len(images)} gambar: {elapsed:.0f} ms ({added} embedding)")
+
+            metrics.reset()
+            times = []
+            for _ in range(args.rounds):
+                for path in args.images or images:
+                    t0 = time.perf_counter()
+                    engine.recognize(path)
+                    times.append(1000.0 * (time.perf_counter() - t0))
+            results.update(_latency_results("e2e/recognize", times))
+            stages["recognize"] = metrics.snapshot()["stages"]
+            print(f"  recognize: p50 {statistics.median(times):.1f} ms, p95 {np.percentile(times, 95):.1f} ms")
+
+            if args.video:
+                import identity_cache
+
+                for label, track, cache in (("webcam", False, False), ("webcam_cache", False, True),
+                                            ("webcam_track", True, False)):
+                    metrics.reset()
+                    identity_cache.stats(reset=True)
+                    times = _webcam_loop(engine, args.video, args.max_frames, track, cache)
+                    if not times:
+                        continue
+                    fps = 1000.0 * len(times) / sum(times)
+                    results.update(_latency_results(f"e2e/{label}/frame", times))
+                    results[f"e2e/{label}/fps"] = _result(fps, "fps", better="higher", frames=len(times))
+                    stages[label] = metrics.snapshot()["stages"]
+                    line = f"  {label}: {len(times)} frame, {fps:.1f} FPS"
+                    cached = identity_cache.stats()
+                    if cache and cached["hits"] + cached["misses"]:
+                        saved = 100.0 * cached["hits"] / (cached["hits"] + cached["misses"])
+                        results[f"e2e/{label}/embed_saved"] = _result(saved, "%", better="higher", **cached)
+                        line += f", embedding dihemat {saved:.0f}%"
+                    print(line)
+        finally:
+            metrics.enable(False)
+    return results, {"stages": stages}
+
+
+# --- hasil & baseline ----------------------------------------------------------------------
+
+def environment() -> dict:
+    """Info mesin, versi, dan config yang memengaruhi hasil (untuk membandingkan run)."""
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ""
+    keys = (
+        "MODEL_NAME", "DETECTOR_BACKEND", "MATCH_STRATEGY", "SEARCH_MODE", "EMBEDDING_PRECISION",
+        "DETECTION_MAX_SIDE", "PREPROCESS_INPUT", "PREPROCESS_TARGET", "EMBED_BATCH_SIZE",
+    )
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": rev,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: getattr(config, k, None) for k in keys},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Cetak perubahan tiap hasil yang ada di kedua run. Returns: jumlah regresi di atas tolerance."""
+    cur, base = current["results"], baseline["results"]
+    names = [k for k in cur if k in base and cur[k].get("better") in ("lower", "higher")]
+    if not names:
+        print("Tidak ada hasil yang sama dengan baseline.")
+        return 0
+    regressions = 0
+    width = max(len(k) for k in names)
+    print(f"\nPerbandingan dengan baseline ({baseline.get('env', {}).get('git') or '?'}), toleransi {tolerance:.0%}:")
+    for name in names:
+        old, new = base[name]["value"], cur[name]["value"]
+        if old <= 0:
+            continue
+        change = new / old - 1.0
+        worse = change > tolerance if cur[name]["better"] == "lower" else change < -tolerance
+        better = change < -tolerance if cur[name]["better"] == "lower" else change > tolerance
+        regressions += worse
+        mark = "REGRESI" if worse else ("lebih baik" if better else "")
+        print(f"  {name:<{width}}  {old:10.2f} -> {new:10.2f} {cur[name]['unit']:<4} {change:+7.1%}  {mark}")
+    missing = sorted(set(base) - set(cur))
+    if missing:
+        print(f"  ({len(missing)} hasil baseline tidak diukur pada run ini)")
+    print(f"{regressions} regresi.")
+    return regressions
+
+
+PARTS = {"matcher": bench_matcher, "db": bench_db, "e2e": bench_e2e}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite benchmark matcher, database, dan end-to-end")
+    parser.add_argument("--parts", nargs="+", default=["matcher", "db"], choices=list(PARTS))
+    parser.add_argument("--out", help="Simpan hasil sebagai JSON (bisa dipakai sebagai --baseline berikutnya)")
+    parser.add_argument("--baseline", help="JSON hasil run sebelumnya untuk dibandingkan")
+    parser.add_argument("--compare", help="Bandingkan JSON ini dengan --baseline tanpa menjalankan benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Perubahan relatif yang dianggap regresi (default 0.15)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Detik minimal pengulangan per pengukuran")
+    # matcher / db
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Matcher: jumlah embedding galeri")
+    parser.add_argument("--queries", type=int, nargs="+", default=[1, 8, 64], help="Matcher: query per panggilan search")
+    parser.add_argument("--strategy", nargs="+", default=STRATEGIES, choices=STRATEGIES, help="Matcher: strategi")
+    parser.add_argument("--precision", default=None, choices=["float32", "float16", "int8"], help="Matcher: presisi indeks (default config)")
+    parser.add_argument("--db-sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="DB: jumlah record")
+    parser.add_argument("--append", type=int, default=100, help="DB: jumlah record yang di-append")
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=512)
+    # e2e
+    parser.add_argument("--folder", help="E2E: folder gambar satu orang untuk register_face_from_folder")
+    parser.add_argument("--images", nargs="+", help="E2E: gambar untuk recognize (default: gambar di --folder)")
+    parser.add_argument("--video", help="E2E: file video untuk loop webcam")
+    parser.add_argument("--max-frames", type=int, default=300, help="E2E: maksimal frame video")
+    parser.add_argument("--rounds", type=int, default=3, help="E2E: putaran recognize semua gambar")
+    parser.add_argument("--cache", action="store_true", help="E2E: pakai cache embedding (default: mati)")
+    parser.add_argument("--model", help="E2E: timpa config.MODEL_NAME")
+    parser.add_argument("--detector", help="E2E: timpa config.DETECTOR_BACKEND")
+    parser.add_argument("--match-strategy", choices=STRATEGIES, help="E2E: timpa config.MATCH_STRATEGY")
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare butuh --baseline")
+        with open(args.compare, encoding="utf-8") as f:
+            current = json.load(f)
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(current, baseline, args.tolerance) else 0)
+
+    for attr, value in (("MODEL_NAME", args.model), ("DETECTOR_BACKEND", args.detector), ("MATCH_STRATEGY", args.match_strategy)):
+        if value:
+            setattr(config, attr, value)
+
+    output = {"env": environment(), "args": {k: v for k, v in vars(args).items()}, "results": {}, "info": {}}
+    for part in args.parts:
+        print(f"[{part}]")
+        t0 = time.perf_counter()
+        results, info = PARTS[part](args)
+        output["results"].update(results)
+        if info:
+            output["info"][part] = info
+        print(f"  selesai dalam {time.perf_counter() - t0:.1f} s")
+    try:
+        import resource
+        output["env"]["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    except ImportError:
+        pass
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Hasil disimpan ke {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(output, baseline, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Load test HTTP API (app.py serve): banyak klien paralel mengirim request ke satu endpoint,
+lalu melaporkan request/detik dan latensi p50/p99. Tiap klien memakai koneksi keep-alive sendiri.
+
+Contoh:
+  python app.py serve &
+  python benchmarks/load_test.py --image foto.jpg --concurrency 16 --requests 500
+  python benchmarks/load_test.py --endpoint verify --image a.jpg --image2 b.jpg
+"""
+import argparse
+import base64
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+
+def build_request(endpoint: str, image: bytes, image2: bytes = None):
+    """(method, path, body, headers) untuk endpoint yang diuji."""
+    if endpoint == "recognize":
+        return "POST", "/recognize", image, {"Content-Type": "application/octet-stream"}
+    if endpoint == "verify":
+        body = json.dumps({
+            "image1": base64.b64encode(image).decode("ascii"),
+            "image2": base64.b64encode(image2 or image).decode("ascii"),
+        }).encode("utf-8")
+        return "POST", "/verify", body, {"Content-Type": "application/json"}
+    if endpoint == "identities":
+        return "GET", "/identities", None, {}
+    raise ValueError(f"Endpoint tidak dikenal: {endpoint}")
+
+
+def run_load(url: str, request, concurrency: int, total: int, timeout: float = 60.0) -> dict:
+    """
+    Kirim `total` request dengan `concurrency` klien paralel.
+    Returns: {"requests", "errors", "seconds", "rps", "p50_ms", "p99_ms", "max_ms"}.
+    """
+    method, path, body, headers = request
+    parts = urlsplit(url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def client():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                t0 = time.perf_counter()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    resp.read()
+                    ok = resp.status == 200
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    conn.close()
+                    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        errors[0] += 1
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "seconds": seconds,
+        "rps": len(latencies) / max(seconds, 1e-9),
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else 0.0,
+        "max_ms": float(ms.max()) if len(ms) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test HTTP API pengenalan wajah")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Alamat server")
+    parser.add_argument("--endpoint", choices=["recognize", "verify", "identities"], default="recognize")
+    parser.add_argument("--image", help="Gambar yang dikirim (wajib untuk recognize/verify)")
+    parser.add_argument("--image2", help="Gambar kedua untuk verify (default: sama dengan --image)")
+    parser.add_argument("--concurrency", "-c", type=int, nargs="+", default=[1, 4, 16],
+                        help="Jumlah klien paralel; beberapa nilai = beberapa putaran")
+    parser.add_argument("--requests", "-n", type=int, default=200, help="Jumlah request per putaran")
+    parser.add_argument("--warmup", type=int, default=5, help="Request pemanasan sebelum pengukuran")
+    parser.add_argument("--json", action="store_true", help="Cetak hasil sebagai JSON")
+    args = parser.parse_args()
+
+    if args.endpoint != "identities" and not args.image:
+        parser.error("--image wajib untuk endpoint recognize/verify")
+    image = open(args.image, "rb").read() if args.image else b""
+    image2 = open(args.image2, "rb").read() if args.image2 else None
+    request = build_request(args.endpoint, image, image2)
+
+    if args.warmup:
+        run_load(args.url, request, 1, args.warmup)
+    results = []
+    for c in args.concurrency:
+        r = run_load(args.url, request, c, args.requests)
+        r["concurrency"] = c
+        results.append(r)
+        if not args.json:
+            print(
+                f"concurrency={c:<4d} {r['rps']:8.1f} req/detik  p50={r['p50_ms']:7.1f} ms  "
+                f"p99={r['p99_ms']:7.1f} ms  error={r['errors']}"
+            )
+    if args.json:
+        print(json.dumps({"endpoint": args.endpoint, "url": args.url, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,10 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Database wajah (embedding + metadata) disimpan di sini
 FACE_DB_PATH = os.path.join(BASE_DIR, "face_database")
+# Store append-only: embedding float32 (np.memmap) + sidecar identitas/metadata (JSON lines)
+FACE_DB_EMBEDDINGS_FILE = os.path.join(FACE_DB_PATH, "embeddings.f32")
+FACE_DB_RECORDS_FILE = os.path.join(FACE_DB_PATH, "records.jsonl")
+# Format lama (pickle); dimigrasi otomatis sekali ke store di atas jika store belum ada
 FACE_DB_FILE = os.path.join(FACE_DB_PATH, "representations.pkl")
 KNOWN_FACES_DIR = os.path.join(BASE_DIR, "known_faces")  # Gambar wajah yang didaftarkan
 
@@ -19,6 +23,27 @@ MODEL_NAME = "ArcFace"
 # Backend deteksi wajah: "retinaface" (akurasi tinggi), "mtcnn", "opencv", "ssd", "mediapipe"
 # RetinaFace lebih akurat untuk wajah kecil, samping, dan variasi pencahayaan
 DETECTOR_BACKEND = "retinaface"
+# Sisi terpanjang frame untuk detektor (mis. 640): frame 1080p/4K diperkecil hanya untuk deteksi,
+# alignment + embedding tetap dari resolusi penuh. None = deteksi pada resolusi penuh
+DETECTION_MAX_SIDE = None
+# Deteksi bertingkat (cascade) per jalur: list backend dari cepat ke akurat, mis. ["opencv", "retinaface"].
+# Tingkat berikutnya hanya dijalankan jika tingkat sebelumnya tidak menemukan wajah, ada wajah dengan
+# confidence di bawah DETECTOR_CASCADE_MIN_CONFIDENCE, atau ada wajah lebih kecil dari DETECTOR_CASCADE_MIN_FACE.
+# Jalur: "video" (webcam/video/serve-streams), "enroll" (register/sync), "image" (recognize/verify/HTTP API).
+# None (atau jalur tidak ada di dict) = hanya DETECTOR_BACKEND. Satu list = sama untuk semua jalur.
+DETECTOR_CASCADE = {"video": None, "enroll": None, "image": None}
+# Skala confidence berbeda per backend (opencv bukan 0-1 dan sering 0): angka, atau dict per backend + "default"
+DETECTOR_CASCADE_MIN_CONFIDENCE = {"opencv": 0.0, "default": 0.9}
+DETECTOR_CASCADE_MIN_FACE = 40  # Sisi bbox terpendek (piksel, koordinat gambar asli)
+
+# Penyaringan kualitas sebelum embedding (quality.py): wajah yang gagal tidak di-embed/dicocokkan,
+# foto registrasi yang gagal ditolak. Tiap ambang: angka, dict per jalur ("image", "video", "enroll",
+# "default"), atau None untuk mematikan cek tersebut. "Wajah" seluas gambar (tidak ada wajah) selalu dibuang.
+QUALITY_GATE_ENABLED = True
+QUALITY_MIN_FACE = {"default": 24, "enroll": 60}  # Sisi bbox terpendek (piksel)
+QUALITY_MIN_CONFIDENCE = {"default": 0.5, "enroll": 0.9}  # Confidence detektor (backend opencv dikecualikan)
+QUALITY_MAX_POSE = {"default": 0.5, "enroll": 0.3}  # |hidung - tengah mata| / jarak mata (0 = frontal)
+QUALITY_MIN_BLUR = {"default": 10.0, "enroll": 30.0}  # Variansi Laplacian crop 64x64 (kecil = buram)
 
 # Threshold similarity (0–1). Semakin tinggi semakin ketat; kurangi jika terlalu banyak "Unknown"
 MIN_SIMILARITY_THRESHOLD = 0.55
@@ -29,13 +54,75 @@ MIN_SIMILARITY_THRESHOLD = 0.55
 # - "centroid": hitung centroid embedding per identitas, bandingkan ke centroid (cepat, bagus jika banyak foto per orang)
 MATCH_STRATEGY = "voting"
 
+# Centroid per identitas (strategi "centroid"), diperbarui saat registrasi, bukan per query:
+# - "mean"   : rata-rata semua embedding
+# - "trimmed": rata-rata setelah membuang CENTROID_TRIM_FRACTION embedding terjauh (outlier, mis. foto buram)
+CENTROID_MODE = "mean"
+CENTROID_TRIM_FRACTION = 0.2
+
+# Mode pencarian galeri:
+# - "exact": bandingkan ke semua embedding (brute force, hasil pasti)
+# - "ivf"  : approximate nearest neighbour (partisi k-means), untuk galeri sangat besar (100k+)
+# - "sharded": exact, galeri dibagi ke beberapa worker proses (memori bersama), untuk jutaan embedding
+SEARCH_MODE = "exact"
+ANN_MIN_GALLERY_SIZE = 10000  # Di bawah jumlah embedding ini tetap exact walau SEARCH_MODE = "ivf"
+ANN_NLIST = None  # Jumlah partisi IVF; None = otomatis (~akar jumlah embedding)
+ANN_NPROBE = 8  # Partisi yang diperiksa per query: naikkan untuk recall, turunkan untuk kecepatan
+ANN_INDEX_FILE = os.path.join(FACE_DB_PATH, "ann_ivf.npz")
+SHARD_WORKERS = None  # Mode "sharded": jumlah worker/shard; None = jumlah core CPU
+SHARD_MIN_GALLERY_SIZE = 200000  # Di bawah jumlah embedding ini tetap satu proses walau SEARCH_MODE = "sharded"
+
+# Presisi matriks galeri di memori (file database tetap float32):
+# - "float32": exact, 4 byte per dimensi
+# - "float16": 1/2 memori, selisih similarity ~1e-4
+# - "int8"   : ~1/4 memori (skala per embedding), selisih similarity ~1e-3
+EMBEDDING_PRECISION = "float32"
+# Jumlah kandidat teratas (hasil terkuantisasi) yang dihitung ulang dengan embedding float32 dari
+# file database (memmap); 0 = tanpa re-rank. Berlaku untuk closest/voting pada pencarian exact
+RERANK_TOP_N = 32
+
 DISTANCE_METRIC = "cosine"  # "cosine", "euclidean", "euclidean_l2"
+# Threshold jarak untuk verify (DISTANCE_METRIC); None = default DeepFace untuk MODEL_NAME + metrik
+VERIFY_THRESHOLD = None
 
 # Preprocessing gambar sebelum ekstraksi embedding (normalisasi pencahayaan)
 PREPROCESS_INPUT = True
+# Tempat CLAHE diterapkan: "frame" (seluruh gambar sebelum deteksi) atau "face" (hanya crop wajah
+# sebelum embedding; jauh lebih murah untuk frame video besar)
+PREPROCESS_TARGET = "frame"
 
 # Saat daftar dari folder: tambah embedding dari versi augmentasi (flip, brightness) untuk variasi
 REGISTER_AUGMENT = True
+# Variasi yang diterapkan ke crop wajah (deteksi tetap sekali per foto, jadi variasi tambahan tidak
+# menambah biaya detektor): "flip", "brighter", "darker", "rotate_left", "rotate_right", "blur"
+REGISTER_AUGMENTATIONS = ["flip", "brighter", "darker"]
+AUGMENT_ROTATION_DEG = 5.0  # Sudut untuk rotate_left / rotate_right
+
+# Registrasi massal (app.py register --tree): jumlah process decode/preprocess (None = jumlah CPU)
+ENROLL_WORKERS = None
+# Jumlah crop wajah per batch saat menghitung embedding
+EMBED_BATCH_SIZE = 32
+
+# Layanan multi-stream (app.py serve-streams): wajah dari semua stream digabung per batch embedding
+SERVER_MAX_BATCH = 32  # Maksimal wajah per batch
+SERVER_MAX_LATENCY_MS = 20.0  # Batas tunggu pengisian batch sebelum dijalankan
+
+# HTTP API (app.py serve); batching embedding memakai SERVER_MAX_BATCH / SERVER_MAX_LATENCY_MS
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_WORKERS = None  # Thread decode + deteksi (None = jumlah CPU)
+API_MAX_BODY_MB = 10  # Ukuran maksimal body request
+
+# Cache embedding per isi file gambar (hash isi + MODEL_NAME/DETECTOR_BACKEND/PREPROCESS_INPUT):
+# gambar yang sama tidak dideteksi + di-embed ulang (recognize, register, registrasi ulang folder)
+EMBED_CACHE_ENABLED = True
+EMBED_CACHE_FILE = os.path.join(FACE_DB_PATH, "embedding_cache.sqlite")
+EMBED_CACHE_MAX_ENTRIES = 100000  # Entri yang paling lama tidak dipakai dibuang jika melebihi ini (LRU)
+
+# Metrik per tahap (metrics.py): timer decode/detect/embed/match/..., counter cache & error, gauge ukuran galeri.
+# Nonaktif = hampir tanpa overhead; CLI: app.py --timing / --metrics / --metrics-out FILE
+METRICS_ENABLED = False
+METRICS_MAX_SAMPLES = 10000  # Sampel terakhir per tahap untuk persentil (count/total tetap dari semua observasi)
 
 # Rekomendasi minimal jumlah foto per orang untuk akurasi lebih baik (hanya untuk peringatan di CLI)
 MIN_IMAGES_PER_PERSON_RECOMMENDED = 3
@@ -44,6 +131,24 @@ MIN_IMAGES_PER_PERSON_RECOMMENDED = 3
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 
-# Buat folder jika belum ada
-os.makedirs(FACE_DB_PATH, exist_ok=True)
-os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
+# Mode tracking video (app.py webcam --track)
+VIDEO_DETECT_EVERY = 5  # Deteksi + pengenalan tiap N frame (lebih cepat jika ada track hilang)
+VIDEO_TRACKER = "iou"  # "iou" (prediksi gerak, tanpa dependensi) atau tracker OpenCV: "mil", "kcf", "csrt"
+TRACK_IOU_THRESHOLD = 0.3  # IoU minimal untuk memasangkan deteksi ke track yang ada
+TRACK_MAX_CENTER_DIST = 1.0  # Cadangan jika IoU kecil: jarak pusat maksimal (kelipatan ukuran wajah)
+TRACK_MAX_MISSED = 2  # Track dihapus setelah tidak terdeteksi sebanyak ini berturut-turut
+TRACK_HISTORY = 10  # Jumlah hasil pengenalan terakhir per track untuk penghalusan identitas
+
+# Cache identitas per sumber video (identity_cache.py; webcam, video, serve-streams): wajah yang posisi
+# dan tampilannya cocok dengan frame sebelumnya memakai identitas terakhir tanpa embedding + pencocokan
+IDENTITY_CACHE_ENABLED = True
+IDENTITY_CACHE_TTL = 2.0  # Detik: hasil pengenalan dipakai ulang paling lama ini, lalu dikenali penuh lagi
+IDENTITY_CACHE_MAX_ENTRIES = 64  # Maksimal wajah yang diingat per sumber (yang paling lama tidak terlihat dibuang)
+IDENTITY_CACHE_IOU = 0.3  # IoU minimal bbox dengan posisi terakhir entri
+IDENTITY_CACHE_MIN_APPEARANCE = 0.85  # Korelasi minimal crop wajah 16x16 dengan crop terakhir entri (-1..1)
+
+
+def ensure_dirs() -> None:
+    """Buat folder database dan known_faces jika belum ada (dipanggil oleh CLI, bukan saat import)."""
+    os.makedirs(FACE_DB_PATH, exist_ok=True)
+    os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
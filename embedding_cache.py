@@ -0,0 +1,284 @@
+"""
+Cache embedding persisten (SQLite) berdasarkan hash isi file gambar.
+Kunci = hash isi + pengaturan yang memengaruhi hasil (model, detektor, preprocessing),
+sehingga gambar yang sama tidak dideteksi + di-embed ulang selama pengaturan tidak berubah.
+Entri yang paling lama tidak dipakai dibuang saat jumlah entri melebihi batas (LRU).
+Hit cache hanya membaca: waktu pakai terakhir (LRU) dan counter hit/miss dikumpulkan di memori lalu
+ditulis sekaligus (saat put, stats, close, atau setiap _FLUSH_SECONDS), sehingga lookup dari banyak
+proses tidak saling menunggu kunci tulis SQLite.
+"""
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import config
+import metrics
+
+# last_used entri hanya diperbarui jika lebih tua dari ini (detik); urutan LRU cukup kira-kira
+_TOUCH_INTERVAL = 60.0
+# Batas waktu / jumlah perubahan tertunda (waktu pakai + counter) sebelum ditulis ke database
+_FLUSH_SECONDS = 30.0
+_FLUSH_PENDING = 1000
+
+# Pengaturan config yang memengaruhi hasil deteksi/embedding; bagian dari kunci cache
+CACHE_KEY_SETTINGS = ("MODEL_NAME", "DETECTOR_BACKEND", "PREPROCESS_INPUT", "PREPROCESS_TARGET",
+                      "DETECTION_MAX_SIDE")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    embeddings BLOB NOT NULL,
+    meta TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def content_hash(data: bytes) -> str:
+    """Hash isi file gambar (hex)."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path: str) -> Optional[str]:
+    """Hash isi file, atau None jika file tidak bisa dibaca (aman dijalankan di worker process)."""
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def settings_key() -> str:
+    """Nilai pengaturan di CACHE_KEY_SETTINGS, digabung menjadi satu string."""
+    return "|".join(f"{name}={getattr(config, name, None)}" for name in CACHE_KEY_SETTINGS)
+
+
+def make_key(image_hash: str, variant: str = "") -> str:
+    """
+    Kunci cache untuk satu gambar.
+    - variant: jenis hasil yang disimpan ("" = semua wajah seperti _represent; lainnya mis. registrasi + augmentasi)
+    """
+    settings = hashlib.sha1(settings_key().encode("utf-8")).hexdigest()[:16]
+    return f"{image_hash}:{settings}:{variant}"
+
+
+class EmbeddingCache:
+    """
+    Cache wajah per gambar: list of {"embedding", "facial_area", "face_confidence", "detector"}
+    ("detector" None untuk entri yang disimpan sebelum backend dicatat).
+    Daftar kosong juga disimpan (gambar tanpa wajah tidak perlu dideteksi ulang).
+    Aman dipakai dari banyak thread dalam satu proses.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # Statistik proses ini; total kumulatif tersimpan di tabel counters
+        self._session = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+        # Belum ditulis ke database: tambahan counter dan waktu pakai terakhir per kunci
+        self._pending_counts: Dict[str, int] = {}
+        self._pending_touch: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+    def _bump(self, name: str, n: int = 1) -> None:
+        self._session[name] += n
+        self._pending_counts[name] = self._pending_counts.get(name, 0) + n
+
+    def _flush_locked(self) -> None:
+        """Tulis counter + waktu pakai tertunda (dipanggil di dalam transaksi, kunci dipegang)."""
+        if self._pending_touch:
+            self._conn.executemany(
+                "UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(t, k) for k, t in self._pending_touch.items()],
+            )
+            self._pending_touch.clear()
+        if self._pending_counts:
+            self._conn.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(self._pending_counts.items()),
+            )
+            self._pending_counts.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Tulis perubahan tertunda (waktu pakai terakhir, counter) dalam satu transaksi."""
+        with self._lock:
+            if not self._pending_touch and not self._pending_counts:
+                return
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._flush_locked()
+
+    def _maybe_flush_locked(self) -> None:
+        if (len(self._pending_touch) >= _FLUSH_PENDING
+                or time.monotonic() - self._last_flush >= _FLUSH_SECONDS):
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._flush_locked()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Wajah tersimpan untuk kunci, atau None jika belum ada (miss). Hanya membaca database."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dim, embeddings, meta, last_used FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._bump("misses")
+            else:
+                self._bump("hits")
+                now = time.time()
+                if now - row[3] > _TOUCH_INTERVAL:
+                    self._pending_touch[key] = now
+            self._maybe_flush_locked()
+        if row is None:
+            metrics.incr("embedding_cache", result="miss")
+            return None
+        metrics.incr("embedding_cache", result="hit")
+        dim, blob, meta, _ = row
+        embs = np.frombuffer(blob, dtype="<f4").reshape(-1, dim) if dim else np.zeros((0, 0), np.float32)
+        return [
+            {
+                "embedding": emb.copy(), "facial_area": m.get("facial_area", {}),
+                "face_confidence": m.get("face_confidence", 0.0), "detector": m.get("detector"),
+            }
+            for emb, m in zip(embs, json.loads(meta))
+        ]
+
+    def put(self, key: str, faces: List[dict]) -> None:
+        """Simpan wajah untuk kunci (menimpa entri lama), lalu buang entri LRU jika melebihi batas."""
+        embs = [np.asarray(f["embedding"], dtype="<f4").reshape(-1) for f in faces]
+        dim = int(embs[0].shape[0]) if embs else 0
+        blob = np.stack(embs).tobytes() if embs else b""
+        meta = json.dumps([
+            {
+                "facial_area": _plain(f.get("facial_area", {})), "face_confidence": float(f.get("face_confidence") or 0.0),
+                "detector": f.get("detector"),
+            }
+            for f in faces
+        ])
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._pending_touch.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, dim, embeddings, meta, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, dim, blob, meta, time.time()),
+            )
+            self._bump("puts")
+            # Waktu pakai tertunda ditulis dulu agar entri yang baru dipakai tidak ikut dibuang
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._flush_locked()
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._bump("evictions", excess)
+            self._flush_locked()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss proses ini dan total kumulatif, jumlah entri, ukuran file."""
+        self.flush()
+        with self._lock:
+            total = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        session = dict(self._session)
+        lookups = session["hits"] + session["misses"]
+        total_lookups = total.get("hits", 0) + total.get("misses", 0)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "file_bytes": size,
+            "session": session,
+            "session_hit_rate": session["hits"] / lookups if lookups else 0.0,
+            "total": {k: total.get(k, 0) for k in ("hits", "misses", "puts", "evictions")},
+            "total_hit_rate": total.get("hits", 0) / total_lookups if total_lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Hapus semua entri dan statistik."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM counters")
+            self._conn.execute("VACUUM")
+            self._pending_counts.clear()
+            self._pending_touch.clear()
+        self._session = {k: 0 for k in self._session}
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except sqlite3.ProgrammingError:
+            return  # sudah ditutup
+        with self._lock:
+            self._conn.close()
+
+
+def _plain(value):
+    """facial_area -> tipe JSON (nilai numpy/tuple dari detektor dijadikan int/float/list)."""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """Cache bersama proses ini (config.EMBED_CACHE_FILE), atau None jika EMBED_CACHE_ENABLED = False."""
+    global _cache
+    if not getattr(config, "EMBED_CACHE_ENABLED", True):
+        return None
+    path = getattr(config, "EMBED_CACHE_FILE", os.path.join(config.FACE_DB_PATH, "embedding_cache.sqlite"))
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            # EMBED_CACHE_FILE berubah: koneksi lama ditutup (tulisan tertunda disimpan), bukan dibiarkan terbuka
+            if _cache is not None:
+                _cache.close()
+            _cache = EmbeddingCache(path, getattr(config, "EMBED_CACHE_MAX_ENTRIES", 100000))
+    return _cache
+
+
+def _close_cache() -> None:
+    """Tutup cache yang aktif saat proses selesai: counter + waktu pakai tertunda tetap tersimpan."""
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+
+
+atexit.register(_close_cache)
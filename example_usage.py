@@ -20,11 +20,11 @@ def main():
     # 1) Daftarkan wajah dari folder known_faces
     # Struktur: known_faces/NamaOrang/foto1.jpg, foto2.jpg, ...
     if os.path.isdir(EXAMPLE_IMAGES):
-        for name in os.listdir(EXAMPLE_IMAGES):
-            folder = os.path.join(EXAMPLE_IMAGES, name)
-            if os.path.isdir(folder):
-                n = engine.register_face_from_folder(folder, name)
-                print(f"Terdaftar: {name} ({n} gambar)")
+        # Semua subfolder sekaligus: decode paralel, embedding per batch, satu penulisan database
+        stats = engine.register_tree(EXAMPLE_IMAGES)
+        for name, n in sorted(stats["by_identity"].items()):
+            print(f"Terdaftar: {name} ({n} embedding)")
+        print(f"({stats['images']} gambar, {stats['images_per_sec']:.1f} gambar/detik)")
     else:
         print("Folder 'known_faces' belum ada. Buat subfolder per orang dan isi foto.")
         print("Contoh: known_faces/John/image1.jpg")
@@ -2,29 +2,328 @@
 Penyimpanan dan pencarian embedding wajah.
 Mendukung banyak foto per orang dengan strategi: closest, voting, centroid.
 """
+import copy
+import hashlib
+import json
 import os
 import pickle
+import threading
+from contextlib import contextmanager
 import numpy as np
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Sequence, Tuple, Dict
 import config
+import metrics
 
+try:
+    import fcntl
+except ImportError:  # Windows: kunci penulis lewat msvcrt, pembaca tanpa kunci bersama
+    fcntl = None
+    import msvcrt
 
-def _load_db() -> List[dict]:
-    """Muat database dari file pickle."""
-    if not os.path.exists(config.FACE_DB_FILE):
-        return []
+# Format penyimpanan:
+# - FACE_DB_EMBEDDINGS_FILE: baris float32 (little-endian) lebar tetap, append-only, dibuka dengan np.memmap
+# - FACE_DB_RECORDS_FILE   : sidecar JSON lines; baris pertama header {"format", "version", "dim"},
+#                            berikutnya satu record per embedding {"row", "identity", "image_path"}
+# Embedding ditulis lebih dulu, baru record; baris embedding tanpa record (mis. proses terhenti) diabaikan.
+# Header juga menyimpan "generation" yang naik setiap database ditulis ulang (hapus/sinkronisasi).
+#
+# Konkurensi (banyak proses registrasi + pengenalan pada satu database):
+# - Penulis memegang kunci eksklusif (file FACE_DB_RECORDS_FILE + ".lock") selama satu operasi;
+#   file ditulis ke path sementara lalu di-rename (atomic).
+# - Pembaca memegang kunci bersama hanya selama membaca metadata + membuka memmap embedding
+#   (snapshot); pencarian berjalan tanpa kunci pada snapshot tsb.
+_STORE_FORMAT = "face_db"
+_STORE_VERSION = 1
+_EMB_DTYPE = np.dtype("<f4")
+
+
+class ConcurrentModificationError(RuntimeError):
+    """Database ditulis ulang proses lain sejak snapshot dibaca; posisi record di snapshot tidak valid lagi."""
+
+
+_lock_local = threading.local()
+_write_mutex = threading.RLock()
+
+
+def _lock_path() -> str:
+    return config.FACE_DB_RECORDS_FILE + ".lock"
+
+
+@contextmanager
+def write_lock():
+    """
+    Kunci eksklusif penulis database (antarthread dan antarproses), reentrant dalam satu thread.
+    Semua fungsi tulis face_db memakainya; gunakan langsung untuk operasi baca-ubah-tulis multi-langkah.
+    """
+    with _write_mutex:
+        depth = getattr(_lock_local, "depth", 0)
+        if depth == 0:
+            os.makedirs(os.path.dirname(_lock_path()) or ".", exist_ok=True)
+            f = open(_lock_path(), "a+b")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except BaseException:
+                f.close()
+                raise
+            _lock_local.file = f
+        _lock_local.depth = depth + 1
+        try:
+            yield
+        finally:
+            _lock_local.depth -= 1
+            if _lock_local.depth == 0:
+                f, _lock_local.file = _lock_local.file, None
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+                f.close()
+
+
+@contextmanager
+def _read_lock(blocking: bool = True):
+    """
+    Kunci bersama pembaca selama mengambil snapshot (bukan selama pencarian).
+    Yields False jika blocking=False dan penulis sedang memegang kunci.
+    Thread yang sedang memegang write_lock tidak perlu (dan tidak boleh) mengunci lagi.
+    """
+    if getattr(_lock_local, "depth", 0) or fcntl is None:
+        yield True
+        return
     try:
-        with open(config.FACE_DB_FILE, "rb") as f:
-            return pickle.load(f)
-    except Exception:
-        return []
+        f = open(_lock_path(), "a+b")
+    except OSError:
+        # Folder database belum ada / read-only: tidak ada penulis yang perlu ditunggu
+        yield True
+        return
+    try:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
+
+
+def _read_header() -> Optional[dict]:
+    """Header sidecar (baris pertama), atau None jika store belum ada."""
+    try:
+        with open(config.FACE_DB_RECORDS_FILE, "rb") as f:
+            line = f.readline()
+        header = json.loads(line)
+    except (OSError, ValueError):
+        return None
+    return header if header.get("format") == _STORE_FORMAT else None
+
+
+def _read_meta(strict: bool = False) -> Tuple[Optional[dict], List[dict]]:
+    """
+    Baca header dan semua record metadata (tanpa embedding).
+    - strict: file yang ada tetapi tidak bisa dibaca / header rusak -> OSError/ValueError, bukan database
+      kosong (dipakai sebelum menulis ulang agar database tidak terhapus)
+    """
+    _ensure_store()
+    try:
+        with open(config.FACE_DB_RECORDS_FILE, "rb") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None, []
+    except OSError:
+        if strict:
+            raise
+        return None, []
+    try:
+        header = json.loads(lines[0]) if lines else None
+    except ValueError:
+        header = None
+    if not header or header.get("format") != _STORE_FORMAT:
+        if strict and lines:
+            raise ValueError(f"Header database tidak valid: {config.FACE_DB_RECORDS_FILE}")
+        return None, []
+    meta = []
+    for line in lines[1:]:
+        try:
+            meta.append(json.loads(line))
+        except ValueError:
+            # Baris terpotong (penulisan terhenti) dilewati
+            continue
+    return header, meta
+
+
+def _open_matrix(dim: int) -> np.ndarray:
+    """Buka file embedding sebagai memmap (rows, dim) tanpa menyalin data."""
+    try:
+        size = os.path.getsize(config.FACE_DB_EMBEDDINGS_FILE)
+    except OSError:
+        size = 0
+    rows = size // (_EMB_DTYPE.itemsize * dim)
+    if rows == 0:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.memmap(config.FACE_DB_EMBEDDINGS_FILE, dtype=_EMB_DTYPE, mode="r", shape=(rows, dim))
+
+
+def _read_store(strict: bool = False, blocking: bool = True):
+    """
+    Snapshot konsisten: metadata record dan matriks embedding (N, D) yang bersesuaian, serta versi
+    database (_db_stamp) saat snapshot diambil.
+    Jika baris tersimpan berurutan (kasus normal), matriks adalah view memmap (zero-copy); memmap
+    tetap valid walau file kemudian ditulis ulang (rename membuat file baru).
+    Returns: (meta, embeddings, stamp), atau None jika blocking=False dan penulis sedang menulis.
+    """
+    _ensure_store()
+    with _read_lock(blocking) as acquired:
+        if not acquired:
+            return None
+        stamp = _db_stamp()
+        header, meta = _read_meta(strict)
+        mat = _open_matrix(int(header["dim"])) if header and meta and header.get("dim") else None
+    if mat is None:
+        return [], np.zeros((0, 0), dtype=np.float32), stamp
+    meta = [m for m in meta if 0 <= m.get("row", -1) < len(mat)]
+    rows = np.fromiter((m["row"] for m in meta), dtype=np.intp, count=len(meta))
+    if np.array_equal(rows, np.arange(len(rows))):
+        return meta, mat[:len(rows)], stamp
+    return meta, np.asarray(mat[rows]), stamp
+
+
+def _load_db(strict: bool = False) -> List[dict]:
+    """Muat database sebagai list record (identity, embedding, image_path)."""
+    meta, embs, _ = _read_store(strict)
+    out = []
+    for m, emb in zip(meta, embs):
+        r = {k: v for k, v in m.items() if k != "row"}
+        r["embedding"] = emb
+        r.setdefault("image_path", "")
+        out.append(r)
+    return out
+
+
+def _write_file_atomic(path: str, data: bytes) -> None:
+    """Tulis file ke path sementara (fsync) lalu rename (tidak meninggalkan file setengah jadi)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _next_generation() -> int:
+    header = _read_header()
+    return int(header.get("generation", 0)) + 1 if header else 1
 
 
 def _save_db(records: List[dict]) -> None:
-    """Simpan database ke file pickle."""
+    """
+    Tulis ulang seluruh database (dipakai untuk hapus/kosongkan dan migrasi).
+    Penambahan wajah tidak lewat sini melainkan append (lihat _append_records).
+    """
     os.makedirs(config.FACE_DB_PATH, exist_ok=True)
-    with open(config.FACE_DB_FILE, "wb") as f:
-        pickle.dump(records, f)
+    embs = [np.asarray(r["embedding"], dtype=_EMB_DTYPE).flatten() for r in records]
+    dim = int(embs[0].shape[0]) if embs else None
+    with write_lock():
+        header = {"format": _STORE_FORMAT, "version": _STORE_VERSION, "dim": dim, "generation": _next_generation()}
+        lines = [json.dumps(header)]
+        for i, r in enumerate(records):
+            m = {k: v for k, v in r.items() if k not in ("embedding", "row")}
+            m["row"] = i
+            m.setdefault("image_path", "")
+            lines.append(json.dumps(m, ensure_ascii=False))
+        matrix = np.stack(embs, axis=0) if embs else np.zeros((0, 0), dtype=_EMB_DTYPE)
+        _write_file_atomic(config.FACE_DB_EMBEDDINGS_FILE, matrix.tobytes())
+        _write_file_atomic(config.FACE_DB_RECORDS_FILE, ("\n".join(lines) + "\n").encode("utf-8"))
+        _invalidate_index()
+
+
+def _append_records(records: List[dict]) -> None:
+    """
+    Tambahkan record ke akhir store tanpa menulis ulang isi yang sudah ada (O(jumlah record baru)).
+    Raises ValueError jika dimensi embedding berbeda dengan database.
+    """
+    if not records:
+        return
+    embs = np.stack([np.asarray(r["embedding"], dtype=_EMB_DTYPE).flatten() for r in records], axis=0)
+    with write_lock():
+        _ensure_store()
+        stamp_before = _db_stamp()
+        header = _read_header()
+        if header is None or not header.get("dim"):
+            # Store baru / kosong: mulai dengan dimensi embedding ini
+            os.makedirs(config.FACE_DB_PATH, exist_ok=True)
+            header = {"format": _STORE_FORMAT, "version": _STORE_VERSION, "dim": int(embs.shape[1]),
+                      "generation": _next_generation()}
+            _write_file_atomic(config.FACE_DB_EMBEDDINGS_FILE, b"")
+            _write_file_atomic(config.FACE_DB_RECORDS_FILE, (json.dumps(header) + "\n").encode("utf-8"))
+        dim = int(header["dim"])
+        if embs.shape[1] != dim:
+            raise ValueError(f"Dimensi embedding {embs.shape[1]} tidak sama dengan database ({dim})")
+
+        row_bytes = _EMB_DTYPE.itemsize * dim
+        with open(config.FACE_DB_EMBEDDINGS_FILE, "a+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            start = size // row_bytes
+            if size != start * row_bytes:
+                # Buang sisa baris yang terpotong
+                f.truncate(start * row_bytes)
+            f.write(embs.tobytes())
+            f.flush()
+
+        lines = []
+        for i, r in enumerate(records):
+            m = {k: v for k, v in r.items() if k not in ("embedding", "row")}
+            m["row"] = start + i
+            m["image_path"] = m.get("image_path") or ""
+            lines.append(json.dumps(m, ensure_ascii=False))
+        with open(config.FACE_DB_RECORDS_FILE, "a+b") as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        _update_index(stamp_before, lambda index: index.append([r["identity"] for r in records], embs))
+
+
+def migrate_from_pickle(pickle_path: Optional[str] = None) -> int:
+    """
+    Migrasi sekali jalan dari format lama (representations.pkl) ke store append-only.
+    File pickle tidak dihapus. Returns: jumlah record yang dimigrasi.
+    Pickle rusak/tidak terbaca: ValueError dan store tidak dibuat, sehingga migrasi dicoba lagi
+    (galeri lama tidak diganti store kosong secara diam-diam).
+    """
+    path = pickle_path or config.FACE_DB_FILE
+    try:
+        with open(path, "rb") as f:
+            records = pickle.load(f)
+    except Exception as e:
+        raise ValueError(f"Database lama {path} tidak bisa dibaca ({e}); store baru tidak dibuat") from e
+    if not isinstance(records, list):
+        raise ValueError(f"Database lama {path} bukan list record ({type(records).__name__}); store baru tidak dibuat")
+    _save_db(records)
+    return len(records)
+
+
+def _ensure_store() -> None:
+    """Jika store belum ada tetapi pickle lama ada, migrasi otomatis (sekali, di bawah kunci penulis)."""
+    if os.path.exists(config.FACE_DB_RECORDS_FILE) or not os.path.exists(config.FACE_DB_FILE):
+        return
+    with write_lock():
+        if not os.path.exists(config.FACE_DB_RECORDS_FILE):
+            migrate_from_pickle(config.FACE_DB_FILE)
 
 
 def _normalize_emb(emb: np.ndarray) -> np.ndarray:
@@ -43,18 +342,59 @@ def _cosine_sim(emb1: np.ndarray, emb2: np.ndarray) -> float:
 
 def add_face(identity: str, embedding: np.ndarray, image_path: Optional[str] = None) -> None:
     """
-    Tambahkan satu wajah ke database.
+    Tambahkan satu wajah ke database (append, tanpa menulis ulang file).
     - identity: nama atau ID orang
     - embedding: vektor dari DeepFace.represent()
     - image_path: path gambar sumber (opsional, untuk referensi)
     """
-    records = _load_db()
-    records.append({
+    _append_records([{
         "identity": identity,
-        "embedding": np.array(embedding, dtype=np.float32),
+        "embedding": embedding,
         "image_path": image_path or "",
-    })
-    _save_db(records)
+    }])
+
+
+def add_faces(records: List[dict]) -> int:
+    """
+    Tambahkan banyak wajah sekaligus dalam satu penulisan (mis. registrasi massal).
+    - records: list of {"identity", "embedding", "image_path" (opsional), "content_hash" (opsional)}
+    Returns: jumlah record yang ditambahkan.
+    """
+    _append_records(records)
+    return len(records)
+
+
+def apply_changes(
+    remove: Sequence[int] = (),
+    add: Sequence[dict] = (),
+    update: Optional[Dict[int, dict]] = None,
+    generation: Optional[int] = None,
+) -> None:
+    """
+    Terapkan banyak perubahan sebagai satu penulisan database (mis. sinkronisasi folder).
+    - remove: posisi record (urutan get_metadata / get_all) yang dihapus
+    - add: record baru {"identity", "embedding", "image_path", ...} ditambahkan di akhir
+    - update: {posisi: field metadata baru} (mis. image_path, mtime); embedding tidak berubah
+    - generation: generation snapshot asal posisi (snapshot_metadata); jika database sudah ditulis ulang
+      proses lain sejak itu, raise ConcurrentModificationError (record yang hanya di-append tidak menggeser posisi)
+    Tanpa remove/update cukup append; selain itu database ditulis ulang sekali.
+    """
+    with write_lock():
+        if not remove and not update:
+            _append_records(list(add))
+            return
+        if generation is not None and _current_generation() != generation:
+            raise ConcurrentModificationError("Database ditulis ulang proses lain; ambil snapshot baru lalu ulangi")
+        removed = set(remove)
+        records = []
+        for i, r in enumerate(_load_db(strict=True)):
+            if i in removed:
+                continue
+            if update and i in update:
+                r = {**r, **update[i]}
+            records.append(r)
+        records.extend(add)
+        _save_db(records)
 
 
 def get_all() -> List[dict]:
@@ -62,75 +402,670 @@ def get_all() -> List[dict]:
     return _load_db()
 
 
+def _current_generation() -> int:
+    header = _read_header()
+    return int(header.get("generation", 0)) if header else 0
+
+
+def snapshot_metadata() -> Tuple[int, List[dict]]:
+    """
+    Metadata semua record (tanpa embedding) beserta generation database, dibaca konsisten.
+    Posisi record dalam list dipakai untuk apply_changes(..., generation=generation).
+    """
+    _ensure_store()
+    with _read_lock():
+        header, meta = _read_meta()
+    generation = int(header.get("generation", 0)) if header else 0
+    return generation, [{k: v for k, v in m.items() if k != "row"} for m in meta]
+
+
+def get_metadata() -> List[dict]:
+    """Metadata semua record tanpa embedding (identity, image_path, content_hash, ...), urutan database."""
+    return snapshot_metadata()[1]
+
+
 def get_identities() -> List[str]:
     """Daftar unik identitas (nama orang) di database."""
-    records = _load_db()
-    return sorted(set(r["identity"] for r in records))
+    return sorted(set(m["identity"] for m in get_metadata()))
 
 
 def get_count_by_identity() -> Dict[str, int]:
     """Jumlah embedding per identitas."""
-    records = _load_db()
     out: Dict[str, int] = {}
-    for r in records:
-        out[r["identity"]] = out.get(r["identity"], 0) + 1
+    for m in get_metadata():
+        out[m["identity"]] = out.get(m["identity"], 0) + 1
     return out
 
 
-def _find_closest_single(emb_norm: np.ndarray, records: List[dict], th: float) -> Tuple[Optional[str], float]:
-    """Strategi closest: bandingkan ke tiap embedding, ambil yang tertinggi."""
-    best_identity = None
-    best_sim = 0.0
-    for r in records:
-        e = _normalize_emb(r["embedding"])
-        sim = _cosine_sim(emb_norm, e)
-        if sim > best_sim:
-            best_sim = sim
-            best_identity = r["identity"]
-    if best_sim >= th:
-        return best_identity, best_sim
-    return None, best_sim
-
-
-def _find_closest_voting(emb_norm: np.ndarray, records: List[dict], th: float) -> Tuple[Optional[str], float]:
-    """Strategi voting: per identitas ambil similarity terbaik, lalu pilih identitas dengan nilai terbaik."""
-    by_identity: Dict[str, float] = {}
-    for r in records:
-        e = _normalize_emb(r["embedding"])
-        sim = _cosine_sim(emb_norm, e)
-        identity = r["identity"]
-        by_identity[identity] = max(by_identity.get(identity, 0), sim)
-    if not by_identity:
-        return None, 0.0
-    best_identity = max(by_identity, key=by_identity.get)
-    best_sim = by_identity[best_identity]
-    if best_sim >= th:
-        return best_identity, best_sim
-    return None, best_sim
-
-
-def _find_closest_centroid(emb_norm: np.ndarray, records: List[dict], th: float) -> Tuple[Optional[str], float]:
-    """Strategi centroid: hitung centroid embedding per identitas, bandingkan ke centroid."""
-    by_identity: Dict[str, List[np.ndarray]] = {}
-    for r in records:
-        identity = r["identity"]
-        e = np.array(r["embedding"], dtype=np.float32).flatten()
-        by_identity.setdefault(identity, []).append(e)
-    centroids = {}
-    for identity, embs in by_identity.items():
-        arr = np.stack(embs, axis=0)
-        centroid = np.mean(arr, axis=0)
-        centroids[identity] = _normalize_emb(centroid)
-    best_identity = None
-    best_sim = 0.0
-    for identity, cen in centroids.items():
-        sim = _cosine_sim(emb_norm, cen)
-        if sim > best_sim:
-            best_sim = sim
-            best_identity = identity
-    if best_sim >= th:
-        return best_identity, best_sim
-    return None, best_sim
+# Presisi penyimpanan matriks galeri di memori (config.EMBEDDING_PRECISION)
+PRECISION_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Baris per blok saat membangun indeks / menghitung centroid (membatasi memori sementara)
+_BLOCK_ROWS = 8192
+# Baris per blok saat skor dihitung dari matriks terkuantisasi (blok float32 kecil tetap di cache CPU)
+DOT_BLOCK_ROWS = 2048
+
+
+class PackedRows:
+    """
+    Matriks baris ter-normalisasi (N, D) dalam satu array contiguous dengan presisi
+    float32, float16, atau int8 (skala per baris: baris ≈ q * scale, |q| <= 127).
+    Kapasitas digandakan saat penuh agar penambahan berulang tetap amortized O(1) per baris.
+    """
+
+    def __init__(self, precision: str):
+        self.precision = precision
+        self._dtype = PRECISION_DTYPES[precision]
+        self.data = np.zeros((0, 0), dtype=self._dtype)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.n = 0
+
+    @classmethod
+    def view(cls, precision: str, data: np.ndarray, scales: np.ndarray) -> "PackedRows":
+        """Bungkus array yang sudah ada (mis. memmap bersama, sebagian baris) tanpa menyalin; jangan di-append."""
+        rows = cls(precision)
+        rows.data, rows.scales, rows.n = data, scales, len(data)
+        return rows
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.precision == "int8" else 0)
+
+    def reserve(self, n: int, dim: int) -> None:
+        """Pastikan kapasitas minimal n baris berdimensi dim (isi lama dipertahankan)."""
+        if n <= len(self.data) and self.data.shape[1] == dim:
+            return
+        cap = max(n, 2 * len(self.data), 16)
+        data = np.zeros((cap, dim), dtype=self._dtype)
+        scales = np.ones(cap, dtype=np.float32)
+        if self.n:
+            data[:self.n] = self.data[:self.n]
+            scales[:self.n] = self.scales[:self.n]
+        self.data, self.scales = data, scales
+
+    def put(self, idx, rows: np.ndarray) -> None:
+        """Simpan baris float32 ter-normalisasi di posisi idx (slice atau array indeks)."""
+        if self.precision == "int8":
+            scale = np.abs(rows).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            self.data[idx] = np.rint(rows / scale[:, None])
+            self.scales[idx] = scale
+        else:
+            self.data[idx] = rows
+
+    def rows(self, idx=slice(None)) -> np.ndarray:
+        """Baris sebagai float32 (hasil dekuantisasi); untuk float32 berupa view tanpa salinan."""
+        data = self.data[:self.n][idx]
+        if self.precision == "float32":
+            return data
+        out = data.astype(np.float32)
+        if self.precision == "int8":
+            out *= self.scales[:self.n][idx][..., None]
+        return out
+
+    def dot(self, queries: np.ndarray) -> np.ndarray:
+        """
+        queries (Q, D) float32 @ matriks.T -> (Q, N) float32.
+        Matriks terkuantisasi diperlebar ke float32 per blok DOT_BLOCK_ROWS baris (BLAS tetap dipakai,
+        memori sementara kecil); skala int8 dikalikan ke hasil, bukan ke matriks.
+        """
+        if self.precision == "float32":
+            return queries @ self.data[:self.n].T
+        out = np.empty((queries.shape[0], self.n), dtype=np.float32)
+        buf = np.empty((min(DOT_BLOCK_ROWS, self.n), self.data.shape[1]), dtype=np.float32)
+        for s in range(0, self.n, DOT_BLOCK_ROWS):
+            e = min(s + DOT_BLOCK_ROWS, self.n)
+            block = buf[:e - s]
+            np.copyto(block, self.data[s:e], casting="unsafe")
+            np.matmul(queries, block.T, out=out[:, s:e])
+        if self.precision == "int8":
+            out *= self.scales[:self.n]
+        return out
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Pertahankan hanya baris dengan mask True (urutan tetap)."""
+        self.data = np.ascontiguousarray(self.data[:self.n][mask])
+        self.scales = np.ascontiguousarray(self.scales[:self.n][mask])
+        self.n = len(self.data)
+
+
+class GalleryIndex:
+    """
+    Indeks galeri yang tinggal di memori.
+    Menyimpan matriks embedding ter-normalisasi (contiguous) dan array label identitas,
+    sehingga ketiga strategi cukup satu perkalian matriks (per query atau per batch query)
+    + max/argmax per grup.
+    Baris mengikuti urutan record di database (label sesuai urutan kemunculan pertama identitas).
+    Presisi matriks (dan centroid) mengikuti EMBEDDING_PRECISION: float32, float16 (1/2 memori),
+    atau int8 dengan skala per baris (~1/4 memori). Pada presisi terkuantisasi, `exact` (embedding
+    float32 mentah, biasanya memmap file database) dipakai untuk re-rank RERANK_TOP_N kandidat teratas.
+    Running sum embedding mentah per identitas (float32, K x D) disimpan untuk
+    semua presisi, sehingga centroid = rata-rata embedding mentah seperti float32 dan diperbarui secara
+    incremental saat wajah ditambah/dihapus; hanya matriks baris yang dikuantisasi.
+    """
+
+    def __init__(self, identities: Sequence[str], embeddings: np.ndarray, precision: Optional[str] = None):
+        """
+        - identities: nama identitas per baris embedding
+        - embeddings: matriks (N, D) embedding mentah (boleh memmap)
+        - precision: "float32", "float16", atau "int8"; default config.EMBEDDING_PRECISION
+        """
+        precision = precision or getattr(config, "EMBEDDING_PRECISION", "float32")
+        if precision not in PRECISION_DTYPES:
+            raise ValueError(f"EMBEDDING_PRECISION tidak dikenal: {precision} (pilih {', '.join(PRECISION_DTYPES)})")
+        self.precision = precision
+        self.identities: List[str] = []
+        self._label_of: Dict[str, int] = {}
+        self._n = 0
+        self._rows = PackedRows(precision)
+        self._labels = np.zeros(0, dtype=np.int32)
+        # Jumlah embedding mentah dan banyaknya embedding per identitas (untuk centroid)
+        self._sums = np.zeros((0, 0), dtype=np.float32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._centroids = PackedRows(precision)
+        # (permutasi urut-per-label, awal segmen tiap identitas) untuk voting; dihitung saat dibutuhkan
+        self._groups: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # Indeks ANN opsional (lihat _attach_ann); None = pencarian exact
+        self.ann = None
+        # Pencarian ter-shard lintas proses (lihat _attach_shards); None = satu proses
+        self.shards = None
+        # Embedding float32 mentah (N, D) sejajar dengan baris indeks untuk re-rank (lihat _attach_exact)
+        self.exact: Optional[np.ndarray] = None
+        self.append(identities, embeddings)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Embedding ter-normalisasi (N, D) float32. Pada presisi terkuantisasi ini salinan hasil
+        dekuantisasi seluruh galeri; gunakan rows() untuk sebagian baris.
+        """
+        return self._rows.rows()
+
+    @property
+    def stored_matrix(self) -> np.ndarray:
+        """Matriks sebagaimana disimpan (dtype sesuai presisi; int8 tanpa skala per baris)."""
+        return self._rows.data[:self._n]
+
+    @property
+    def stored_scales(self) -> np.ndarray:
+        """Skala per baris (N,) untuk int8 (1.0 untuk presisi lain)."""
+        return self._rows.scales[:self._n]
+
+    def packed_rows(self, start: int = 0, end: Optional[int] = None) -> PackedRows:
+        """Baris [start, end) dalam presisi tersimpan (view tanpa salinan) untuk dicari di luar indeks."""
+        end = self._n if end is None else end
+        return PackedRows.view(self.precision, self._rows.data[start:end], self._rows.scales[start:end])
+
+    def use_storage(self, data: np.ndarray, scales: np.ndarray) -> None:
+        """
+        Ganti penyimpanan matriks dengan salinan berisi sama (mis. memmap bersama ShardedSearch) agar
+        tidak ada dua salinan di memori. Penambahan berikutnya menyalin ke buffer baru seperti biasa.
+        """
+        if data.shape != self.stored_matrix.shape or len(scales) != self._n:
+            raise ValueError("Penyimpanan pengganti harus berukuran sama dengan matriks galeri")
+        self._rows.data, self._rows.scales = data, scales
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """Centroid ter-normalisasi per identitas (K, D) float32."""
+        return self._centroids.rows()
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Label identitas per baris (N,)."""
+        return self._labels[:self._n]
+
+    @property
+    def nbytes(self) -> int:
+        """Memori yang dipakai indeks (matriks, skala, label, centroid, running sum)."""
+        return (
+            self._rows.nbytes + self._centroids.nbytes + self._labels.nbytes + self._counts.nbytes
+            + self._sums.nbytes
+        )
+
+    def rows(self, idx) -> np.ndarray:
+        """Baris tertentu sebagai float32 ter-normalisasi (hasil dekuantisasi)."""
+        return self._rows.rows(idx)
+
+    def centroid_rows(self, labels) -> np.ndarray:
+        """Centroid identitas tertentu sebagai float32."""
+        return self._centroids.rows(labels)
+
+    def append(self, identities: Sequence[str], embeddings: np.ndarray) -> None:
+        """Tambah embedding di akhir indeks; hanya centroid identitas yang berubah yang dihitung ulang."""
+        if len(identities) == 0:
+            return
+        raw = np.asarray(embeddings, dtype=np.float32).reshape(len(identities), -1)
+        labels = np.fromiter(
+            (self._label_of.setdefault(identity, len(self._label_of)) for identity in identities),
+            dtype=np.int32, count=len(identities),
+        )
+        self.identities = list(self._label_of)
+        n_new = self._n + len(raw)
+        dim = raw.shape[1]
+        self._rows.reserve(n_new, dim)
+        if n_new > len(self._labels):
+            labels_buf = np.empty(len(self._rows.data), dtype=np.int32)
+            labels_buf[:self._n] = self.labels
+            self._labels = labels_buf
+        # Dinormalisasi + dikuantisasi per blok agar galeri besar (memmap) tidak disalin utuh ke float32
+        for s in range(0, len(raw), _BLOCK_ROWS):
+            rows = normalize_rows(raw[s:s + _BLOCK_ROWS])
+            self._rows.put(slice(self._n + s, self._n + s + len(rows)), rows)
+            if self.ann is not None:
+                self.ann.add(rows)
+        self._labels[self._n:n_new] = labels
+        self._n = self._rows.n = n_new
+
+        k = len(self.identities)
+        self._centroids.reserve(k, dim)
+        self._centroids.n = k
+        if len(self._counts) < k:
+            self._counts = np.concatenate([self._counts, np.zeros(k - len(self._counts), dtype=np.int64)])
+        if len(self._sums) < k or self._sums.shape[1] != dim:
+            sums = np.zeros((k, dim), dtype=np.float32)
+            if len(self._sums):
+                sums[:len(self._sums)] = self._sums
+            self._sums = sums
+        for s in range(0, len(raw), DOT_BLOCK_ROWS):
+            _add_by_label(self._sums, labels[s:s + DOT_BLOCK_ROWS], raw[s:s + DOT_BLOCK_ROWS])
+        self._counts += np.bincount(labels, minlength=len(self._counts))
+        self._update_centroids(np.unique(labels))
+        self._groups = None
+
+    def copy(self) -> "GalleryIndex":
+        """
+        Salinan untuk perubahan incremental (append/remove_identity) tanpa mengganggu pencarian yang
+        sedang berjalan pada indeks ini. Buffer besar dipakai bersama: append menulis baris baru setelah
+        baris yang terlihat oleh indeks ini, remove_identity membuat array baru; state yang diubah di
+        tempat (ukuran, daftar identitas, partisi IVF) disalin.
+        """
+        out = copy.copy(self)
+        out._rows = copy.copy(self._rows)
+        out._centroids = copy.copy(self._centroids)
+        out.identities = list(self.identities)
+        out._label_of = dict(self._label_of)
+        if self.ann is not None:
+            out.ann = self.ann.copy()
+        return out
+
+    def remove_identity(self, identity: str) -> int:
+        """Hapus semua embedding satu identitas dari indeks. Returns: jumlah baris yang dihapus."""
+        label = self._label_of.get(identity)
+        if label is None:
+            return 0
+        keep = self.labels != label
+        removed = self._n - int(keep.sum())
+        self._rows.keep(keep)
+        labels = self.labels[keep]
+        labels[labels > label] -= 1
+        self._labels, self._n = labels, len(labels)
+        self._sums = np.delete(self._sums, label, axis=0)
+        self._counts = np.delete(self._counts, label)
+        self._centroids.keep(np.arange(self._centroids.n) != label)
+        del self.identities[label]
+        self._label_of = {name: i for i, name in enumerate(self.identities)}
+        self._groups = None
+        self.ann = None
+        self.exact = None
+        self.close()
+        return removed
+
+    def close(self) -> None:
+        """Hentikan worker pencarian ter-shard (jika ada)."""
+        if self.shards is not None:
+            self.shards.close()
+            self.shards = None
+
+    def _update_centroids(self, labels: np.ndarray) -> None:
+        """
+        Hitung ulang centroid (ter-normalisasi) untuk label tertentu.
+        - CENTROID_MODE "mean"   : dari running sum embedding mentah (O(D) per identitas, semua presisi)
+        - CENTROID_MODE "trimmed": rata-rata setelah membuang CENTROID_TRIM_FRACTION embedding
+          terjauh dari rata-rata (outlier); dihitung saat registrasi, bukan per query
+        """
+        if getattr(config, "CENTROID_MODE", "mean") != "trimmed":
+            self._centroids.put(labels, normalize_rows(self._sums[labels]))
+            return
+        trim = getattr(config, "CENTROID_TRIM_FRACTION", 0.2)
+        for label in labels:
+            rows = self._rows.rows(self.labels == label)
+            centroid = rows.mean(axis=0)
+            n_keep = max(1, int(round(len(rows) * (1.0 - trim))))
+            if n_keep < len(rows):
+                keep = np.argsort(-(rows @ centroid), kind="stable")[:n_keep]
+                centroid = rows[keep].mean(axis=0)
+            self._centroids.put([label], normalize_rows(centroid[None, :]))
+
+    def _voting_groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._groups is None:
+            perm = np.argsort(self.labels, kind="stable")
+            starts = np.searchsorted(self.labels[perm], np.arange(len(self.identities))).astype(np.intp)
+            self._groups = (perm, starts)
+        return self._groups
+
+    def scores(self, queries_norm: np.ndarray, strategy: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Skor similarity (0-1) untuk batch query (N, D) ter-normalisasi, satu perkalian matriks-matriks
+        (langsung pada matriks tersimpan, termasuk yang terkuantisasi).
+        Returns: (skor (N, C), label identitas tiap kolom (C,)).
+        - closest : kolom = tiap embedding
+        - voting  : kolom = identitas, skor = similarity terbaik di identitas tsb
+        - centroid: kolom = identitas, skor = similarity ke centroid
+        """
+        if strategy == "centroid":
+            sims = np.clip(self._centroids.dot(queries_norm), 0.0, 1.0)
+            return sims, np.arange(len(self.identities), dtype=np.int32)
+        sims = np.clip(self._rows.dot(queries_norm), 0.0, 1.0)
+        if strategy == "voting":
+            perm, starts = self._voting_groups()
+            per_identity = np.maximum.reduceat(sims[:, perm], starts, axis=1)
+            return per_identity, np.arange(len(self.identities), dtype=np.int32)
+        return sims, self.labels
+
+    def search(
+        self,
+        queries_norm: np.ndarray,
+        strategy: str,
+        top_k: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k kandidat untuk batch query (N, D).
+        Returns: (label (N, k), similarity (N, k)), terurut dari similarity tertinggi.
+        Untuk strategi closest, satu identitas bisa muncul lebih dari sekali (per embedding).
+        Dengan indeks ANN atau re-rank, slot tanpa kandidat berisi label -1.
+        Dengan shard (closest/voting), skor dihitung paralel di worker proses; centroid tetap di proses ini.
+        """
+        n = queries_norm.shape[0]
+        if not len(self) or n == 0:
+            return np.zeros((n, 0), dtype=np.int32), np.zeros((n, 0), dtype=np.float32)
+        if self.ann is not None:
+            nprobe = getattr(config, "ANN_NPROBE", 8)
+            return self.ann.search(self, queries_norm, strategy, top_k, nprobe=nprobe)
+        rerank = getattr(config, "RERANK_TOP_N", 0)
+        if rerank and strategy != "centroid" and self.precision != "float32" and self.exact is not None:
+            n_cand = max(rerank, top_k)
+            if self.shards is not None:
+                cand = self.shards.candidates(self, queries_norm, n_cand)
+            else:
+                cand = top_k_columns(self._rows.dot(queries_norm), max(1, min(n_cand, self._n)))
+            return self._search_reranked(queries_norm, strategy, top_k, cand)
+        if self.shards is not None and strategy != "centroid":
+            return self.shards.search(self, queries_norm, strategy, top_k)
+        sims, col_labels = self.scores(queries_norm, strategy)
+        cols = top_k_columns(sims, max(1, min(top_k, sims.shape[1])))
+        return col_labels[cols], np.take_along_axis(sims, cols, axis=1)
+
+    def _search_reranked(
+        self,
+        queries_norm: np.ndarray,
+        strategy: str,
+        top_k: int,
+        cand: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Hitung ulang similarity baris kandidat (N, R) (teratas menurut skor terkuantisasi) dengan
+        embedding float32 (self.exact). Voting = similarity exact terbaik per identitas di antara kandidat.
+        """
+        n = queries_norm.shape[0]
+        # Baris unik dibaca sekali (urut, ramah memmap) untuk semua query
+        uniq, inverse = np.unique(cand, return_inverse=True)
+        exact = normalize_rows(np.asarray(self.exact[uniq], dtype=np.float32))
+        labels_out = np.full((n, top_k), -1, dtype=np.int32)
+        sims_out = np.zeros((n, top_k), dtype=np.float32)
+        for i, (q, rows, pos) in enumerate(zip(queries_norm, cand, inverse.reshape(cand.shape))):
+            sims = np.clip(exact[pos] @ q, 0.0, 1.0)
+            col_labels = self.labels[rows]
+            if strategy == "voting":
+                order = np.argsort(col_labels, kind="stable")
+                col_labels, sims = col_labels[order], sims[order]
+                starts = np.flatnonzero(np.r_[True, col_labels[1:] != col_labels[:-1]])
+                sims = np.maximum.reduceat(sims, starts)
+                col_labels = col_labels[starts]
+            k = min(top_k, len(sims))
+            cols = top_k_columns(sims[None, :], k)[0]
+            labels_out[i, :k] = col_labels[cols]
+            sims_out[i, :k] = sims[cols]
+        return labels_out, sims_out
+
+
+def _add_by_label(out: np.ndarray, labels: np.ndarray, rows: np.ndarray) -> None:
+    """
+    out[labels[i]] += rows[i] untuk semua baris; setara np.add.at tetapi per segmen label
+    (urut stabil + reduceat), jauh lebih cepat untuk matriks.
+    """
+    if not len(labels):
+        return
+    order = np.argsort(labels, kind="stable")
+    ordered = labels[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    out[ordered[starts]] += np.add.reduceat(np.asarray(rows)[order].astype(out.dtype, copy=False), starts, axis=0)
+
+
+def top_k_columns(sims: np.ndarray, k: int) -> np.ndarray:
+    """Indeks k kolom dengan skor tertinggi per baris, terurut menurun (dipakai juga ann_index/shard_search)."""
+    if k == 1:
+        return np.argmax(sims, axis=1)[:, None]
+    cols = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, cols, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(cols, order, axis=1)
+
+
+def normalize_rows(mat: np.ndarray) -> np.ndarray:
+    """L2 normalize tiap baris matriks (M, D)."""
+    return (mat / (np.linalg.norm(mat, axis=1, keepdims=True) + 1e-8)).astype(np.float32)
+
+
+# Baris baru di luar shard (relatif terhadap baris di shard) sebelum shard dibangun ulang
+_SHARD_MAX_TAIL = 0.1
+
+# Indeks galeri aktif (dibangun ulang hanya jika file database berubah)
+_index: Optional[GalleryIndex] = None
+_index_stamp: Optional[Tuple[int, int, int]] = None
+
+
+def _db_stamp() -> Optional[Tuple[int, int, int]]:
+    """
+    Penanda murah versi database (satu os.stat): inode berubah saat ditulis ulang (rename),
+    ukuran bertambah saat append; mtime untuk sisanya. None jika belum ada.
+    """
+    try:
+        st = os.stat(config.FACE_DB_RECORDS_FILE)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def db_version() -> Optional[Tuple[int, int, int]]:
+    """
+    Versi database saat ini (murah, tanpa membaca isi). Proses yang berjalan lama cukup
+    membandingkannya untuk tahu apakah database berubah; get_index() melakukannya otomatis.
+    """
+    return _db_stamp()
+
+
+def _invalidate_index() -> None:
+    """Buang indeks di memori; dibangun ulang pada pencarian berikutnya."""
+    global _index, _index_stamp
+    if _index is not None:
+        _index.close()
+    _index = None
+    _index_stamp = None
+
+
+def _meta_fingerprint(meta: List[dict]) -> str:
+    """Sidik isi database (urutan record, identitas, sumber) untuk validasi indeks ANN tersimpan."""
+    h = hashlib.sha1()
+    for m in meta:
+        h.update(f"{m.get('row')}\0{m['identity']}\0{m.get('image_path', '')}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _wants_ann(index: GalleryIndex) -> bool:
+    return getattr(config, "SEARCH_MODE", "exact") == "ivf" and len(index) >= getattr(config, "ANN_MIN_GALLERY_SIZE", 0)
+
+
+def _attach_ann(index: GalleryIndex, meta: List[dict]) -> None:
+    """
+    Pasang indeks IVF ke galeri jika SEARCH_MODE = "ivf" dan galeri cukup besar.
+    Indeks tersimpan di ANN_INDEX_FILE dipakai ulang bila masih cocok dengan isi database;
+    record baru (hasil add_face) cukup di-assign ke partisi terdekat tanpa melatih ulang.
+    Dilatih ulang jika database ditulis ulang (hapus identitas) atau tumbuh lebih dari 2x.
+    """
+    if not _wants_ann(index):
+        return
+    import ann_index
+
+    path = config.ANN_INDEX_FILE
+    n = len(meta)
+    saved = ann_index.IVFIndex.load(path)
+    if saved is not None:
+        centroids, assign, fingerprint = saved
+        m = len(assign)
+        if (
+            centroids.shape[1] == index.stored_matrix.shape[1]
+            and m <= n < 2 * max(m, 1)
+            and fingerprint == _meta_fingerprint(meta[:m])
+        ):
+            index.ann = ann_index.IVFIndex(centroids, assign)
+            if m < n:
+                index.ann.add(index.stored_matrix[m:])
+                index.ann.save(path, _meta_fingerprint(meta))
+            return
+    index.ann = ann_index.IVFIndex.train(index.stored_matrix, getattr(config, "ANN_NLIST", None))
+    index.ann.save(path, _meta_fingerprint(meta))
+
+
+def _attach_exact(index: GalleryIndex, embs: Optional[np.ndarray] = None) -> None:
+    """
+    Pasang embedding float32 mentah untuk re-rank (hanya presisi terkuantisasi dan RERANK_TOP_N > 0).
+    Store berurutan memberi memmap (zero-copy): hanya baris kandidat yang dibaca dari disk/page cache.
+    Setelah penambahan incremental, file embedding cukup dibuka ulang tanpa membaca metadata.
+    """
+    if index.precision == "float32" or getattr(config, "RERANK_TOP_N", 0) <= 0:
+        index.exact = None
+        return
+    if index.exact is not None and len(index.exact) == len(index):
+        return
+    if embs is None and isinstance(index.exact, np.memmap) and len(index):
+        mat = _open_matrix(index.stored_matrix.shape[1])
+        if len(mat) >= len(index):
+            embs = mat[:len(index)]
+    if embs is None:
+        _, embs, _ = _read_store()
+    index.exact = embs if len(embs) == len(index) else None
+
+
+def _attach_shards(index: GalleryIndex) -> None:
+    """
+    Pasang pencarian ter-shard jika SEARCH_MODE = "sharded" dan galeri cukup besar.
+    Baris baru (add_face) dicari di proses induk sampai melebihi _SHARD_MAX_TAIL dari baris
+    yang ada di shard; setelah itu shard dibangun ulang.
+    """
+    if getattr(config, "SEARCH_MODE", "exact") != "sharded" or len(index) < getattr(config, "SHARD_MIN_GALLERY_SIZE", 0):
+        index.close()
+        return
+    if index.shards is not None and len(index) - index.shards.covered <= _SHARD_MAX_TAIL * index.shards.covered:
+        return
+    import shard_search
+
+    index.close()
+    index.shards = shard_search.ShardedSearch(index, getattr(config, "SHARD_WORKERS", None))
+
+
+def _update_index(stamp_before: Optional[Tuple[int, int, int]], update) -> None:
+    """
+    Terapkan perubahan ke indeks aktif secara incremental (update(index)) jika indeks sinkron
+    dengan database sebelum perubahan; jika tidak (mis. diubah proses lain), indeks dibuang.
+    Galeri exact yang tumbuh melewati ANN_MIN_GALLERY_SIZE (SEARCH_MODE = "ivf") langsung diberi indeks IVF.
+    Perubahan diterapkan pada salinan (GalleryIndex.copy) yang lalu menggantikan indeks aktif, sehingga
+    thread lain yang sedang mencari tetap melihat indeks lama yang utuh. Dipanggil di bawah write_lock.
+    """
+    global _index, _index_stamp
+    if _index is not None and stamp_before is not None and _index_stamp == stamp_before:
+        index = _index.copy()
+        update(index)
+        if index.ann is None and _wants_ann(index):
+            _, meta = _read_meta(strict=True)
+            _attach_ann(index, meta)
+        _index, _index_stamp = index, _db_stamp()
+    else:
+        _invalidate_index()
+
+
+def get_index() -> GalleryIndex:
+    """
+    Indeks galeri yang sedang aktif (snapshot database).
+    Dibangun sekali lalu dipakai ulang; tiap panggilan hanya mengecek versi (db_version) dan
+    membangun ulang jika database diubah (oleh proses ini atau proses lain).
+    Selama penulis lain sedang menulis, atau snapshot baru gagal dibaca, indeks lama tetap dipakai
+    tanpa menunggu; pembangunan ulang dicoba lagi pada panggilan berikutnya.
+    """
+    global _index, _index_stamp
+    # Penulis di thread lain bisa mengganti/membuang _index kapan saja: pakai referensi lokal
+    index, stamp = _index, _db_stamp()
+    if index is None or stamp != _index_stamp:
+        try:
+            with metrics.stage("db_load"):
+                snapshot = _read_store(strict=True, blocking=index is None)
+        except (OSError, ValueError):
+            if index is None:
+                raise
+            snapshot = None
+        if snapshot is not None:
+            meta, embs, stamp = snapshot
+            with metrics.stage("index_build"):
+                index = GalleryIndex([m["identity"] for m in meta], embs)
+                _attach_ann(index, meta)
+                _attach_exact(index, embs)
+            old, _index, _index_stamp = _index, index, stamp
+            if old is not None:
+                old.close()
+    else:
+        _attach_exact(index)
+    _attach_shards(index)
+    metrics.set_gauge("gallery_size", len(index))
+    return index
+
+
+def find_closest_batch(
+    embeddings: np.ndarray,
+    threshold: Optional[float] = None,
+    top_k: int = 1,
+) -> List[List[Tuple[Optional[str], float]]]:
+    """
+    Cari identitas untuk banyak embedding sekaligus (mis. semua wajah dalam satu frame).
+    - embeddings: matriks (N, D) atau list embedding
+    - threshold: ambang similarity; default dari config
+    - top_k: jumlah kandidat per query
+    Strategi dari config (closest, voting, centroid), satu perkalian matriks-matriks untuk semua query.
+    Returns: per query, list (identity atau None jika di bawah threshold, similarity 0-1)
+    terurut dari similarity tertinggi. Database kosong memberi [(None, 0.0)] per query.
+    """
+    queries = np.asarray(embeddings, dtype=np.float32)
+    if queries.size == 0:
+        return []
+    if queries.ndim == 1:
+        queries = queries.reshape(1, -1)
+    queries = queries.reshape(queries.shape[0], -1)
+    index = get_index()
+    if not len(index):
+        return [[(None, 0.0)] for _ in range(queries.shape[0])]
+
+    th = threshold if threshold is not None else config.MIN_SIMILARITY_THRESHOLD
+    strategy = getattr(config, "MATCH_STRATEGY", "closest")
+    with metrics.stage("match"):
+        labels, sims = index.search(normalize_rows(queries), strategy, top_k)
+    metrics.observe("match_batch_size", queries.shape[0])
+    out = []
+    for row_labels, row_sims in zip(labels, sims):
+        out.append([
+            (index.identities[int(label)] if label >= 0 and sim >= th else None, float(sim))
+            for label, sim in zip(row_labels, row_sims)
+        ] or [(None, 0.0)])
+    return out
 
 
 def find_closest(
@@ -142,19 +1077,8 @@ def find_closest(
     Menggunakan strategi dari config: closest, voting, atau centroid.
     Returns: (identity atau None, similarity score 0-1).
     """
-    records = _load_db()
-    if not records:
-        return None, 0.0
-
-    th = threshold if threshold is not None else config.MIN_SIMILARITY_THRESHOLD
-    emb_norm = _normalize_emb(embedding)
-    strategy = getattr(config, "MATCH_STRATEGY", "closest")
-
-    if strategy == "centroid":
-        return _find_closest_centroid(emb_norm, records, th)
-    if strategy == "voting":
-        return _find_closest_voting(emb_norm, records, th)
-    return _find_closest_single(emb_norm, records, th)
+    emb = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    return find_closest_batch(emb, threshold)[0][0]
 
 
 def remove_identity(identity: str) -> int:
@@ -162,12 +1086,19 @@ def remove_identity(identity: str) -> int:
     Hapus semua embedding untuk satu identitas (nama).
     Returns: jumlah record yang dihapus.
     """
-    records = _load_db()
-    before = len(records)
-    records = [r for r in records if r["identity"] != identity]
-    removed = before - len(records)
-    if removed > 0:
-        _save_db(records)
+    global _index, _index_stamp
+    with write_lock():
+        _, meta = _read_meta(strict=True)
+        removed = sum(1 for m in meta if m["identity"] == identity)
+        if removed > 0:
+            stamp_before = _db_stamp()
+            index = _index if _index_stamp == stamp_before else None
+            _save_db([r for r in _load_db(strict=True) if r["identity"] != identity])
+            if index is not None and index.ann is None:
+                # Indeks exact cukup dikurangi (running sum centroid ikut terhapus), pada salinan
+                index = index.copy()
+                index.remove_identity(identity)
+                _index, _index_stamp = index, _db_stamp()
     return removed
 
 
@@ -178,4 +1109,4 @@ def clear_db() -> None:
 
 def count_faces() -> int:
     """Jumlah wajah (record) di database."""
-    return len(_load_db())
+    return len(get_metadata())
@@ -0,0 +1,363 @@
+"""
+HTTP API pengenalan wajah (asyncio, tanpa dependensi tambahan).
+Model dan indeks galeri dimuat sekali saat start; decode + deteksi berjalan di thread pool,
+embedding + pencocokan dari request yang bersamaan digabung oleh MicroBatcher.
+
+Endpoint (semua respons JSON):
+  GET  /health                   status server
+  GET  /identities               daftar identitas + jumlah embedding
+  GET  /stats                    statistik request dan batching
+  GET  /metrics                  metrik per tahap dalam format teks Prometheus (app.py --metrics serve)
+  POST /recognize                gambar mentah di body, atau JSON {"image": base64}
+  POST /verify                   JSON {"image1": base64, "image2": base64}
+  POST /register?identity=NAMA   gambar mentah di body, atau JSON {"identity", "image", "all_faces"};
+                                 ambang kualitas registrasi (jalur "enroll"), alasan penolakan di "rejected"
+"""
+import asyncio
+import base64
+import binascii
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import cv2
+import config
+import face_db
+import metrics
+import quality
+import recognition_engine as engine
+from batching import MicroBatcher
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """Error yang dikirim ke klien sebagai {"error": message} dengan status HTTP tertentu."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _decode_image(data: bytes) -> np.ndarray:
+    """Bytes file gambar (JPEG/PNG/...) -> array BGR."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise HTTPError(400, "Gambar tidak dapat dibaca")
+    return img
+
+
+def _b64_image(payload: dict, key: str) -> bytes:
+    value = payload.get(key)
+    if not isinstance(value, str):
+        raise HTTPError(400, f"Field '{key}' (gambar base64) wajib diisi")
+    try:
+        return base64.b64decode(value.split(",", 1)[-1], validate=False)
+    except (binascii.Error, ValueError):
+        raise HTTPError(400, f"Field '{key}' bukan base64 yang valid")
+
+
+def _parse_json(body: bytes) -> dict:
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Body bukan JSON yang valid")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Body JSON harus berupa object")
+    return payload
+
+
+class RecognitionAPI:
+    """
+    Layanan HTTP dengan model hangat.
+    - workers: thread untuk decode + preprocess + deteksi (default config.API_WORKERS / jumlah CPU)
+    - max_batch / max_latency_ms: batas batch embedding lintas request (default config.SERVER_*)
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        max_latency_ms: Optional[float] = None,
+    ):
+        workers = workers or getattr(config, "API_WORKERS", None) or None
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+        self.max_batch = max_batch or getattr(config, "SERVER_MAX_BATCH", 32)
+        self.max_latency_ms = max_latency_ms if max_latency_ms is not None else getattr(config, "SERVER_MAX_LATENCY_MS", 20.0)
+        self.max_body = int(getattr(config, "API_MAX_BODY_MB", 10) * 1024 * 1024)
+        self.batcher: Optional[MicroBatcher] = None
+        self._counters: Dict[str, int] = {"requests": 0, "errors": 0}
+        self._latency: Dict[str, List[float]] = {}
+        self._t_start = time.perf_counter()
+        self._routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/identities"): self._identities,
+            ("GET", "/stats"): self._stats,
+            ("GET", "/metrics"): self._metrics,
+            ("POST", "/recognize"): self._recognize,
+            ("POST", "/verify"): self._verify,
+            ("POST", "/register"): self._register,
+        }
+
+    # --- Inferensi -------------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Muat model, detektor, dan indeks galeri sekarang, lalu jalankan batcher."""
+        engine.warmup()
+        self.batcher = MicroBatcher(self._embed_and_match, self.max_batch, self.max_latency_ms, name="api-batcher")
+
+    def close(self) -> None:
+        if self.batcher is not None:
+            self.batcher.close()
+        self.pool.shutdown()
+
+    def _embed_and_match(self, items: List[Tuple[np.ndarray, bool]]) -> List[tuple]:
+        """
+        Fungsi batch: item = (crop wajah, perlu dicocokkan ke galeri?).
+        Returns: (embedding, (identity, similarity) atau None) per item.
+        """
+        embeddings = engine.embed_faces([face for face, _ in items])
+        want = [i for i, (_, match) in enumerate(items) if match]
+        out = [(emb, None) for emb in embeddings]
+        if want:
+            matches = face_db.find_closest_batch(np.stack([embeddings[i] for i in want]))
+            for i, candidates in zip(want, matches):
+                out[i] = (embeddings[i], candidates[0])
+        return out
+
+    async def _detect(self, data: bytes, mode: str = "image", rejects: Optional[List[str]] = None) -> List[dict]:
+        """
+        Decode + preprocess + deteksi di thread pool.
+        mode: jalur detektor + ambang kualitas ("image", atau "enroll" untuk registrasi, sama dengan CLI);
+        alasan wajah yang dibuang penyaringan kualitas ditambahkan ke `rejects`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool,
+            lambda: engine.detect_faces(_decode_image(data), mode, rejects, inplace=True),
+        )
+
+    async def _embed(self, faces: List[dict], match: bool) -> List[tuple]:
+        futures = self.batcher.submit_many([(f["face"], match) for f in faces])
+        return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+    # --- Endpoint --------------------------------------------------------------------------
+
+    # Baca database (kunci file + sidecar) di thread pool, bukan di event loop: saat ada penulis,
+    # pembacaan bisa menunggu dan tidak boleh menahan request lain
+    async def _health(self, query: dict, headers: dict, body: bytes) -> dict:
+        size = await asyncio.get_running_loop().run_in_executor(self.pool, face_db.count_faces)
+        return {"status": "ok", "gallery_size": size}
+
+    async def _identities(self, query: dict, headers: dict, body: bytes) -> dict:
+        by_id = await asyncio.get_running_loop().run_in_executor(self.pool, face_db.get_count_by_identity)
+        return {"identities": by_id, "total_embeddings": sum(by_id.values())}
+
+    async def _stats(self, query: dict, headers: dict, body: bytes) -> dict:
+        return self.stats()
+
+    async def _metrics(self, query: dict, headers: dict, body: bytes) -> str:
+        return metrics.to_prometheus()
+
+    def _image_from_request(self, headers: dict, body: bytes, key: str = "image") -> Tuple[bytes, dict]:
+        """Gambar dari body mentah (image/*, octet-stream) atau field base64 di body JSON."""
+        if headers.get("content-type", "").split(";")[0].strip() == "application/json":
+            payload = _parse_json(body)
+            return _b64_image(payload, key), payload
+        if not body:
+            raise HTTPError(400, "Body kosong: kirim file gambar atau JSON {\"image\": base64}")
+        return body, {}
+
+    async def _recognize(self, query: dict, headers: dict, body: bytes) -> dict:
+        data, _ = self._image_from_request(headers, body)
+        faces = await self._detect(data)
+        results = await self._embed(faces, match=True)
+        return {
+            "faces": [
+                {"identity": identity, "similarity": float(sim), "facial_area": f["facial_area"]}
+                for f, (_, (identity, sim)) in zip(faces, results)
+            ]
+        }
+
+    async def _verify(self, query: dict, headers: dict, body: bytes) -> dict:
+        payload = _parse_json(body)
+        datas = [_b64_image(payload, "image1"), _b64_image(payload, "image2")]
+        detected = await asyncio.gather(*(self._detect(d) for d in datas))
+        for name, faces in zip(("image1", "image2"), detected):
+            if not faces:
+                raise HTTPError(400, f"Tidak ada wajah terdeteksi di {name}")
+        (emb1, _), (emb2, _) = await self._embed([detected[0][0], detected[1][0]], match=False)
+        a, b = np.asarray(emb1).reshape(1, -1), np.asarray(emb2).reshape(1, -1)
+        distance = float(engine.pair_distances(a, b)[0])
+        similarity = float(1.0 - engine.pair_distances(a, b, "cosine")[0])
+        threshold = engine.verify_threshold()
+        return {"verified": distance <= threshold, "distance": distance, "similarity": similarity, "threshold": threshold}
+
+    async def _register(self, query: dict, headers: dict, body: bytes) -> dict:
+        data, payload = self._image_from_request(headers, body)
+        identity = payload.get("identity") or (query.get("identity") or [None])[0]
+        if not identity:
+            raise HTTPError(400, "Nama identitas wajib diisi (field 'identity' atau ?identity=)")
+        all_faces = bool(payload.get("all_faces")) or (query.get("all_faces") or ["0"])[0] in ("1", "true")
+        rejects: List[str] = []
+        faces = await self._detect(data, "enroll", rejects)
+        if not all_faces:
+            faces = faces[:1]
+        if not faces:
+            # Foto yang ditolak register/sync (wajah terlalu kecil, buram, ...) juga ditolak di sini
+            weak = sorted(set(r for r in rejects if r != "no_face"))
+            return {"identity": identity, "registered": 0, "rejected": weak}
+        results = await self._embed(faces, match=False)
+        records = [{"identity": identity, "embedding": emb, "image_path": None} for emb, _ in results]
+        # Kunci penulis + pertukaran indeks ada di face_db; pencarian yang berjalan tidak perlu ditahan
+        added = await asyncio.get_running_loop().run_in_executor(self.pool, face_db.add_faces, records)
+        return {"identity": identity, "registered": added}
+
+    # --- HTTP ------------------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Jumlah request, latensi per endpoint (p50/p99 ms), dan statistik batcher."""
+        latency = {}
+        for path, values in self._latency.items():
+            arr = np.asarray(values) * 1000.0
+            latency[path] = {
+                "count": len(arr),
+                "p50_ms": float(np.percentile(arr, 50)),
+                "p99_ms": float(np.percentile(arr, 99)),
+            }
+        return {
+            "uptime_s": time.perf_counter() - self._t_start,
+            "counters": dict(self._counters),
+            "latency": latency,
+            "batcher": self.batcher.stats() if self.batcher else {},
+            "detectors": engine.detector_stats(),
+            "quality": quality.stats(),
+        }
+
+    async def dispatch(self, method: str, target: str, headers: dict, body: bytes) -> Tuple[int, dict]:
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                return 405, {"error": f"Method {method} tidak didukung untuk {url.path}"}
+            return 404, {"error": f"Endpoint tidak dikenal: {url.path}"}
+        t0 = time.perf_counter()
+        self._counters["requests"] += 1
+        try:
+            status, payload = 200, await handler(parse_qs(url.query), headers, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        if status != 200:
+            self._counters["errors"] += 1
+        # Simpan sampel latensi terakhir saja per endpoint
+        samples = self._latency.setdefault(url.path, [])
+        samples.append(time.perf_counter() - t0)
+        if len(samples) > 10000:
+            del samples[:5000]
+        return status, payload
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 minimal dengan keep-alive: satu request -> satu respons JSON."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Request line tidak valid"}, False)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = h.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    length = self._content_length(headers)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": str(e)}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method.upper(), target, headers, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _content_length(self, headers: dict) -> int:
+        """Content-Length sebagai panjang body; HTTPError jika bukan bilangan bulat >= 0 atau melebihi batas."""
+        value = headers.get("content-length") or "0"
+        try:
+            length = int(value)
+        except ValueError:
+            raise HTTPError(400, f"Content-Length tidak valid: {value!r}")
+        if length < 0:
+            raise HTTPError(400, f"Content-Length tidak boleh negatif: {length}")
+        if length > self.max_body:
+            raise HTTPError(413, "Body terlalu besar")
+        return length
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool) -> None:
+        """payload dict -> JSON; str -> text/plain (format eksposisi Prometheus)."""
+        if isinstance(payload, str):
+            data, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            data, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int, ready=None) -> None:
+        """Jalankan server sampai dibatalkan; ready(host, port) dipanggil setelah socket siap."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready:
+            ready(*server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+
+def run(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: Optional[int] = None,
+    max_batch: Optional[int] = None,
+    max_latency_ms: Optional[float] = None,
+    ready=None,
+) -> None:
+    """Muat model lalu layani HTTP sampai Ctrl+C."""
+    api = RecognitionAPI(workers, max_batch, max_latency_ms)
+    api.start()
+    try:
+        asyncio.run(api.serve(
+            host or getattr(config, "API_HOST", "127.0.0.1"),
+            port if port is not None else getattr(config, "API_PORT", 8000),
+            ready,
+        ))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
@@ -0,0 +1,191 @@
+"""
+Cache identitas jangka pendek untuk aliran video (satu instance per kamera/stream).
+Orang yang sama berdiri di depan kamera beberapa detik; tanpa cache tiap frame di-embed (ArcFace)
+dan dicocokkan ulang. Wajah hasil deteksi dicocokkan ke entri cache lewat:
+- posisi kasar: IoU bbox dengan posisi terakhir entri >= IDENTITY_CACHE_IOU
+- tampilan    : korelasi crop wajah ter-align yang diperkecil (abu-abu 16x16, dinormalisasi)
+                dengan crop terakhir entri >= IDENTITY_CACHE_MIN_APPEARANCE
+Jika cocok dan hasil pengenalan entri belum lebih tua dari IDENTITY_CACHE_TTL detik, identitas entri
+dipakai ulang tanpa embedding. Setelah TTL lewat, wajah dikenali penuh lagi dan entri diperbarui.
+Entri yang tidak terlihat selama IDENTITY_CACHE_TTL dibuang; jumlah entri dibatasi IDENTITY_CACHE_MAX_ENTRIES
+(yang paling lama tidak terlihat dibuang dulu).
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import cv2
+import config
+import metrics
+from video import Box, area_to_box, iou
+
+_SIGNATURE_SIZE = 16
+
+_stats = {"hits": 0, "misses": 0, "refreshes": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(getattr(config, "IDENTITY_CACHE_ENABLED", True))
+
+
+def create() -> Optional["IdentityCache"]:
+    """Cache baru untuk satu sumber video, atau None jika IDENTITY_CACHE_ENABLED = False."""
+    return IdentityCache() if enabled() else None
+
+
+def signature(face: np.ndarray) -> np.ndarray:
+    """Ringkasan tampilan crop wajah (BGR/abu-abu uint8): vektor 16x16 ber-mean 0 dan norma 1."""
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+    small = cv2.resize(gray, (_SIGNATURE_SIZE, _SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    vec = small.astype(np.float32).ravel()
+    vec -= vec.mean()
+    return vec / (np.linalg.norm(vec) + 1e-6)
+
+
+class _Entry:
+    __slots__ = ("box", "signature", "identity", "similarity", "recognized_at", "seen_at")
+
+    def __init__(self, box, sig, identity, similarity, now):
+        self.box = box
+        self.signature = sig
+        self.identity = identity
+        self.similarity = similarity
+        self.recognized_at = now
+        self.seen_at = now
+
+
+class IdentityCache:
+    """
+    Cache identitas per wajah untuk satu sumber video. Pemakaian per frame:
+        results = cache.resolve(faces, match)
+    faces: hasil extract_faces (punya "face" + "facial_area"); match: fungsi yang mengenali penuh
+    list wajah (yang tidak ada di cache) -> (identity, similarity) per wajah.
+    Aman dipakai dari beberapa thread (mis. worker VideoPipeline); match dijalankan di luar kunci.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        min_iou: Optional[float] = None,
+        min_appearance: Optional[float] = None,
+    ):
+        self.ttl = float(ttl if ttl is not None else getattr(config, "IDENTITY_CACHE_TTL", 2.0))
+        self.max_entries = int(max_entries or getattr(config, "IDENTITY_CACHE_MAX_ENTRIES", 64))
+        self.min_iou = float(min_iou if min_iou is not None else getattr(config, "IDENTITY_CACHE_IOU", 0.3))
+        self.min_appearance = float(
+            min_appearance if min_appearance is not None else getattr(config, "IDENTITY_CACHE_MIN_APPEARANCE", 0.85)
+        )
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> int:
+        evicted = 0
+        for key in [k for k, e in self._entries.items() if now - e.seen_at > self.ttl]:
+            del self._entries[key]
+            evicted += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def _lookup(self, boxes: List[Box], sigs: List[np.ndarray], now: float):
+        """(hits {index: (identity, similarity)}, {index: key entri yang perlu di-refresh}, jumlah entri dibuang)."""
+        hits: Dict[int, Tuple[Optional[str], float]] = {}
+        stale: Dict[int, int] = {}
+        with self._lock:
+            evicted = self._expire(now)
+            # Pasangan (wajah, entri) dengan skor tampilan tertinggi dipasangkan dulu
+            pairs = []
+            for i, (box, sig) in enumerate(zip(boxes, sigs)):
+                for key, e in self._entries.items():
+                    if iou(box, e.box) >= self.min_iou:
+                        score = float(np.dot(sig, e.signature))
+                        if score >= self.min_appearance:
+                            pairs.append((score, i, key))
+            pairs.sort(reverse=True)
+            used_faces, used_entries = set(), set()
+            for _, i, key in pairs:
+                if i in used_faces or key in used_entries:
+                    continue
+                used_faces.add(i)
+                used_entries.add(key)
+                e = self._entries[key]
+                e.box, e.signature, e.seen_at = boxes[i], sigs[i], now
+                self._entries.move_to_end(key)
+                if now - e.recognized_at <= self.ttl:
+                    hits[i] = (e.identity, e.similarity)
+                else:
+                    stale[i] = key
+        return hits, stale, evicted
+
+    def _store(self, boxes, sigs, stale, misses, matches, now: float) -> int:
+        with self._lock:
+            for i, (identity, sim) in zip(misses, matches):
+                key = stale.get(i)
+                if key is not None and key in self._entries:
+                    e = self._entries[key]
+                    e.identity, e.similarity, e.recognized_at = identity, sim, now
+                    e.box, e.signature, e.seen_at = boxes[i], sigs[i], now
+                    self._entries.move_to_end(key)
+                else:
+                    self._entries[next(self._ids)] = _Entry(boxes[i], sigs[i], identity, sim, now)
+            return self._expire(now)
+
+    def resolve(
+        self,
+        faces: List[dict],
+        match: Callable[[List[dict]], List[Tuple[Optional[str], float]]],
+        now: Optional[float] = None,
+    ) -> List[Tuple[Optional[str], float]]:
+        """
+        (identity, similarity) per wajah: dari cache jika posisi + tampilan cocok dan hasilnya belum
+        kedaluwarsa, selain itu lewat match (sekali, untuk semua wajah yang tidak ada di cache).
+        """
+        if not faces:
+            return []
+        now = time.monotonic() if now is None else now
+        with metrics.stage("identity_cache"):
+            boxes = [area_to_box(f.get("facial_area", {})) for f in faces]
+            sigs = [signature(f["face"]) for f in faces]
+            hits, stale, evicted = self._lookup(boxes, sigs, now)
+        misses = [i for i in range(len(faces)) if i not in hits]
+        matches = list(match([faces[i] for i in misses])) if misses else []
+        evicted += self._store(boxes, sigs, stale, misses, matches, now)
+        _count(hits=len(hits), misses=len(misses), refreshes=len(stale), evictions=evicted)
+        results = dict(hits)
+        results.update(zip(misses, matches))
+        return [results[i] for i in range(len(faces))]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _count(**values: int) -> None:
+    with _stats_lock:
+        for name, n in values.items():
+            _stats[name] += n
+    for name, result in (("hits", "hit"), ("misses", "miss")):
+        if values.get(name):
+            metrics.incr("identity_cache", values[name], result=result)
+
+
+def stats(reset: bool = False) -> Dict[str, int]:
+    """
+    Jumlah wajah dari cache (hits = panggilan embedding yang dihemat) dan yang dikenali penuh (misses;
+    refreshes = bagian misses karena TTL entri habis), serta entri yang dibuang, untuk semua instance.
+    """
+    with _stats_lock:
+        out = dict(_stats)
+        if reset:
+            for name in _stats:
+                _stats[name] = 0
+    return out
@@ -0,0 +1,270 @@
+"""
+Instrumentasi ringan untuk jalur pengenalan: timer per tahap, counter (dengan label), gauge,
+dan distribusi nilai (mis. jumlah wajah per frame).
+Nonaktif secara default (config.METRICS_ENABLED); saat nonaktif tiap titik ukur hanya satu
+pengecekan flag dan tidak ada yang disimpan.
+
+Pemakaian:
+    with metrics.stage("detect"):
+        ...
+    metrics.incr("embedding_cache", result="hit")
+    metrics.observe("faces_per_frame", len(faces))
+    metrics.set_gauge("gallery_size", n)
+
+Ekspor: snapshot() (dict), write_jsonl(path) (satu baris JSON per panggilan),
+to_prometheus() (format teks Prometheus), report() (tabel untuk terminal).
+Pengecualian yang keluar dari blok stage() dihitung sebagai errors{stage=...}.
+"""
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import config
+
+_enabled = bool(getattr(config, "METRICS_ENABLED", False))
+_lock = threading.Lock()
+_max_samples = int(getattr(config, "METRICS_MAX_SAMPLES", 10000))
+# nama -> [jumlah total, total nilai, deque sampel terakhir]; timer disimpan dalam detik
+_stages: Dict[str, list] = {}
+_values: Dict[str, list] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[str, float] = {}
+_t_start = time.time()
+
+
+def enable(on: bool = True) -> None:
+    """Aktifkan (atau matikan) pengumpulan metrik untuk proses ini."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Hapus semua metrik yang terkumpul."""
+    global _t_start
+    with _lock:
+        _stages.clear()
+        _values.clear()
+        _counters.clear()
+        _gauges.clear()
+        _t_start = time.time()
+
+
+class _Timer:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _add(_stages, self.name, time.perf_counter() - self.t0)
+        if exc_type is not None:
+            incr("errors", stage=self.name)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stage(name: str):
+    """Context manager pengukur waktu satu tahap; tanpa biaya berarti saat metrik nonaktif."""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def _add(table: Dict[str, list], name: str, value: float) -> None:
+    with _lock:
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = [0, 0.0, deque(maxlen=_max_samples)]
+        entry[0] += 1
+        entry[1] += value
+        entry[2].append(value)
+
+
+def observe(name: str, value: float) -> None:
+    """Catat satu nilai ke distribusi `name` (mis. faces_per_frame)."""
+    if _enabled:
+        _add(_values, name, float(value))
+
+
+def incr(name: str, n: float = 1, **labels) -> None:
+    """Tambah counter `name` dengan label opsional (mis. incr("errors", stage="detect"))."""
+    if not _enabled:
+        return
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set nilai gauge (mis. gallery_size)."""
+    if _enabled:
+        with _lock:
+            _gauges[name] = float(value)
+
+
+def _percentile(ordered: list, q: float) -> float:
+    """Persentil dengan interpolasi linear (sama seperti np.percentile) dari list terurut."""
+    pos = (len(ordered) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _summary(entry: list, scale: float = 1.0, unit: str = "") -> dict:
+    """count/total/mean dari semua observasi; persentil dan max dari sampel terakhir."""
+    count, total, samples = entry
+    ordered = sorted(samples)
+    out = {"count": count}
+    out["total" + unit] = total * scale
+    out["mean" + unit] = total * scale / count if count else 0.0
+    for q in (50, 95, 99):
+        out[f"p{q}{unit}"] = _percentile(ordered, q) * scale if ordered else 0.0
+    out["max" + unit] = ordered[-1] * scale if ordered else 0.0
+    return out
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+def snapshot() -> dict:
+    """
+    Semua metrik sebagai dict (siap JSON):
+    stages (count, total_ms, mean_ms, p50_ms, p95_ms, p99_ms, max_ms per tahap),
+    values (distribusi), counters ("nama{label=...}": n), gauges.
+    """
+    with _lock:
+        stages = {name: _summary(e, 1000.0, "_ms") for name, e in _stages.items()}
+        values = {name: _summary(e) for name, e in _values.items()}
+        counters = {
+            (f"{name}{{{_label_text(labels)}}}" if labels else name): n
+            for (name, labels), n in sorted(_counters.items())
+        }
+        gauges = dict(_gauges)
+    return {
+        "time": time.time(),
+        "uptime_s": time.time() - _t_start,
+        "stages": stages,
+        "values": values,
+        "counters": counters,
+        "gauges": gauges,
+    }
+
+
+def write_jsonl(path: str, **extra) -> None:
+    """Tambahkan snapshot() (plus field tambahan) sebagai satu baris JSON ke file `path`."""
+    record = snapshot()
+    record.update(extra)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def to_prometheus(prefix: str = "face_") -> str:
+    """Metrik dalam format teks Prometheus (untuk endpoint /metrics)."""
+    lines = []
+    with _lock:
+        stages = {name: (e[0], e[1], sorted(e[2])) for name, e in _stages.items()}
+        values = {name: (e[0], e[1], sorted(e[2])) for name, e in _values.items()}
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+
+    if stages:
+        metric = f"{prefix}stage_seconds"
+        lines.append(f"# HELP {metric} Durasi per tahap pipeline pengenalan")
+        lines.append(f"# TYPE {metric} summary")
+        for name, (count, total, ordered) in sorted(stages.items()):
+            for q in (0.5, 0.95, 0.99):
+                v = _percentile(ordered, q * 100) if ordered else 0.0
+                lines.append(f'{metric}{{stage="{name}",quantile="{q}"}} {v:.6g}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total:.6g}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+    for name, (count, total, ordered) in sorted(values.items()):
+        metric = f"{prefix}{name}"
+        lines.append(f"# TYPE {metric} summary")
+        for q in (0.5, 0.95, 0.99):
+            v = _percentile(ordered, q * 100) if ordered else 0.0
+            lines.append(f'{metric}{{quantile="{q}"}} {v:.6g}')
+        lines.append(f"{metric}_sum {total:.6g}")
+        lines.append(f"{metric}_count {count}")
+    typed = set()
+    for (name, labels), n in counters:
+        metric = f"{prefix}{name}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{{{_label_text(labels)}}} {n:g}" if labels else f"{metric} {n:g}")
+    for name, v in gauges:
+        metric = f"{prefix}{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {v:.6g}")
+    return "\n".join(lines) + "\n"
+
+
+def report(snap: Optional[dict] = None) -> str:
+    """Rincian latensi per tahap (urut dari total waktu terbesar) + nilai, counter, gauge."""
+    snap = snap or snapshot()
+    lines = []
+    if snap["stages"]:
+        wall = snap["uptime_s"] * 1000.0
+        lines.append(
+            f"  {'tahap':<14}{'n':>7}{'total ms':>11}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'%':>7}"
+        )
+        for name, st in sorted(snap["stages"].items(), key=lambda kv: -kv[1]["total_ms"]):
+            share = 100.0 * st["total_ms"] / wall if wall > 0 else 0.0
+            lines.append(
+                f"  {name:<14}{st['count']:>7}{st['total_ms']:>11.1f}{st['mean_ms']:>10.1f}{st['p50_ms']:>10.1f}"
+                f"{st['p95_ms']:>10.1f}{st['max_ms']:>10.1f}{share:>7.1f}"
+            )
+        lines.append(f"  (% dari {wall:.0f} ms sejak metrik aktif; sisanya di luar tahap yang diukur)")
+    for name, st in sorted(snap["values"].items()):
+        lines.append(f"  {name}: n={st['count']} mean={st['mean']:.2f} p95={st['p95']:.2f} max={st['max']:g}")
+    for name, n in snap["counters"].items():
+        lines.append(f"  {name}: {n:g}")
+    for name, v in sorted(snap["gauges"].items()):
+        lines.append(f"  {name}: {v:g}")
+    return "\n".join(lines) if lines else "  (tidak ada metrik terkumpul)"
+
+
+@contextmanager
+def profile(path: Optional[str] = None, top: int = 25, stream=None):
+    """
+    Jalankan blok kode di bawah cProfile.
+    path berakhiran file -> simpan statistik mentah (buka dengan pstats / snakeviz);
+    path None atau "-" -> cetak `top` fungsi teratas (cumulative) ke stream (default stderr).
+    """
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        if path and path != "-":
+            prof.dump_stats(path)
+        else:
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+            (stream or sys.stderr).write(buf.getvalue())
@@ -0,0 +1,185 @@
+"""
+Pemuatan dan preprocessing gambar (OpenCV saja, tanpa DeepFace/TensorFlow).
+Dipisah dari recognition_engine agar bisa dipakai di worker process (mis. registrasi massal)
+tanpa memuat model.
+"""
+import threading
+from typing import List, Optional, Sequence, Tuple, Union
+import numpy as np
+import cv2
+import config
+import metrics
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+# Objek CLAHE dan buffer kerja per thread (objek CLAHE OpenCV tidak aman dipakai bersamaan antar thread)
+_local = threading.local()
+
+
+def _clahe():
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def _buffer(name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """Buffer uint8 per thread yang dipakai ulang selama ukuran frame sama."""
+    buf = getattr(_local, name, None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=np.uint8)
+        setattr(_local, name, buf)
+    return buf
+
+
+def _to_bgr_uint8(img: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """
+    Normalisasi ke BGR uint8 3-channel (grayscale, BGRA, 16-bit/float).
+    Returns: (gambar, True jika array baru) - gambar yang sudah BGR uint8 dikembalikan tanpa salinan.
+    """
+    converted = False
+    if img.dtype != np.uint8:
+        img = np.clip(img, 0, 255).astype(np.uint8)
+        converted = True
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        converted = True
+    elif img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        converted = True
+    return img, converted
+
+
+def _equalize(img: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    CLAHE pada channel L (Lab) untuk gambar BGR uint8, memakai buffer Lab/L per thread
+    dan objek CLAHE yang di-cache. Hasil ditulis ke `out` (boleh sama dengan `img`) atau array baru.
+    """
+    h, w = img.shape[:2]
+    lab = _buffer("lab", (h, w, 3))
+    l_in = _buffer("l_in", (h, w))
+    l_out = _buffer("l_out", (h, w))
+    cv2.cvtColor(img, cv2.COLOR_BGR2LAB, dst=lab)
+    cv2.extractChannel(lab, 0, dst=l_in)
+    _clahe().apply(l_in, dst=l_out)
+    cv2.insertChannel(l_out, lab, 0)
+    if out is None:
+        out = np.empty_like(img)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=out)
+
+
+def preprocess_target() -> Optional[str]:
+    """Tempat CLAHE diterapkan: "frame", "face" (hanya crop wajah), atau None jika preprocessing nonaktif."""
+    if not getattr(config, "PREPROCESS_INPUT", True):
+        return None
+    return getattr(config, "PREPROCESS_TARGET", "frame")
+
+
+def preprocess_image(img: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Normalisasi pencahayaan untuk meningkatkan konsistensi embedding.
+    CLAHE pada channel L (Lab) mengurangi dampak pencahayaan berbeda.
+    - out: array tujuan (boleh `img` sendiri untuk in-place); default array baru
+    """
+    if not getattr(config, "PREPROCESS_INPUT", True):
+        return img
+    try:
+        # Pastikan BGR 3-channel uint8 (tanpa salinan jika sudah)
+        img, converted = _to_bgr_uint8(img)
+        return _equalize(img, img if converted else out)
+    except Exception:
+        return img
+
+
+def preprocess_face(face: np.ndarray) -> np.ndarray:
+    """CLAHE pada crop wajah BGR uint8 (mode PREPROCESS_TARGET = "face"); crop asli tidak diubah."""
+    try:
+        return _equalize(face)
+    except Exception:
+        return face
+
+
+def decode_image(data: bytes, name: str = "") -> np.ndarray:
+    """Bytes file gambar (JPEG/PNG/...) -> array BGR, sama seperti cv2.imread."""
+    with metrics.stage("decode"):
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"Cannot read image: {name}")
+    return img
+
+
+def load_and_preprocess(image_input: Union[str, np.ndarray], inplace: bool = False) -> np.ndarray:
+    """
+    Load gambar (dari path atau array), preprocess, return BGR array.
+    Array dari pemanggil tidak diubah (kecuali inplace=True, mis. hasil decode yang tidak dipakai lagi);
+    salinan hanya dibuat jika perlu konversi atau CLAHE.
+    Dengan PREPROCESS_TARGET = "face", frame hanya dinormalisasi (CLAHE diterapkan ke crop wajah).
+    """
+    if isinstance(image_input, np.ndarray):
+        img, owned = _to_bgr_uint8(image_input)
+        owned = owned or inplace
+    else:
+        with metrics.stage("decode"):
+            img = cv2.imread(image_input)
+            if img is None:
+                raise ValueError(f"Cannot read image: {image_input}")
+        img, owned = _to_bgr_uint8(img)
+        owned = True
+    if preprocess_target() != "frame":
+        return img
+    with metrics.stage("preprocess"):
+        return preprocess_image(img, img if owned else None)
+
+
+def _adjust_brightness(img: np.ndarray, factor: float) -> np.ndarray:
+    """Skala channel V (HSV). Semua channel harus satu dtype agar cv2.merge tidak error (OpenCV 4.x)."""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    v = np.clip(v.astype(np.float32) * factor, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(cv2.merge([h, s, v]), cv2.COLOR_HSV2BGR)
+
+
+def _rotate(img: np.ndarray, angle: float) -> np.ndarray:
+    """Rotasi kecil di sekitar pusat gambar, tepi diisi pantulan (tanpa sudut hitam)."""
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+    return cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_REFLECT)
+
+
+# Variasi augmentasi yang tersedia (nama dipakai di config.REGISTER_AUGMENTATIONS)
+AUGMENTATIONS = {
+    "flip": lambda img: cv2.flip(img, 1),
+    "brighter": lambda img: _adjust_brightness(img, 1.1),
+    "darker": lambda img: _adjust_brightness(img, 0.9),
+    "rotate_left": lambda img: _rotate(img, getattr(config, "AUGMENT_ROTATION_DEG", 5.0)),
+    "rotate_right": lambda img: _rotate(img, -getattr(config, "AUGMENT_ROTATION_DEG", 5.0)),
+    "blur": lambda img: cv2.GaussianBlur(img, (3, 3), 0),
+}
+
+
+def augment_image(img: np.ndarray, names: Optional[Sequence[str]] = None) -> List[np.ndarray]:
+    """
+    Hasilkan variasi gambar untuk augmentasi: asli + variasi dari config.REGISTER_AUGMENTATIONS
+    (default: flip horizontal, brightness +/-).
+    Dipakai saat registrasi pada crop wajah yang sudah di-align, sehingga deteksi cukup sekali per foto.
+    """
+    if names is None:
+        names = getattr(config, "REGISTER_AUGMENTATIONS", ("flip", "brighter", "darker"))
+    out = [img]
+    for name in names:
+        if name not in AUGMENTATIONS:
+            raise ValueError(f"Augmentasi tidak dikenal: {name} (pilihan: {', '.join(AUGMENTATIONS)})")
+        out.append(AUGMENTATIONS[name](img))
+    return out
+
+
+def load_for_enrollment(path: str) -> Tuple[str, Union[np.ndarray, str]]:
+    """
+    Decode + preprocess satu file untuk registrasi (aman dijalankan di worker process).
+    Returns: (path, gambar BGR) atau (path, pesan error) jika gagal.
+    """
+    try:
+        return path, load_and_preprocess(path)
+    except Exception as e:
+        return path, str(e)
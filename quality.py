@@ -0,0 +1,144 @@
+"""
+Penyaringan kualitas wajah sebelum embedding (OpenCV saja, tanpa DeepFace/TensorFlow).
+Wajah yang hampir pasti menjadi "Unknown" dibuang sebelum ArcFace + pencocokan:
+- no_face        : bbox seluas gambar (DeepFace dengan enforce_detection=False saat tidak ada wajah)
+- small          : sisi bbox terpendek < QUALITY_MIN_FACE piksel
+- low_confidence : confidence detektor < QUALITY_MIN_CONFIDENCE (backend opencv dikecualikan: skornya bukan 0-1)
+- pose           : pergeseran hidung dari tengah kedua mata / jarak mata > QUALITY_MAX_POSE (perkiraan yaw;
+                   hanya jika detektor memberi landmark mata + hidung)
+- blurry         : variansi Laplacian crop abu-abu 64x64 < QUALITY_MIN_BLUR
+Cek dari yang termurah; blur (satu resize + Laplacian kecil) hanya dihitung jika cek lain lolos.
+Tiap ambang berupa angka atau dict per jalur ("image", "video", "enroll"); registrasi biasanya lebih ketat.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import cv2
+import config
+import metrics
+
+REASONS = ("no_face", "small", "low_confidence", "pose", "blurry")
+_BLUR_SIZE = 64
+# Backend yang confidence-nya bukan skala 0-1 (tidak dipakai untuk cek low_confidence)
+_UNSCALED_CONFIDENCE = ("opencv",)
+
+_stats: Dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(getattr(config, "QUALITY_GATE_ENABLED", True))
+
+
+def _setting(name: str, mode: str, default: Optional[float]) -> Optional[float]:
+    """Nilai ambang config `name` untuk jalur `mode` (angka, atau dict per jalur); None = cek dimatikan."""
+    value = getattr(config, name, default)
+    if isinstance(value, dict):
+        value = value.get(mode, value.get("default", default))
+    return None if value is None else float(value)
+
+
+def thresholds(mode: str) -> Tuple[Optional[float], ...]:
+    """(min_face, min_confidence, max_pose, min_blur) untuk jalur `mode`."""
+    return (
+        _setting("QUALITY_MIN_FACE", mode, 24),
+        _setting("QUALITY_MIN_CONFIDENCE", mode, 0.5),
+        _setting("QUALITY_MAX_POSE", mode, 0.5),
+        _setting("QUALITY_MIN_BLUR", mode, 10.0),
+    )
+
+
+def cache_variant(mode: str) -> str:
+    """Bagian kunci cache embedding untuk ambang jalur `mode` (hasil tersimpan sudah tersaring)."""
+    if not enabled():
+        return ""
+    return "|quality=" + ",".join("-" if v is None else f"{v:g}" for v in thresholds(mode))
+
+
+def is_whole_image(area: dict, shape: Tuple[int, ...]) -> bool:
+    """facial_area seluas gambar: hasil DeepFace (enforce_detection=False) saat tidak ada wajah terdeteksi."""
+    return area.get("w", 0) >= shape[1] - 2 and area.get("h", 0) >= shape[0] - 2
+
+
+def blur_score(face: np.ndarray) -> float:
+    """Variansi Laplacian crop wajah (BGR/abu-abu uint8) setelah diubah ke 64x64; kecil = buram."""
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+    gray = cv2.resize(gray, (_BLUR_SIZE, _BLUR_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def pose_score(area: dict) -> Optional[float]:
+    """
+    Perkiraan yaw dari landmark: |x hidung - x tengah kedua mata| / jarak mata.
+    ~0 untuk wajah frontal, naik saat kepala menoleh. None jika landmark mata/hidung tidak ada.
+    """
+    left, right, nose = area.get("left_eye"), area.get("right_eye"), area.get("nose")
+    if left is None or right is None or nose is None:
+        return None
+    eye_dist = float(np.hypot(left[0] - right[0], left[1] - right[1]))
+    if eye_dist < 1.0:
+        return None
+    return abs(nose[0] - (left[0] + right[0]) / 2.0) / eye_dist
+
+
+def assess(face: dict, shape: Tuple[int, ...], mode: str = "image") -> Optional[str]:
+    """Alasan wajah dibuang (salah satu REASONS), atau None jika layak di-embed."""
+    area = face.get("facial_area", {})
+    if is_whole_image(area, shape):
+        return "no_face"
+    min_face, min_conf, max_pose, min_blur = thresholds(mode)
+    if min_face is not None and min(area.get("w", 0), area.get("h", 0)) < min_face:
+        return "small"
+    if (min_conf is not None and face.get("detector") not in _UNSCALED_CONFIDENCE
+            and face.get("confidence", 0.0) < min_conf):
+        return "low_confidence"
+    if max_pose is not None:
+        pose = pose_score(area)
+        if pose is not None and pose > max_pose:
+            return "pose"
+    if min_blur is not None and face.get("face") is not None and face["face"].size:
+        if blur_score(face["face"]) < min_blur:
+            return "blurry"
+    return None
+
+
+def filter_faces(
+    faces: List[dict],
+    shape: Tuple[int, ...],
+    mode: str = "image",
+    rejects: Optional[List[str]] = None,
+) -> List[dict]:
+    """
+    Wajah yang lolos penyaringan (urutan tetap). Alasan wajah yang dibuang ditambahkan ke `rejects`
+    (jika diberikan) dan dihitung di stats(). Tanpa penyaringan (QUALITY_GATE_ENABLED = False): faces apa adanya.
+    """
+    if not enabled() or not faces:
+        return faces
+    kept = []
+    dropped: List[str] = []
+    with metrics.stage("quality"):
+        for face in faces:
+            reason = assess(face, shape, mode)
+            if reason is None:
+                kept.append(face)
+            else:
+                dropped.append(reason)
+    with _stats_lock:
+        st = _stats.setdefault(mode, {"passed": 0, "dropped": {}})
+        st["passed"] += len(kept)
+        for reason in dropped:
+            st["dropped"][reason] = st["dropped"].get(reason, 0) + 1
+    for reason in dropped:
+        metrics.incr("quality_drop", mode=mode, reason=reason)
+    if rejects is not None:
+        rejects.extend(dropped)
+    return kept
+
+
+def stats(reset: bool = False) -> Dict[str, dict]:
+    """Jumlah wajah lolos dan dibuang per alasan, per jalur: {mode: {"passed": n, "dropped": {alasan: n}}}."""
+    with _stats_lock:
+        out = {mode: {"passed": st["passed"], "dropped": dict(st["dropped"])} for mode, st in _stats.items()}
+        if reset:
+            _stats.clear()
+    return out
@@ -1,98 +1,405 @@
 """
 Engine Face Recognition menggunakan DeepFace (model ArcFace).
-Preprocessing gambar, augmentasi saat registrasi, dan detektor RetinaFace untuk akurasi lebih baik.
+Deteksi + alignment (RetinaFace) lalu embedding crop wajah per batch; preprocessing dan
+augmentasi gambar ada di modul preprocessing.
 """
 import os
+import sys
+import threading
+import time
 import numpy as np
-from typing import List, Optional, Tuple, Union
-from deepface import DeepFace
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import cv2
 import config
+import embedding_cache
 import face_db
+import metrics
+import quality
+from preprocessing import (
+    IMAGE_EXTENSIONS,
+    augment_image,
+    decode_image,
+    load_and_preprocess,
+    load_for_enrollment,
+    preprocess_face,
+    preprocess_target,
+)
 
+# Model embedding dimuat sekali per proses (lihat _get_model)
+_model = None
+_model_lock = threading.Lock()
+_deepface = None
+# Jumlah frame/gambar yang diselesaikan tiap tingkat detektor, per jalur (lihat extract_faces)
+_detector_stats: Dict[str, dict] = {}
+_detector_stats_lock = threading.Lock()
 
-def _preprocess_image(img: np.ndarray) -> np.ndarray:
+
+def _DeepFace():
     """
-    Normalisasi pencahayaan untuk meningkatkan konsistensi embedding.
-    CLAHE pada channel L (Lab) mengurangi dampak pencahayaan berbeda.
+    Modul DeepFace, diimpor saat pertama kali dibutuhkan: import DeepFace memuat TensorFlow (beberapa detik),
+    sehingga perintah yang tidak melakukan inferensi (list, remove, sync tanpa file baru, ...) tidak ikut membayar.
     """
-    if not getattr(config, "PREPROCESS_INPUT", True):
-        return img
-    try:
-        # Pastikan BGR 3-channel uint8 (hindari error merge pada gambar grayscale/16-bit)
-        if img.ndim == 2:
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        elif img.shape[2] == 4:
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        if img.dtype != np.uint8:
-            img = np.clip(img, 0, 255).astype(np.uint8)
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        # Pastikan L sama dtype dan shape dengan a, b (hindari error merge di OpenCV)
-        l = np.asarray(l, dtype=a.dtype)
-        if l.shape != a.shape:
-            l = cv2.resize(l, (a.shape[1], a.shape[0]))
-        lab = cv2.merge([l, a, b])
-        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-    except Exception:
-        return img
+    global _deepface
+    if _deepface is None:
+        from deepface import DeepFace
+        _deepface = DeepFace
+    return _deepface
 
 
-def _load_and_preprocess(image_input: Union[str, np.ndarray]) -> np.ndarray:
-    """Load gambar (dari path atau array), preprocess, return BGR array."""
-    if isinstance(image_input, np.ndarray):
-        img = image_input.copy()
-    else:
-        img = cv2.imread(image_input)
-        if img is None:
-            raise ValueError(f"Cannot read image: {image_input}")
-    # Normalisasi ke BGR uint8 3-channel sebelum preprocessing (hindari error CLAHE/merge)
-    if img.ndim == 2:
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-    elif img.shape[2] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-    if img.dtype != np.uint8:
-        img = np.clip(img.astype(np.float64), 0, 255).astype(np.uint8)
-    return _preprocess_image(img)
+def _get_model():
+    """Model pengenalan wajah (config.MODEL_NAME), dimuat sekali lalu dipakai ulang (aman antar thread)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with metrics.stage("model_load"):
+                    try:
+                        _model = _DeepFace().build_model(config.MODEL_NAME, task="facial_recognition")
+                    except TypeError:
+                        # DeepFace versi lama: build_model(model_name)
+                        _model = _DeepFace().build_model(config.MODEL_NAME)
+    return _model
+
+
+def _model_input_size(model) -> Tuple[int, int]:
+    """Ukuran input model (tinggi, lebar)."""
+    shape = tuple(getattr(model, "input_shape", None) or ())
+    if len(shape) == 4:
+        # Model Keras: (None, tinggi, lebar, channel)
+        return int(shape[1]), int(shape[2])
+    if len(shape) == 2:
+        # Klien DeepFace: (lebar, tinggi)
+        return int(shape[1]), int(shape[0])
+    raise ValueError(f"Tidak dapat menentukan ukuran input model {config.MODEL_NAME}")
 
 
-def _represent(image_input: Union[str, np.ndarray]) -> List[dict]:
+def _prepare_face(face: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
     """
-    Dapatkan embedding untuk setiap wajah di gambar.
-    image_input: path file (str) atau numpy array (BGR). Preprocessing diterapkan jika aktif.
-    Returns: list of {"embedding": [...], "facial_area": {"x","y","w","h"}, ...}
-    """
-    img = _load_and_preprocess(image_input)
-    return DeepFace.represent(
-        img_path=img,
-        model_name=config.MODEL_NAME,
-        detector_backend=config.DETECTOR_BACKEND,
-        enforce_detection=False,
-        align=True,
+    Crop wajah BGR uint8 -> input model: resize dengan rasio tetap, padding hitam ke (tinggi, lebar),
+    float32 0-1 (sama seperti preprocessing di DeepFace.represent).
+    """
+    h, w = size
+    factor = min(h / face.shape[0], w / face.shape[1])
+    dsize = (max(1, int(face.shape[1] * factor)), max(1, int(face.shape[0] * factor)))
+    resized = cv2.resize(face, dsize)
+    out = np.zeros((h, w, 3), dtype=np.float32)
+    dy = (h - resized.shape[0]) // 2
+    dx = (w - resized.shape[1]) // 2
+    out[dy:dy + resized.shape[0], dx:dx + resized.shape[1]] = resized
+    return out / 255.0
+
+
+def _predict(model, batch: np.ndarray) -> np.ndarray:
+    """Forward satu batch (N, h, w, 3) -> embedding (N, D)."""
+    keras_model = getattr(model, "model", model)
+    if hasattr(keras_model, "predict"):
+        return np.asarray(keras_model.predict(batch, verbose=0), dtype=np.float32).reshape(len(batch), -1)
+    return np.stack([np.asarray(model.forward(b[None]), dtype=np.float32).reshape(-1) for b in batch])
+
+
+def _face_to_bgr(face: np.ndarray) -> np.ndarray:
+    """Crop dari DeepFace.extract_faces (RGB, float 0-1) -> BGR uint8."""
+    if face.dtype != np.uint8:
+        scale = 255.0 if face.max() <= 1.0 else 1.0
+        face = np.clip(face * scale, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(face[:, :, ::-1])
+
+
+def _detect_scale(img: np.ndarray) -> float:
+    """Skala frame untuk detektor (config.DETECTION_MAX_SIDE); 1.0 = resolusi penuh."""
+    max_side = getattr(config, "DETECTION_MAX_SIDE", None)
+    side = max(img.shape[:2])
+    if not max_side or side <= max_side:
+        return 1.0
+    return max_side / side
+
+
+def _scale_area(area: dict, factor: float, shape: Tuple[int, ...]) -> dict:
+    """facial_area (bbox + landmark mata) dari koordinat frame kecil ke frame asli, dibatasi ke tepi gambar."""
+    h_img, w_img = shape[:2]
+    x = min(max(int(round(area.get("x", 0) * factor)), 0), w_img - 1)
+    y = min(max(int(round(area.get("y", 0) * factor)), 0), h_img - 1)
+    out = dict(area)
+    out.update(
+        x=x,
+        y=y,
+        w=max(1, min(int(round(area.get("w", 0) * factor)), w_img - x)),
+        h=max(1, min(int(round(area.get("h", 0) * factor)), h_img - y)),
     )
+    for key in ("left_eye", "right_eye", "nose", "mouth_left", "mouth_right"):
+        if area.get(key) is not None:
+            out[key] = tuple(int(round(v * factor)) for v in area[key])
+    return out
+
+
+def _align_crop(img: np.ndarray, area: dict) -> np.ndarray:
+    """
+    Crop wajah dari frame resolusi penuh, diputar agar kedua mata horizontal (jika landmark mata ada).
+    Hanya piksel crop yang dihitung (warpAffine dengan ukuran output = bbox), bukan seluruh frame.
+    """
+    x, y, w, h = area["x"], area["y"], area["w"], area["h"]
+    left, right = area.get("left_eye"), area.get("right_eye")
+    if left is None or right is None:
+        return np.ascontiguousarray(img[y:y + h, x:x + w])
+    (x1, y1), (x2, y2) = sorted([tuple(left), tuple(right)])
+    angle = float(np.degrees(np.arctan2(y2 - y1, x2 - x1)))
+    cx, cy = x + w / 2.0, y + h / 2.0
+    m = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+    # Geser agar pusat bbox jatuh di pusat crop output
+    m[0, 2] += w / 2.0 - cx
+    m[1, 2] += h / 2.0 - cy
+    return cv2.warpAffine(img, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _detector_chain(mode: str = "image") -> List[str]:
+    """
+    Backend detektor berurutan (cepat -> akurat) untuk satu jalur: "image" (recognize/verify/HTTP API),
+    "video" (webcam/video/serve-streams), atau "enroll" (register/sync).
+    Tanpa cascade (config.DETECTOR_CASCADE kosong untuk jalur ini): [config.DETECTOR_BACKEND].
+    """
+    cascade = getattr(config, "DETECTOR_CASCADE", None)
+    if isinstance(cascade, dict):
+        cascade = cascade.get(mode)
+    return list(cascade) if cascade else [config.DETECTOR_BACKEND]
+
+
+def _cascade_min_confidence(backend: str) -> float:
+    """Confidence minimal agar hasil `backend` diterima (skala confidence berbeda per backend)."""
+    value = getattr(config, "DETECTOR_CASCADE_MIN_CONFIDENCE", 0.9)
+    if isinstance(value, dict):
+        return float(value.get(backend, value.get("default", 0.0)))
+    return float(value)
+
+
+def _faces_variant(mode: str) -> str:
+    """
+    Bagian kunci cache untuk hasil deteksi jalur `mode`: rantai detektor (kosong tanpa cascade,
+    sehingga kunci lama tetap berlaku) + ambang penyaringan kualitas.
+    """
+    chain = _detector_chain(mode)
+    out = ""
+    if chain != [config.DETECTOR_BACKEND]:
+        tiers = ">".join(f"{b}@{_cascade_min_confidence(b)}" for b in chain[:-1])
+        min_face = getattr(config, "DETECTOR_CASCADE_MIN_FACE", 40)
+        out = f"|detect={tiers}>{chain[-1]}/{min_face}" if tiers else f"|detect={chain[0]}"
+    return out + quality.cache_variant(mode)
+
+
+def _cascade_reject(faces: List[dict], shape: Tuple[int, ...], backend: str) -> Optional[str]:
+    """
+    Alasan hasil satu tingkat cascade tidak dipakai (tingkat berikutnya dijalankan), atau None jika diterima:
+    no_face, low_confidence (ada wajah di bawah ambang), small_face (ada wajah di bawah DETECTOR_CASCADE_MIN_FACE).
+    """
+    found = [f for f in faces if not quality.is_whole_image(f["facial_area"], shape)]
+    if not found:
+        return "no_face"
+    min_conf = _cascade_min_confidence(backend)
+    if any(f["confidence"] < min_conf for f in found):
+        return "low_confidence"
+    min_face = getattr(config, "DETECTOR_CASCADE_MIN_FACE", 40)
+    if any(min(f["facial_area"].get("w", 0), f["facial_area"].get("h", 0)) < min_face for f in found):
+        return "small_face"
+    return None
+
+
+def _count_detection(mode: str, backend: str, reason: Optional[str] = None) -> None:
+    """Catat tingkat yang dipakai (reason None) atau alasan tingkat `backend` dilewati."""
+    with _detector_stats_lock:
+        st = _detector_stats.setdefault(mode, {"tiers": {}, "fallback": {}})
+        if reason is None:
+            st["tiers"][backend] = st["tiers"].get(backend, 0) + 1
+        else:
+            key = f"{backend}:{reason}"
+            st["fallback"][key] = st["fallback"].get(key, 0) + 1
+    if reason is None:
+        metrics.incr("detector_tier", mode=mode, backend=backend)
+    else:
+        metrics.incr("detector_fallback", mode=mode, backend=backend, reason=reason)
+
+
+def detector_stats(reset: bool = False) -> Dict[str, dict]:
+    """
+    Pemakaian tingkat detektor per jalur sejak start (atau reset terakhir):
+    {mode: {"tiers": {backend: n}, "fallback": {"backend:alasan": n}}}.
+    """
+    with _detector_stats_lock:
+        out = {mode: {k: dict(v) for k, v in st.items()} for mode, st in _detector_stats.items()}
+        if reset:
+            _detector_stats.clear()
+    return out
 
 
-def _augment_image(img: np.ndarray) -> List[np.ndarray]:
+def _detect_with(img: np.ndarray, backend: str) -> List[dict]:
     """
-    Hasilkan variasi gambar untuk augmentasi: asli, flip horizontal, brightness +/-.
-    Dipakai saat registrasi agar satu foto memberi beberapa embedding.
-    Semua channel harus satu dtype agar cv2.merge tidak error (OpenCV 4.x).
+    Deteksi + alignment wajah dengan satu backend.
+    Jika sisi terpanjang melebihi config.DETECTION_MAX_SIDE, detektor berjalan pada salinan yang diperkecil;
+    bbox + landmark dipetakan kembali sehingga alignment dan crop memakai resolusi penuh.
     """
-    out = [img]
-    out.append(cv2.flip(img, 1))
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    v = v.astype(np.float32)
-    v_brighter = np.clip(v * 1.1, 0, 255).astype(np.uint8)
-    v_darker = np.clip(v * 0.9, 0, 255).astype(np.uint8)
-    # merge butuh semua channel dtype sama (uint8)
-    out.append(cv2.cvtColor(cv2.merge([h, s, v_brighter]), cv2.COLOR_HSV2BGR))
-    out.append(cv2.cvtColor(cv2.merge([h, s, v_darker]), cv2.COLOR_HSV2BGR))
+    scale = _detect_scale(img)
+    if scale < 1.0:
+        small = cv2.resize(
+            img, (max(1, int(round(img.shape[1] * scale))), max(1, int(round(img.shape[0] * scale)))),
+            interpolation=cv2.INTER_AREA,
+        )
+        with metrics.stage("detect"):
+            objs = _DeepFace().extract_faces(
+                img_path=small,
+                detector_backend=backend,
+                enforce_detection=False,
+                align=False,
+            )
+        out = []
+        with metrics.stage("align"):
+            for o in objs:
+                area = _scale_area(o.get("facial_area", {}), 1.0 / scale, img.shape)
+                out.append({
+                    "face": _align_crop(img, area),
+                    "facial_area": area,
+                    "confidence": float(o.get("confidence") or 0.0),
+                    "detector": backend,
+                })
+        return out
+    # Alignment DeepFace terjadi di dalam extract_faces (ikut terhitung sebagai detect)
+    with metrics.stage("detect"):
+        objs = _DeepFace().extract_faces(
+            img_path=img,
+            detector_backend=backend,
+            enforce_detection=False,
+            align=True,
+        )
+    return [
+        {
+            "face": _face_to_bgr(o["face"]),
+            "facial_area": o.get("facial_area", {}),
+            "confidence": float(o.get("confidence") or 0.0),
+            "detector": backend,
+        }
+        for o in objs
+    ]
+
+
+def extract_faces(img: np.ndarray, mode: str = "image", rejects: Optional[List[str]] = None) -> List[dict]:
+    """
+    Deteksi + alignment wajah pada gambar BGR (sudah dipreprocess), lalu penyaringan kualitas (quality.py):
+    wajah kecil, buram, confidence rendah, pose ekstrem, dan "wajah" seluas gambar tidak di-embed.
+    Dengan cascade (config.DETECTOR_CASCADE untuk jalur `mode`), detektor cepat dijalankan dulu;
+    tingkat berikutnya hanya jika tidak ada wajah, confidence rendah, atau wajah terlalu kecil.
+    - rejects: jika diberikan, alasan wajah yang dibuang ditambahkan ke list ini
+    Returns: list of {"face": crop BGR uint8, "facial_area": {"x","y","w","h",...} (koordinat gambar asli),
+    "confidence": float, "detector": backend}
+    """
+    chain = _detector_chain(mode)
+    for tier, backend in enumerate(chain):
+        faces = _detect_with(img, backend)
+        reason = _cascade_reject(faces, img.shape, backend) if tier + 1 < len(chain) else None
+        _count_detection(mode, backend, reason)
+        if reason is None:
+            break
+    metrics.observe("faces_per_frame", len(faces))
+    return quality.filter_faces(faces, img.shape, mode, rejects)
+
+
+def detect_faces(
+    image_input: Union[str, np.ndarray],
+    mode: str = "image",
+    rejects: Optional[List[str]] = None,
+    inplace: bool = False,
+) -> List[dict]:
+    """
+    Load + preprocess + extract_faces untuk path atau gambar BGR mentah (mis. frame kamera, hasil decode).
+    - inplace: boleh menimpa array input (hasil decode yang tidak dipakai lagi)
+    """
+    return extract_faces(load_and_preprocess(image_input, inplace=inplace), mode, rejects)
+
+
+def embed_faces(faces: List[np.ndarray], batch_size: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Embedding untuk banyak crop wajah (BGR uint8) sekaligus, per mini-batch lewat model.
+    Returns: list embedding float32, urutan sama dengan input.
+    """
+    if not faces:
+        return []
+    model = _get_model()
+    size = _model_input_size(model)
+    bs = batch_size or getattr(config, "EMBED_BATCH_SIZE", 32)
+    # PREPROCESS_TARGET = "face": CLAHE hanya pada crop wajah (frame tidak di-equalize)
+    prep = preprocess_face if preprocess_target() == "face" else None
+    out: List[np.ndarray] = []
+    for s in range(0, len(faces), bs):
+        with metrics.stage("embed_prepare"):
+            batch = np.stack([_prepare_face(prep(f) if prep else f, size) for f in faces[s:s + bs]])
+        with metrics.stage("embed"):
+            out.extend(_predict(model, batch))
+        metrics.observe("embed_batch_size", len(batch))
     return out
 
 
+def _represent_image(img: np.ndarray, mode: str = "image") -> List[dict]:
+    """Deteksi + embedding semua wajah pada gambar BGR yang sudah dipreprocess."""
+    faces = extract_faces(img, mode)
+    embeddings = embed_faces([f["face"] for f in faces])
+    return [
+        {"embedding": emb, "facial_area": f["facial_area"], "face_confidence": f["confidence"], "detector": f["detector"]}
+        for f, emb in zip(faces, embeddings)
+    ]
+
+
+def _represent_file(path: str, use_cache: bool = True, mode: str = "image") -> Tuple[List[dict], str]:
+    """
+    Seperti _represent untuk file, lewat cache embedding (config.EMBED_CACHE_*): file dibaca sekali,
+    di-hash, lalu hanya dideteksi + di-embed jika belum ada di cache.
+    Returns: (wajah, hash isi file).
+    """
+    with metrics.stage("read"):
+        with open(path, "rb") as f:
+            data = f.read()
+    image_hash = embedding_cache.content_hash(data)
+    cache = embedding_cache.get_cache() if use_cache else None
+    key = embedding_cache.make_key(image_hash, _faces_variant(mode))
+    faces = cache.get(key) if cache is not None else None
+    if faces is None:
+        faces = _represent_image(load_and_preprocess(decode_image(data, path), inplace=True), mode)
+        if cache is not None:
+            cache.put(key, faces)
+    return faces, image_hash
+
+
+def _represent(image_input: Union[str, np.ndarray], mode: str = "image") -> List[dict]:
+    """
+    Dapatkan embedding untuk setiap wajah di gambar.
+    image_input: path file (str, lewat cache embedding) atau numpy array (BGR). Preprocessing diterapkan jika aktif.
+    mode: jalur pemanggil untuk pilihan detektor ("image", "video", "enroll"; lihat _detector_chain)
+    Returns: list of {"embedding": [...], "facial_area": {"x","y","w","h"}, "face_confidence": float,
+    "detector": backend yang menemukan wajah}
+    """
+    if isinstance(image_input, str):
+        return _represent_file(image_input, mode=mode)[0]
+    return _represent_image(load_and_preprocess(image_input), mode)
+
+
+def recognize_faces(faces: List[np.ndarray]) -> List[Tuple[Optional[str], float]]:
+    """
+    Kenali banyak crop wajah (BGR uint8, sudah di-align) sekaligus: satu batch embedding
+    + satu pencarian galeri. Dipakai untuk batching lintas frame/stream/request.
+    Returns: (identity atau None, similarity) per crop.
+    """
+    embeddings = embed_faces(faces)
+    if not embeddings:
+        return []
+    return [candidates[0] for candidates in face_db.find_closest_batch(np.stack(embeddings))]
+
+
+def warmup() -> None:
+    """Muat model embedding, detektor, dan indeks galeri sekarang (bukan saat request pertama)."""
+    _get_model()
+    face_db.get_index()
+    # Semua backend yang mungkin dipakai (cascade tiap jalur) dimuat sekarang
+    backends = {b for mode in ("image", "video", "enroll") for b in _detector_chain(mode)}
+    for backend in sorted(backends):
+        _detect_with(np.zeros((160, 160, 3), dtype=np.uint8), backend)
+
+
 def register_face(
     image_path: str,
     identity: str,
@@ -107,122 +414,682 @@ def register_face(
     if not os.path.isfile(image_path):
         return 0
     try:
-        reps = _represent(image_path)
-        if not reps:
-            return 0
-        count = 0
-        for r in reps:
-            emb = r.get("embedding")
-            if emb is None:
-                continue
-            face_db.add_face(identity, emb, image_path)
-            count += 1
-            if not all_faces:
-                break
-        return count
+        reps, image_hash = _represent_file(image_path, mode="enroll")
+        records = [
+            {"identity": identity, "embedding": r["embedding"], "image_path": image_path, "content_hash": image_hash}
+            for r in reps if r.get("embedding") is not None
+        ]
+        if not all_faces:
+            records = records[:1]
+        return face_db.add_faces(records)
     except Exception:
         return 0
 
 
+def list_images(folder_path: str, recursive: bool = False) -> List[str]:
+    """Path gambar (ekstensi yang didukung) di folder, terurut."""
+    out = []
+    if recursive:
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            out.extend(os.path.join(root, f) for f in sorted(files))
+    else:
+        out = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))]
+    return [p for p in out if os.path.isfile(p) and os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS]
+
+
+def _enroll_variant(augment: bool) -> str:
+    """Varian kunci cache untuk hasil registrasi (wajah pertama + augmentasi crop)."""
+    if not augment:
+        return "enroll" + _faces_variant("enroll")
+    names = getattr(config, "REGISTER_AUGMENTATIONS", ("flip", "brighter", "darker"))
+    return f"enroll:{','.join(names)}:{getattr(config, 'AUGMENT_ROTATION_DEG', 5.0)}" + _faces_variant("enroll")
+
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _enroll(
+    items: List[Tuple[str, str]],
+    augment: bool,
+    workers: int = 0,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+    force: bool = False,
+) -> dict:
+    """Registrasi banyak gambar lalu simpan ke database dalam satu penulisan (lihat _enroll_records)."""
+    t0 = time.perf_counter()
+    records, stats = _enroll_records(items, augment, workers, batch_size, progress, force)
+    face_db.add_faces(records)
+    stats["seconds"] = time.perf_counter() - t0
+    stats["images_per_sec"] = stats["images"] / max(stats["seconds"], 1e-9)
+    return stats
+
+
+def _enroll_records(
+    items: List[Tuple[str, str]],
+    augment: bool,
+    workers: int = 0,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+    force: bool = False,
+    hashes: Optional[List[Optional[str]]] = None,
+) -> Tuple[List[dict], dict]:
+    """
+    Pipeline registrasi banyak gambar:
+    1) hash isi file; file yang sudah terdaftar untuk identitas yang sama dilewati (kecuali force),
+       file yang ada di cache embedding dipakai langsung tanpa deteksi,
+    2) decode + preprocess sisanya (di process pool jika workers > 0),
+    3) deteksi + alignment sekali per gambar, ambil wajah pertama,
+    4) augmentasi crop wajah (opsional), embedding semua crop per mini-batch,
+    5) kumpulkan record (identity, embedding, image_path, content_hash, mtime) untuk disimpan sekaligus.
+    - items: list (identity, path gambar)
+    - progress: callback(stats) dipanggil setelah tiap gambar
+    - force: daftarkan ulang walau file yang sama sudah ada di database
+    - hashes: hash isi file per item jika sudah dihitung pemanggil
+    Returns: (record, statistik {"total", "images", "faces", "embeddings", "no_face", "rejected", "errors",
+    "skipped", "cached", "seconds", "images_per_sec", "by_identity"}); rejected = foto dengan wajah
+    yang tidak lolos penyaringan kualitas (config.QUALITY_*, jalur "enroll").
+    """
+    stats: dict = {
+        "total": len(items), "images": 0, "faces": 0, "embeddings": 0, "no_face": 0, "rejected": 0, "errors": 0,
+        "skipped": 0, "cached": 0, "seconds": 0.0, "images_per_sec": 0.0, "by_identity": {},
+    }
+    bs = batch_size or getattr(config, "EMBED_BATCH_SIZE", 32)
+    cache = embedding_cache.get_cache()
+    variant = _enroll_variant(augment)
+    records: List[dict] = []
+    # (identity, path, hash, crop wajah, facial_area, confidence, detector)
+    pending: List[tuple] = []
+
+    def add_records(identity, path, image_hash, embeddings):
+        mtime = _file_mtime(path)
+        for emb in embeddings:
+            records.append({
+                "identity": identity, "embedding": emb, "image_path": path,
+                "content_hash": image_hash, "mtime": mtime,
+            })
+        stats["by_identity"][identity] = stats["by_identity"].get(identity, 0) + len(embeddings)
+        stats["embeddings"] += len(embeddings)
+
+    def flush():
+        embeddings = embed_faces([p[3] for p in pending], bs)
+        groups: dict = {}
+        for p, emb in zip(pending, embeddings):
+            groups.setdefault((p[0], p[1], p[2]), []).append(
+                {"embedding": emb, "facial_area": p[4], "face_confidence": p[5], "detector": p[6]}
+            )
+        for (identity, path, image_hash), faces in groups.items():
+            add_records(identity, path, image_hash, [f["embedding"] for f in faces])
+            if cache is not None and image_hash:
+                cache.put(embedding_cache.make_key(image_hash, variant), faces)
+        pending.clear()
+
+    def report():
+        stats["seconds"] = time.perf_counter() - t0
+        stats["images_per_sec"] = stats["images"] / max(stats["seconds"], 1e-9)
+        if progress:
+            progress(stats)
+
+    t0 = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        if hashes is None:
+            paths = [path for _, path in items]
+            hashes = list(pool.map(embedding_cache.file_hash, paths, chunksize=16) if pool
+                          else map(embedding_cache.file_hash, paths))
+        enrolled = set()
+        if not force:
+            enrolled = {(m["identity"], m.get("content_hash")) for m in face_db.get_metadata()}
+        todo: List[Tuple[str, str, Optional[str]]] = []
+        for (identity, path), image_hash in zip(items, hashes):
+            if image_hash and (identity, image_hash) in enrolled:
+                stats["images"] += 1
+                stats["skipped"] += 1
+                report()
+                continue
+            cached = cache.get(embedding_cache.make_key(image_hash, variant)) if cache is not None and image_hash else None
+            if cached is None:
+                todo.append((identity, path, image_hash))
+                continue
+            stats["images"] += 1
+            stats["cached"] += 1
+            if cached:
+                stats["faces"] += len(cached)
+                add_records(identity, path, image_hash, [f["embedding"] for f in cached])
+            else:
+                stats["no_face"] += 1
+            report()
+
+        todo_paths = [path for _, path, _ in todo]
+        loaded = pool.map(load_for_enrollment, todo_paths, chunksize=4) if pool else map(load_for_enrollment, todo_paths)
+        for (identity, _, image_hash), (path, img) in zip(todo, loaded):
+            name = os.path.basename(path)
+            stats["images"] += 1
+            try:
+                if isinstance(img, str):
+                    raise ValueError(img)
+                # Deteksi + align sekali per foto; augmentasi diterapkan ke crop wajah
+                rejects: List[str] = []
+                faces = extract_faces(img, "enroll", rejects)
+                weak = sorted(set(r for r in rejects if r != "no_face"))
+                if faces:
+                    face = faces[0]
+                    variants = augment_image(face["face"]) if augment else [face["face"]]
+                    pending.extend(
+                        (identity, path, image_hash, v, face["facial_area"], face["confidence"], face["detector"])
+                        for v in variants
+                    )
+                    stats["faces"] += len(variants)
+                else:
+                    if cache is not None and image_hash:
+                        cache.put(embedding_cache.make_key(image_hash, variant), [])
+                    if weak:
+                        stats["rejected"] += 1
+                        print(f"  Foto ditolak ({', '.join(weak)}): {name}", file=sys.stderr)
+                    else:
+                        stats["no_face"] += 1
+                        print(f"  Tidak ada wajah terdeteksi: {name}", file=sys.stderr)
+                if len(pending) >= bs:
+                    flush()
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"  Skip {name}: {e}", file=sys.stderr)
+            report()
+        if pending:
+            flush()
+    finally:
+        if pool:
+            pool.shutdown()
+    stats["seconds"] = time.perf_counter() - t0
+    stats["images_per_sec"] = stats["images"] / max(stats["seconds"], 1e-9)
+    return records, stats
+
+
 def register_face_from_folder(
     folder_path: str,
     identity: Optional[str] = None,
     augment: Optional[bool] = None,
+    force: bool = False,
 ) -> int:
     """
     Daftarkan semua gambar di folder sebagai satu identitas.
     - identity: nama; jika None, pakai nama folder.
-    - augment: jika True, setiap gambar juga diproses dengan flip/brightness dan embedding tambahan disimpan.
+    - augment: jika True, crop wajah tiap gambar juga divariasikan (config.REGISTER_AUGMENTATIONS)
+      dan embedding tambahan disimpan; deteksi tetap sekali per gambar.
+    - force: daftarkan ulang file yang isinya sudah terdaftar untuk identitas ini (default: dilewati)
     Returns: jumlah embedding yang ditambahkan (bukan jumlah file).
     """
     name = identity or os.path.basename(os.path.normpath(folder_path))
     use_augment = augment if augment is not None else getattr(config, "REGISTER_AUGMENT", False)
-    count = 0
-    for f in sorted(os.listdir(folder_path)):
-        path = os.path.join(folder_path, f)
-        if not os.path.isfile(path):
-            continue
-        ext = os.path.splitext(f)[1].lower()
-        if ext not in (".jpg", ".jpeg", ".png", ".bmp", ".webp"):
-            continue
+    items = [(name, path) for path in list_images(folder_path)]
+    return _enroll(items, use_augment, force=force)["embeddings"]
+
+
+def register_tree(
+    root: Optional[str] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    augment: Optional[bool] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+    force: bool = False,
+) -> dict:
+    """
+    Registrasi massal seluruh tree known_faces/: setiap subfolder = satu identitas (nama folder),
+    gambar di sub-subfolder ikut identitas tersebut.
+    - workers: jumlah process untuk decode + preprocess (default config.ENROLL_WORKERS / jumlah CPU; 0 = tanpa pool)
+    - batch_size: jumlah crop wajah per batch embedding (default config.EMBED_BATCH_SIZE)
+    - force: daftarkan ulang file yang sudah terdaftar (default: dilewati, jadi aman dijalankan ulang)
+    Semua embedding disimpan ke database sekali di akhir.
+    Returns: statistik (lihat _enroll).
+    """
+    root = root or config.KNOWN_FACES_DIR
+    use_augment = augment if augment is not None else getattr(config, "REGISTER_AUGMENT", False)
+    if workers is None:
+        workers = getattr(config, "ENROLL_WORKERS", None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    items = _tree_items(root)
+    return _enroll(items, use_augment, workers=workers, batch_size=batch_size, progress=progress, force=force)
+
+
+def _tree_items(root: str) -> List[Tuple[str, str]]:
+    """(identity, path) untuk semua gambar di tree: identitas = nama subfolder tingkat pertama."""
+    items: List[Tuple[str, str]] = []
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if os.path.isdir(folder):
+            items.extend((name, path) for path in list_images(folder, recursive=True))
+    return items
+
+
+# Percobaan sync_tree jika database ditulis ulang proses lain di tengah sinkronisasi
+_SYNC_ATTEMPTS = 3
+
+
+def sync_tree(
+    root: Optional[str] = None,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    augment: Optional[bool] = None,
+    dry_run: bool = False,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Sinkronkan database dengan tree known_faces/ (struktur sama seperti register_tree) tanpa registrasi ulang:
+    - file baru: dideteksi + di-embed
+    - file berubah (mtime berbeda dan hash isi berbeda): embedding lama diganti
+    - file terhapus: embedding-nya dihapus; file yang dipindah/di-rename (hash sama) cukup diperbarui path-nya
+    - file hanya tersentuh (mtime berubah, hash sama) atau pindah folder identitas: metadata saja yang diperbarui
+    Hanya record dengan image_path di bawah root yang diperiksa. Record lama tanpa mtime/hash diadopsi
+    (metadata dilengkapi) bila file masih ada, tanpa embedding ulang.
+    Semua perubahan diterapkan dalam satu penulisan database. Jika database ditulis ulang proses lain
+    selama sinkronisasi, rencana dihitung ulang dari snapshot baru (embedding yang sudah dihitung
+    diambil dari cache).
+    - dry_run: hanya hitung rencana perubahan
+    Returns: statistik {"files", "unchanged", "new", "changed", "moved", "deleted", "relabeled",
+    "records_removed", "records_added", "records_updated", "seconds", "enroll" (statistik _enroll_records)}.
+    """
+    for attempt in range(_SYNC_ATTEMPTS):
         try:
-            img = _load_and_preprocess(path)
-            added_this = 0
-            if use_augment:
-                for aug_img in _augment_image(img):
-                    reps = DeepFace.represent(
-                        img_path=aug_img,
-                        model_name=config.MODEL_NAME,
-                        detector_backend=config.DETECTOR_BACKEND,
-                        enforce_detection=False,
-                        align=True,
-                    )
-                    for r in reps:
-                        emb = r.get("embedding")
-                        if emb is not None:
-                            face_db.add_face(name, emb, path)
-                            count += 1
-                            added_this += 1
-                        break
-            else:
-                added_this = register_face(path, name, all_faces=False)
-                count += added_this
-            if added_this == 0:
-                import sys
-                print(f"  Tidak ada wajah terdeteksi: {f}", file=sys.stderr)
-        except Exception as e:
-            import sys
-            print(f"  Skip {f}: {e}", file=sys.stderr)
+            return _sync_tree_once(root, workers, batch_size, augment, dry_run, progress)
+        except face_db.ConcurrentModificationError:
+            if attempt == _SYNC_ATTEMPTS - 1:
+                raise
+
+
+def _sync_tree_once(
+    root: Optional[str],
+    workers: Optional[int],
+    batch_size: Optional[int],
+    augment: Optional[bool],
+    dry_run: bool,
+    progress: Optional[Callable[[dict], None]],
+) -> dict:
+    """Satu putaran sync_tree pada satu snapshot metadata."""
+    t0 = time.perf_counter()
+    root = root or config.KNOWN_FACES_DIR
+    use_augment = augment if augment is not None else getattr(config, "REGISTER_AUGMENT", False)
+    if workers is None:
+        workers = getattr(config, "ENROLL_WORKERS", None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    root_abs = os.path.abspath(root)
+    on_disk = {os.path.abspath(path): (identity, path) for identity, path in _tree_items(root)}
+
+    generation, meta = face_db.snapshot_metadata()
+    rows_by_path: dict = {}
+    for i, m in enumerate(meta):
+        path = m.get("image_path")
+        if path:
+            key = os.path.abspath(path)
+            if key == root_abs or key.startswith(root_abs + os.sep):
+                rows_by_path.setdefault(key, []).append(i)
+
+    stats: dict = {
+        "files": len(on_disk), "unchanged": 0, "new": 0, "changed": 0, "moved": 0, "deleted": 0,
+        "relabeled": 0, "records_removed": 0, "records_added": 0, "records_updated": 0,
+    }
+    remove: List[int] = []
+    update: dict = {}
+
+    def set_meta(rows, **fields):
+        for i in rows:
+            update.setdefault(i, {}).update(fields)
+
+    # 1) File yang sudah ada di database: mtime sama = tidak berubah, selain itu cek hash isi
+    check: List[tuple] = []
+    new_files: List[Tuple[str, str]] = []
+    for key, (identity, path) in on_disk.items():
+        rows = rows_by_path.get(key)
+        if not rows:
+            new_files.append((identity, path))
             continue
-    return count
+        mtime = _file_mtime(path)
+        rec = meta[rows[0]]
+        if rec.get("mtime") == mtime and rec.get("content_hash") and rec["identity"] == identity:
+            stats["unchanged"] += 1
+        else:
+            check.append((identity, path, rows, mtime))
 
+    to_hash = [c[1] for c in check] + [path for _, path in new_files]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 and len(to_hash) > 64 else None
+    try:
+        hashes = list(pool.map(embedding_cache.file_hash, to_hash, chunksize=16) if pool
+                      else map(embedding_cache.file_hash, to_hash))
+    finally:
+        if pool:
+            pool.shutdown()
+    check_hashes, new_hashes = hashes[:len(check)], hashes[len(check):]
 
-def recognize(image_input) -> List[dict]:
+    to_embed: List[Tuple[str, str]] = []
+    to_embed_hashes: List[Optional[str]] = []
+    for (identity, path, rows, mtime), image_hash in zip(check, check_hashes):
+        old_hash = meta[rows[0]].get("content_hash")
+        if image_hash and (old_hash is None or old_hash == image_hash):
+            if meta[rows[0]]["identity"] != identity:
+                stats["relabeled"] += 1
+            else:
+                stats["unchanged"] += 1
+            set_meta(rows, identity=identity, mtime=mtime, content_hash=image_hash)
+        else:
+            stats["changed"] += 1
+            remove.extend(rows)
+            to_embed.append((identity, path))
+            to_embed_hashes.append(image_hash)
+
+    # 2) File terhapus; file baru dengan isi sama (identitas sama) dianggap dipindah
+    moved_from: dict = {}
+    for key in set(rows_by_path) - set(on_disk):
+        rows = rows_by_path[key]
+        rec = meta[rows[0]]
+        if rec.get("content_hash"):
+            moved_from.setdefault((rec["identity"], rec["content_hash"]), []).append(rows)
+        else:
+            stats["deleted"] += 1
+            remove.extend(rows)
+    for (identity, path), image_hash in zip(new_files, new_hashes):
+        candidates = moved_from.get((identity, image_hash))
+        if image_hash and candidates:
+            stats["moved"] += 1
+            set_meta(candidates.pop(), image_path=path, mtime=_file_mtime(path))
+        else:
+            stats["new"] += 1
+            to_embed.append((identity, path))
+            to_embed_hashes.append(image_hash)
+    for groups in moved_from.values():
+        for rows in groups:
+            stats["deleted"] += 1
+            remove.extend(rows)
+
+    stats["records_removed"] = len(remove)
+    stats["records_updated"] = len(update)
+    records: List[dict] = []
+    if to_embed and not dry_run:
+        records, stats["enroll"] = _enroll_records(
+            to_embed, use_augment, workers=workers, batch_size=batch_size,
+            progress=progress, force=True, hashes=to_embed_hashes,
+        )
+    stats["records_added"] = len(records)
+    if not dry_run and (remove or update or records):
+        face_db.apply_changes(remove, records, update, generation=generation)
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def _recognize_cached(frame: np.ndarray, mode: str, cache) -> List[dict]:
+    """recognize untuk frame video lewat IdentityCache: hanya wajah yang tidak ada di cache yang di-embed."""
+    try:
+        faces = detect_faces(frame, mode)
+        matches = cache.resolve(faces, lambda misses: recognize_faces([f["face"] for f in misses]))
+    except Exception:
+        metrics.incr("recognize_failures")
+        return []
+    return [
+        {"identity": identity, "similarity": sim, "facial_area": f["facial_area"]}
+        for f, (identity, sim) in zip(faces, matches)
+    ]
+
+
+def recognize(image_input, mode: str = "image", identity_cache=None) -> List[dict]:
     """
     Kenali semua wajah di gambar.
     image_input: path (str) atau numpy array (BGR).
+    mode: "image" (default) atau "video" untuk frame kamera/video (pilihan detektor, lihat config.DETECTOR_CASCADE).
+    identity_cache: IdentityCache milik sumber video (frame berurutan); wajah yang posisi + tampilannya
+    cocok dengan frame sebelumnya memakai identitas dari cache tanpa embedding (lihat identity_cache.py).
     Returns: list of {
         "identity": str or None,
         "similarity": float,
         "facial_area": {"x","y","w","h"},
     }
     """
+    if identity_cache is not None and not isinstance(image_input, str):
+        return _recognize_cached(image_input, mode, identity_cache)
     result = []
     try:
-        reps = _represent(image_input)
+        reps = _represent(image_input, mode)
     except Exception:
+        # Gagal baca/deteksi/embedding: tahapnya sudah tercatat di errors{stage=...}
+        metrics.incr("recognize_failures")
         return result
 
-    for r in reps:
-        emb = r.get("embedding")
-        area = r.get("facial_area", {})
-        if emb is None:
-            continue
-        identity, sim = face_db.find_closest(emb)
+    faces = [r for r in reps if r.get("embedding") is not None]
+    if not faces:
+        return result
+    # Semua wajah dicocokkan sekaligus (satu perkalian matriks ke galeri)
+    matches = face_db.find_closest_batch([r["embedding"] for r in faces])
+    for r, candidates in zip(faces, matches):
+        identity, sim = candidates[0]
         result.append({
             "identity": identity,
             "similarity": sim,
-            "facial_area": area,
+            "facial_area": r.get("facial_area", {}),
         })
     return result
 
 
+# Threshold jarak default DeepFace per model & metrik (dipakai jika versi DeepFace tidak menyediakannya)
+_DEFAULT_VERIFY_THRESHOLDS = {
+    "VGG-Face": {"cosine": 0.68, "euclidean": 1.17, "euclidean_l2": 1.17},
+    "Facenet": {"cosine": 0.40, "euclidean": 10.0, "euclidean_l2": 0.80},
+    "Facenet512": {"cosine": 0.30, "euclidean": 23.56, "euclidean_l2": 1.04},
+    "ArcFace": {"cosine": 0.68, "euclidean": 4.15, "euclidean_l2": 1.13},
+    "Dlib": {"cosine": 0.07, "euclidean": 0.6, "euclidean_l2": 0.4},
+    "SFace": {"cosine": 0.593, "euclidean": 10.734, "euclidean_l2": 1.055},
+    "OpenFace": {"cosine": 0.10, "euclidean": 0.55, "euclidean_l2": 0.55},
+    "DeepFace": {"cosine": 0.23, "euclidean": 64.0, "euclidean_l2": 0.64},
+    "DeepID": {"cosine": 0.015, "euclidean": 45.0, "euclidean_l2": 0.17},
+}
+
+
+def verify_threshold() -> float:
+    """Threshold jarak verifikasi: config.VERIFY_THRESHOLD, atau default DeepFace untuk MODEL_NAME + DISTANCE_METRIC."""
+    threshold = getattr(config, "VERIFY_THRESHOLD", None)
+    if threshold is not None:
+        return float(threshold)
+    try:
+        from deepface.modules.verification import find_threshold
+        return float(find_threshold(config.MODEL_NAME, config.DISTANCE_METRIC))
+    except Exception:
+        return _DEFAULT_VERIFY_THRESHOLDS.get(config.MODEL_NAME, {}).get(config.DISTANCE_METRIC, 0.40)
+
+
+def pair_distances(a: np.ndarray, b: np.ndarray, metric: Optional[str] = None) -> np.ndarray:
+    """Jarak antar pasangan baris a[i], b[i] (N, D) sesuai config.DISTANCE_METRIC, sekaligus (vektorisasi)."""
+    metric = metric or config.DISTANCE_METRIC
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if metric == "euclidean":
+        return np.linalg.norm(a - b, axis=1)
+    an = a / (np.linalg.norm(a, axis=1, keepdims=True) + 1e-8)
+    bn = b / (np.linalg.norm(b, axis=1, keepdims=True) + 1e-8)
+    if metric == "euclidean_l2":
+        return np.linalg.norm(an - bn, axis=1)
+    if metric == "cosine":
+        return 1.0 - np.einsum("ij,ij->i", an, bn)
+    raise ValueError(f"Metrik jarak tidak dikenal: {metric}")
+
+
+def embed_images(
+    paths: List[str],
+    workers: int = 0,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Wajah + embedding untuk banyak file gambar, masing-masing file unik sekali:
+    hit cache embedding dipakai langsung, sisanya di-decode (process pool jika workers > 0),
+    dideteksi, lalu semua crop di-embed per mini-batch dan disimpan ke cache.
+    - progress: callback(selesai, total) per gambar
+    Returns: {path: list wajah seperti _represent, atau pesan error (str)}.
+    """
+    unique = list(dict.fromkeys(paths))
+    bs = batch_size or getattr(config, "EMBED_BATCH_SIZE", 32)
+    cache = embedding_cache.get_cache()
+    out: dict = {}
+    pending: List[tuple] = []  # (path, key, wajah terdeteksi)
+    done = [0]
+
+    def step():
+        done[0] += 1
+        if progress:
+            progress(done[0], len(unique))
+
+    def flush():
+        crops = [f["face"] for _, _, faces in pending for f in faces]
+        embeddings = iter(embed_faces(crops, bs))
+        for path, key, faces in pending:
+            reps = [
+                {
+                    "embedding": next(embeddings), "facial_area": f["facial_area"],
+                    "face_confidence": f["confidence"], "detector": f["detector"],
+                }
+                for f in faces
+            ]
+            out[path] = reps
+            if cache is not None and key:
+                cache.put(key, reps)
+        pending.clear()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        hashes = list(pool.map(embedding_cache.file_hash, unique, chunksize=16) if pool
+                      else map(embedding_cache.file_hash, unique))
+        todo: List[Tuple[str, Optional[str]]] = []
+        for path, image_hash in zip(unique, hashes):
+            if image_hash is None:
+                out[path] = f"Cannot read image: {path}"
+                step()
+                continue
+            key = embedding_cache.make_key(image_hash, _faces_variant("image"))
+            cached = cache.get(key) if cache is not None else None
+            if cached is None:
+                todo.append((path, key))
+            else:
+                out[path] = cached
+                step()
+        todo_paths = [path for path, _ in todo]
+        loaded = pool.map(load_for_enrollment, todo_paths, chunksize=4) if pool else map(load_for_enrollment, todo_paths)
+        n_crops = 0
+        for (_, key), (path, img) in zip(todo, loaded):
+            try:
+                if isinstance(img, str):
+                    raise ValueError(img)
+                faces = extract_faces(img)
+                pending.append((path, key, faces))
+                n_crops += len(faces)
+                if n_crops >= bs:
+                    flush()
+                    n_crops = 0
+            except Exception as e:
+                out[path] = str(e)
+            step()
+        if pending:
+            flush()
+    finally:
+        if pool:
+            pool.shutdown()
+    return out
+
+
+def verify_pairs(
+    pairs: List[Tuple[str, str]],
+    workers: int = 0,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[dict]:
+    """
+    Verifikasi banyak pasangan gambar. Tiap gambar unik di-embed sekali (lihat embed_images, lewat cache),
+    lalu jarak semua pasangan dihitung dengan satu operasi vektor. Wajah pertama tiap gambar yang dipakai.
+    Returns: per pasangan {"image1", "image2", "verified", "distance", "similarity", "threshold",
+    "facial_areas": {"img1", "img2"}, "detectors": {"img1", "img2"} (backend yang menemukan wajah),
+    "error" (None atau pesan)}; pasangan dengan error memiliki verified False dan distance None.
+    """
+    reps = embed_images([p for pair in pairs for p in pair], workers, batch_size, progress)
+    threshold = verify_threshold()
+    # Entri cache lama tanpa "detector": tanpa cascade backend-nya pasti satu-satunya di rantai
+    chain = _detector_chain("image")
+    default_detector = chain[0] if len(chain) == 1 else None
+    rows: dict = {}
+    embs: List[np.ndarray] = []
+    areas: List[dict] = []
+    detectors: List[Optional[str]] = []
+    for path, faces in reps.items():
+        if isinstance(faces, list) and faces:
+            rows[path] = len(embs)
+            embs.append(np.asarray(faces[0]["embedding"], dtype=np.float32).reshape(-1))
+            areas.append(faces[0]["facial_area"])
+            detectors.append(faces[0].get("detector") or default_detector)
+
+    results = []
+    valid = []
+    for i, (p1, p2) in enumerate(pairs):
+        error = None
+        for p in (p1, p2):
+            if p not in rows:
+                error = reps[p] if isinstance(reps.get(p), str) else f"Tidak ada wajah terdeteksi: {p}"
+                break
+        if error is None:
+            valid.append(i)
+        results.append({
+            "image1": p1, "image2": p2, "verified": False, "distance": None,
+            "similarity": None, "threshold": threshold, "facial_areas": None, "detectors": None, "error": error,
+        })
+    if valid:
+        matrix = np.stack(embs)
+        idx1 = np.array([rows[pairs[i][0]] for i in valid])
+        idx2 = np.array([rows[pairs[i][1]] for i in valid])
+        distances = pair_distances(matrix[idx1], matrix[idx2])
+        similarities = 1.0 - pair_distances(matrix[idx1], matrix[idx2], "cosine")
+        for i, a, b, dist, sim in zip(valid, idx1, idx2, distances, similarities):
+            results[i].update(
+                verified=bool(dist <= threshold), distance=float(dist), similarity=float(sim),
+                facial_areas={"img1": areas[a], "img2": areas[b]},
+                detectors={"img1": detectors[a], "img2": detectors[b]},
+            )
+    return results
+
+
+def verify_one_to_many(probe: str, references: List[str], **kwargs) -> List[dict]:
+    """Verifikasi satu gambar probe terhadap banyak gambar referensi (lihat verify_pairs)."""
+    return verify_pairs([(probe, ref) for ref in references], **kwargs)
+
+
 def verify_two_faces(image_path_1: str, image_path_2: str) -> dict:
     """
-    Verifikasi apakah dua gambar berisi wajah yang sama.
-    Returns: dict dari DeepFace.verify (verified, distance, threshold, ...).
+    Verifikasi apakah dua gambar berisi wajah yang sama, dengan pipeline yang sama seperti recognize
+    (preprocessing, deteksi, embedding, cache embedding).
+    Returns: {"verified", "distance", "similarity", "threshold", "model", "detector_backend",
+    "similarity_metric", "facial_areas": {"img1", "img2"}, "time"} (format seperti DeepFace.verify).
+    detector_backend = backend yang benar-benar menemukan wajah (dengan cascade bisa berbeda dari
+    config.DETECTOR_BACKEND); "a/b" jika kedua gambar diselesaikan backend berbeda.
+    Raises ValueError jika gambar tidak terbaca atau tidak ada wajah.
     """
-    return DeepFace.verify(
-        img1_path=image_path_1,
-        img2_path=image_path_2,
-        model_name=config.MODEL_NAME,
-        detector_backend=config.DETECTOR_BACKEND,
-        distance_metric=config.DISTANCE_METRIC,
-    )
+    t0 = time.perf_counter()
+    result = verify_pairs([(image_path_1, image_path_2)])[0]
+    if result["error"]:
+        raise ValueError(result["error"])
+    d1, d2 = result["detectors"]["img1"], result["detectors"]["img2"]
+    return {
+        "verified": result["verified"],
+        "distance": result["distance"],
+        "similarity": result["similarity"],
+        "threshold": result["threshold"],
+        "model": config.MODEL_NAME,
+        "detector_backend": d1 if d1 == d2 else f"{d1}/{d2}",
+        "similarity_metric": config.DISTANCE_METRIC,
+        "facial_areas": result["facial_areas"],
+        "time": round(time.perf_counter() - t0, 2),
+    }
 
 
 def draw_results(frame: np.ndarray, recognitions: List[dict]) -> np.ndarray:
-    """Gambar bbox dan label identitas di frame (untuk video/webcam)."""
+    """Gambar bbox dan label identitas di frame (untuk video/webcam); hasil tracking diberi nomor track."""
     out = frame.copy()
     for r in recognitions:
         area = r.get("facial_area") or {}
@@ -233,6 +1100,8 @@ def draw_results(frame: np.ndarray, recognitions: List[dict]) -> np.ndarray:
         identity = r.get("identity") or "Unknown"
         sim = r.get("similarity", 0)
         label = f"{identity} ({sim:.2f})"
+        if r.get("track_id") is not None:
+            label = f"#{r['track_id']} {label}"
         color = (0, 255, 0) if r.get("identity") else (0, 0, 255)
         cv2.rectangle(out, (x, y), (x + w, y + h), color, 2)
         cv2.putText(
@@ -0,0 +1,212 @@
+"""
+Pencarian galeri ter-shard lintas proses untuk database sangat besar (jutaan embedding).
+Matriks galeri (presisi sesuai indeks), skala int8, dan label ditulis sekali ke file bersama
+(/dev/shm bila ada) lalu dibuka dengan np.memmap oleh proses induk dan semua worker, sehingga
+tidak ada salinan per proses. Tiap worker memegang satu rentang baris (shard); batch query dikirim
+ke semua shard sekaligus lalu top-k per shard digabung:
+- closest : top-k baris per shard -> top-k global
+- voting  : similarity maksimum per identitas di tiap shard (top-k identitas per shard)
+            -> maksimum per identitas lintas shard -> top-k; hasil sama dengan satu proses
+Baris yang ditambahkan setelah shard dibangun dicari di proses induk lalu ikut digabung.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+import face_db
+
+
+def _label_groups(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(permutasi urut-per-label, awal segmen, label unik) untuk maksimum per identitas."""
+    perm = np.argsort(labels, kind="stable")
+    ordered = labels[perm]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if len(ordered) else np.zeros(0, np.intp)
+    return perm, starts, ordered[starts]
+
+
+def _shard_top_k(rows, labels, groups, offset, queries, strategy, k):
+    """
+    Top-k satu shard. Returns: (id (Q, k), similarity (Q, k));
+    id = indeks baris global (closest) atau label identitas (voting).
+    """
+    sims = np.clip(rows.dot(queries), 0.0, 1.0)
+    if strategy == "voting":
+        perm, starts, ids = groups
+        sims = np.maximum.reduceat(sims[:, perm], starts, axis=1)
+    else:
+        ids = np.arange(offset, offset + rows.n)
+    cols = face_db.top_k_columns(sims, max(1, min(k, sims.shape[1])))
+    return ids[cols], np.take_along_axis(sims, cols, axis=1)
+
+
+def _worker(conn, folder: str, precision: str, n: int, dim: int, start: int, end: int) -> None:
+    """Loop worker: buka shard [start, end) dari file bersama, jawab permintaan top-k sampai menerima None."""
+    dtype = face_db.PRECISION_DTYPES[precision]
+    data = np.memmap(os.path.join(folder, "rows.bin"), dtype=dtype, mode="r", shape=(n, dim))[start:end]
+    scales = np.memmap(os.path.join(folder, "scales.bin"), dtype=np.float32, mode="r", shape=(n,))[start:end]
+    labels = np.array(np.memmap(os.path.join(folder, "labels.bin"), dtype=np.int32, mode="r", shape=(n,))[start:end])
+    rows = face_db.PackedRows.view(precision, data, scales)
+    groups = _label_groups(labels)
+    conn.send("ready")
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        queries, strategy, k = msg
+        try:
+            conn.send(_shard_top_k(rows, labels, groups, start, queries, strategy, k))
+        except Exception as e:
+            conn.send(e)
+    conn.close()
+
+
+def _shard_bounds(n: int, n_shards: int) -> List[Tuple[int, int]]:
+    """Rentang baris per shard; batas dibulatkan ke blok skor agar numerik sama dengan satu proses."""
+    block = face_db.DOT_BLOCK_ROWS
+    cuts = [0]
+    for i in range(1, n_shards):
+        cut = (n * i // n_shards + block // 2) // block * block
+        if cuts[-1] < cut < n:
+            cuts.append(cut)
+    cuts.append(n)
+    return [(s, e) for s, e in zip(cuts[:-1], cuts[1:]) if e > s]
+
+
+def _merge(parts, k: int, unique_ids: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gabung top-k per shard menjadi top-k global (similarity menurun, seri -> id terkecil).
+    unique_ids=True (voting): id yang sama dari beberapa shard diambil similarity maksimumnya.
+    """
+    ids = np.concatenate([p[0] for p in parts], axis=1)
+    sims = np.concatenate([p[1] for p in parts], axis=1)
+    n = ids.shape[0]
+    ids_out = np.full((n, k), -1, dtype=np.int64)
+    sims_out = np.zeros((n, k), dtype=np.float32)
+    for i in range(n):
+        order = np.lexsort((ids[i], -sims[i]))
+        row_ids, row_sims = ids[i][order], sims[i][order]
+        if unique_ids:
+            _, first = np.unique(row_ids, return_index=True)
+            first = np.sort(first)
+            row_ids, row_sims = row_ids[first], row_sims[first]
+        m = min(k, len(row_ids))
+        ids_out[i, :m] = row_ids[:m]
+        sims_out[i, :m] = row_sims[:m]
+    return ids_out, sims_out
+
+
+class ShardedSearch:
+    """
+    Worker proses (satu per shard) untuk matriks GalleryIndex.
+    `covered` = jumlah baris galeri yang ada di shard; baris sesudahnya dicari di proses induk.
+    Aman dipakai dari banyak thread (satu batch query berjalan pada satu waktu).
+    """
+
+    def __init__(self, gallery: "face_db.GalleryIndex", n_shards: Optional[int] = None):
+        import multiprocessing as mp
+
+        n = len(gallery)
+        dim = gallery.stored_matrix.shape[1]
+        self.precision = gallery.precision
+        self.covered = n
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self._folder = tempfile.mkdtemp(prefix="face_shards_", dir=shm)
+        dtype = face_db.PRECISION_DTYPES[self.precision]
+        rows = np.memmap(os.path.join(self._folder, "rows.bin"), dtype=dtype, mode="w+", shape=(n, dim))
+        rows[:] = gallery.stored_matrix
+        scales = np.memmap(os.path.join(self._folder, "scales.bin"), dtype=np.float32, mode="w+", shape=(n,))
+        scales[:] = gallery.stored_scales
+        labels = np.memmap(os.path.join(self._folder, "labels.bin"), dtype=np.int32, mode="w+", shape=(n,))
+        labels[:] = gallery.labels
+        rows.flush(), scales.flush(), labels.flush()
+        # Induk memakai file bersama yang sama (tanpa salinan kedua) sampai galeri tumbuh
+        gallery.use_storage(rows, scales)
+        del labels
+
+        self.bounds = _shard_bounds(n, max(1, n_shards or os.cpu_count() or 1))
+        ctx = mp.get_context("spawn")
+        self._conns = []
+        self._procs = []
+        # Satu thread BLAS per worker: paralelisme datang dari jumlah shard
+        saved = {k: os.environ.get(k) for k in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({k: "1" for k in saved})
+        try:
+            for start, end in self.bounds:
+                parent, child = ctx.Pipe()
+                proc = ctx.Process(
+                    target=_worker, args=(child, self._folder, self.precision, n, dim, start, end),
+                    name=f"gallery-shard-{start}", daemon=True,
+                )
+                proc.start()
+                child.close()
+                self._conns.append(parent)
+                self._procs.append(proc)
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        for conn in self._conns:
+            conn.recv()
+        self._lock = threading.Lock()
+        # File bersama di /dev/shm tidak hilang sendiri saat proses selesai
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def _fan_out(self, gallery, queries_norm: np.ndarray, strategy: str, k: int):
+        """Kirim batch query ke semua shard, cari sisa baris (tail) di induk, kumpulkan hasil."""
+        queries_norm = np.ascontiguousarray(queries_norm, dtype=np.float32)
+        with self._lock:
+            for conn in self._conns:
+                conn.send((queries_norm, strategy, k))
+            parts = []
+            n = len(gallery)
+            if n > self.covered:
+                tail = gallery.packed_rows(self.covered, n)
+                labels = gallery.labels[self.covered:n]
+                parts.append(_shard_top_k(tail, labels, _label_groups(labels), self.covered, queries_norm, strategy, k))
+            for conn in self._conns:
+                res = conn.recv()
+                if isinstance(res, Exception):
+                    raise RuntimeError(f"Worker shard gagal: {res}") from res
+                parts.append(res)
+        return parts
+
+    def search(self, gallery, queries_norm: np.ndarray, strategy: str, top_k: int = 1):
+        """
+        Top-k closest/voting seperti GalleryIndex.search versi satu proses.
+        Returns: (label (N, k), similarity (N, k)).
+        """
+        voting = strategy == "voting"
+        k = max(1, min(top_k, len(gallery.identities) if voting else len(gallery)))
+        ids, sims = _merge(self._fan_out(gallery, queries_norm, strategy, k), k, unique_ids=voting)
+        labels = ids.astype(np.int32) if voting else gallery.labels[ids]
+        return labels, sims
+
+    def candidates(self, gallery, queries_norm: np.ndarray, n_cand: int) -> np.ndarray:
+        """Indeks baris `n_cand` teratas per query (skor matriks tersimpan) untuk re-rank float32."""
+        k = max(1, min(n_cand, len(gallery)))
+        ids, _ = _merge(self._fan_out(gallery, queries_norm, "closest", k), k, unique_ids=False)
+        return ids
+
+    def close(self) -> None:
+        """Hentikan worker dan hapus file bersama (mapping yang masih terbuka tetap valid di Linux)."""
+        for conn in self._conns:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns, self._procs = [], []
+        shutil.rmtree(self._folder, ignore_errors=True)
+        atexit.unregister(self.close)
@@ -0,0 +1,205 @@
+"""
+Server pengenalan multi-stream: model dan galeri dimuat sekali untuk banyak kamera.
+Tiap stream punya thread capture (drop-oldest) dan thread deteksi; crop wajah dari semua stream
+digabung oleh satu MicroBatcher menjadi batch embedding + pencarian galeri, dengan batas latensi.
+Wajah yang sama di frame berikutnya memakai identitas dari IdentityCache per stream (tanpa embedding).
+Hasil dikirim sebagai event per stream (JSON lines).
+"""
+import json
+import threading
+import time
+from typing import Dict, List, Optional, TextIO, Tuple
+import cv2
+import config
+import identity_cache
+import quality
+import recognition_engine as engine
+from batching import MicroBatcher
+from video import FrameQueue, StageStats, face_events, is_live, parse_source
+
+
+def parse_stream_spec(spec: str, index: int) -> Tuple[str, str]:
+    """'nama=sumber' -> (nama, sumber); tanpa nama -> ('cam<index>', sumber)."""
+    name, sep, source = spec.partition("=")
+    if sep and "://" not in name:
+        return name, source
+    return f"cam{index}", spec
+
+
+class _Stream:
+    """Satu sumber video: capture + deteksi, embedding lewat batcher bersama."""
+
+    def __init__(self, server: "StreamServer", name: str, source: str):
+        self.server = server
+        self.name = name
+        self.source = parse_source(source)
+        self.frames = FrameQueue(1)
+        self.counters = {"captured": 0, "processed": 0, "faces": 0, "events": 0, "errors": 0}
+        self.identity_cache = identity_cache.create()
+        self._threads: List[threading.Thread] = []
+        self._done = threading.Event()
+
+    def start(self) -> None:
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise ValueError(f"Tidak dapat membuka stream {self.name}: {self.source}")
+        self._threads = [
+            threading.Thread(target=self._capture, args=(cap,), name=f"{self.name}-capture", daemon=True),
+            threading.Thread(target=self._process, name=f"{self.name}-detect", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _capture(self, cap) -> None:
+        # File video diputar sesuai FPS aslinya agar berperilaku seperti kamera
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        interval = 1.0 / fps if not is_live(self.source) and fps > 0 else 0.0
+        next_t = time.perf_counter()
+        seq = 0
+        try:
+            while not self.server.stopping.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.frames.put((seq, time.perf_counter(), frame))
+                self.counters["captured"] += 1
+                seq += 1
+                if interval:
+                    next_t += interval
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            cap.release()
+            self.frames.close()
+
+    def _process(self) -> None:
+        stats = self.server.stats
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                seq, t_capture, frame = item
+                try:
+                    t0 = time.perf_counter()
+                    faces = engine.detect_faces(frame, "video")
+                    t1 = time.perf_counter()
+                    stats.add("detect", t1 - t0)
+                    if self.identity_cache is not None:
+                        matches = self.identity_cache.resolve(faces, self._match)
+                    else:
+                        matches = self._match(faces)
+                    stats.add("embed_match", time.perf_counter() - t1)
+                except Exception:
+                    self.counters["errors"] += 1
+                    continue
+                self.counters["processed"] += 1
+                self.counters["faces"] += len(faces)
+                recognitions = [
+                    {"identity": identity, "similarity": sim, "facial_area": f["facial_area"]}
+                    for f, (identity, sim) in zip(faces, matches)
+                ]
+                stats.add("end_to_end", time.perf_counter() - t_capture)
+                if recognitions:
+                    self.server.emit({
+                        "ts": time.time(),
+                        "stream": self.name,
+                        "frame": seq,
+                        "faces": face_events(recognitions),
+                    })
+                    self.counters["events"] += 1
+        finally:
+            self._done.set()
+
+    def _match(self, faces: List[dict]) -> List[Tuple[Optional[str], float]]:
+        futures = self.server.batcher.submit_many([f["face"] for f in faces])
+        return [fut.result() for fut in futures]
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class StreamServer:
+    """
+    Layanan pengenalan untuk banyak stream sekaligus.
+    - sources: list spesifikasi stream ('nama=sumber' atau sumber saja: index webcam, file, RTSP)
+    - max_batch / max_latency_ms: batas batch embedding lintas stream
+    - events: file teks tujuan event JSON lines (None = tidak ditulis)
+    """
+
+    def __init__(
+        self,
+        sources: List[str],
+        max_batch: Optional[int] = None,
+        max_latency_ms: Optional[float] = None,
+        events: Optional[TextIO] = None,
+    ):
+        self.streams = [_Stream(self, *parse_stream_spec(spec, i)) for i, spec in enumerate(sources)]
+        self.max_batch = max_batch or getattr(config, "SERVER_MAX_BATCH", 32)
+        self.max_latency_ms = max_latency_ms if max_latency_ms is not None else getattr(config, "SERVER_MAX_LATENCY_MS", 20.0)
+        self.events = events
+        self.stats = StageStats()
+        self.stopping = threading.Event()
+        self.batcher: Optional[MicroBatcher] = None
+        self._emit_lock = threading.Lock()
+        self._t_start = 0.0
+
+    def start(self) -> None:
+        """Muat model + galeri sekali, lalu jalankan semua stream."""
+        engine.warmup()
+        self.batcher = MicroBatcher(
+            engine.recognize_faces, self.max_batch, self.max_latency_ms, name="embed-batcher"
+        )
+        self._t_start = time.perf_counter()
+        for s in self.streams:
+            s.start()
+
+    def emit(self, event: dict) -> None:
+        if self.events is None:
+            return
+        with self._emit_lock:
+            self.events.write(json.dumps(event) + "\n")
+            self.events.flush()
+
+    def wait(self, duration: Optional[float] = None, on_tick=None, tick_seconds: float = 10.0) -> None:
+        """Tunggu sampai semua stream selesai atau `duration` detik; on_tick(counters) dipanggil berkala."""
+        t_end = time.perf_counter() + duration if duration else None
+        next_tick = time.perf_counter() + tick_seconds
+        while not all(s.join(0.2) for s in self.streams):
+            now = time.perf_counter()
+            if t_end and now >= t_end:
+                break
+            if on_tick and now >= next_tick:
+                on_tick(self.counters())
+                next_tick = now + tick_seconds
+
+    def stop(self) -> None:
+        self.stopping.set()
+        for s in self.streams:
+            s.frames.close()
+            s.join(5.0)
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def counters(self) -> dict:
+        """Throughput dan latensi: per stream, batcher embedding, dan waktu per tahap."""
+        seconds = max(time.perf_counter() - self._t_start, 1e-9)
+        streams: Dict[str, dict] = {}
+        for s in self.streams:
+            c = dict(s.counters)
+            c["dropped"] = s.frames.dropped
+            c["fps"] = c["processed"] / seconds
+            streams[s.name] = c
+        total_faces = sum(c["faces"] for c in streams.values())
+        return {
+            "seconds": seconds,
+            "streams": streams,
+            "frames_per_sec": sum(c["processed"] for c in streams.values()) / seconds,
+            "faces_per_sec": total_faces / seconds,
+            "batcher": self.batcher.stats() if self.batcher else {},
+            "stages": self.stats.summary(),
+            "detectors": engine.detector_stats(),
+            "quality": quality.stats(),
+            "identity_cache": identity_cache.stats(),
+        }
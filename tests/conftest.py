@@ -0,0 +1,97 @@
+"""
+Fixture bersama untuk test (pytest). Modul proyek berada di root repo (bukan paket), jadi root
+ditambahkan ke sys.path. Test tidak butuh DeepFace/TensorFlow: detektor dan model di-monkeypatch.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+_DB_SETTINGS = {
+    "FACE_DB_PATH": "",
+    "FACE_DB_EMBEDDINGS_FILE": "embeddings.f32",
+    "FACE_DB_RECORDS_FILE": "records.jsonl",
+    "FACE_DB_FILE": "representations.pkl",
+    "EMBED_CACHE_FILE": "embedding_cache.sqlite",
+    "ANN_INDEX_FILE": "ann_ivf.npz",
+}
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Database wajah + cache embedding di folder sementara (face_database asli tidak disentuh)."""
+    import embedding_cache
+    import face_db
+
+    db_dir = tmp_path / "face_database"
+    db_dir.mkdir()
+    for name, filename in _DB_SETTINGS.items():
+        monkeypatch.setattr(config, name, str(db_dir / filename) if filename else str(db_dir))
+    face_db._invalidate_index()
+    yield db_dir
+    face_db._invalidate_index()
+    cache = embedding_cache._cache
+    if cache is not None and cache.path.startswith(str(tmp_path)):
+        cache.close()
+        embedding_cache._cache = None
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """
+    Detektor + model embedding tiruan (tanpa DeepFace): satu wajah persegi di tengah gambar (sisi = setengah
+    sisi terpendek gambar, maksimal 200), kecuali gambar hitam polos (tanpa wajah). Embedding = crop abu-abu 8x8 ternormalisasi.
+    Returns: dict berisi jumlah crop yang di-embed ("embedded").
+    """
+    import cv2
+    import numpy as np
+    import recognition_engine as engine
+
+    calls = {"embedded": 0}
+
+    def detect_with(img, backend):
+        if not img.any():
+            return []
+        h, w = img.shape[:2]
+        size = min(200, min(h, w) // 2)
+        x, y = (w - size) // 2, (h - size) // 2
+        return [{
+            "face": np.ascontiguousarray(img[y:y + size, x:x + size]),
+            "facial_area": {"x": x, "y": y, "w": size, "h": size},
+            "confidence": 0.99,
+            "detector": backend,
+        }]
+
+    def embed_faces(faces, batch_size=None):
+        calls["embedded"] += len(faces)
+        out = []
+        for face in faces:
+            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+            vec = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+            vec -= vec.mean()
+            out.append(vec / (np.linalg.norm(vec) + 1e-8))
+        return out
+
+    monkeypatch.setattr(engine, "_detect_with", detect_with)
+    monkeypatch.setattr(engine, "embed_faces", embed_faces)
+    return calls
+
+
+def write_face_image(path, seed: int, blur: int = 0, size: int = 400) -> str:
+    """Gambar size x size bertekstur (lolos penyaringan kualitas); blur > 0 = diburamkan (kernel ganjil)."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    img = cv2.GaussianBlur((rng.random((size, size, 3)) * 255).astype(np.uint8), (3, 3), 0)
+    if blur:
+        img = cv2.GaussianBlur(img, (blur, blur), 0)
+    os.makedirs(os.path.dirname(str(path)), exist_ok=True)
+    cv2.imwrite(str(path), img)
+    return str(path)
@@ -0,0 +1,25 @@
+import pytest
+
+from batching import MicroBatcher
+
+
+def test_results_in_order():
+    batcher = MicroBatcher(lambda items: [x * 2 for x in items], max_batch=4, max_latency_ms=5.0)
+    try:
+        futures = batcher.submit_many([1, 2, 3])
+        assert [f.result(timeout=5) for f in futures] == [2, 4, 6]
+    finally:
+        batcher.close()
+
+
+@pytest.mark.parametrize("fn", [lambda items: items[:-1], lambda items: items + [None]])
+def test_wrong_result_count_fails_every_future(fn):
+    batcher = MicroBatcher(fn, max_batch=8, max_latency_ms=50.0)
+    try:
+        futures = batcher.submit_many([1, 2, 3])
+        for f in futures:
+            with pytest.raises(RuntimeError, match="3 item"):
+                f.result(timeout=5)
+        assert batcher.stats()["errors"] == 1
+    finally:
+        batcher.close()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import embedding_cache
+
+
+def _faces(value: float) -> list:
+    return [{"embedding": np.full(4, value, dtype=np.float32), "facial_area": {"x": 1, "y": 2, "w": 3, "h": 4},
+             "face_confidence": 0.9}]
+
+
+def _db_counters(path: str) -> dict:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT name, value FROM counters").fetchall())
+
+
+def test_hits_do_not_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    cache = embedding_cache.EmbeddingCache(path, max_entries=10)
+    cache.put("a", _faces(1.0))
+    writes = []
+    cache._conn.set_trace_callback(lambda sql: writes.append(sql) if not sql.lstrip().startswith("SELECT") else None)
+    for _ in range(100):
+        assert cache.get("a")[0]["embedding"][0] == 1.0
+    assert cache.get("missing") is None
+    cache._conn.set_trace_callback(None)
+    assert writes == []
+    # Counter tertunda ikut terhitung di stats dan tersimpan untuk proses lain
+    stats = cache.stats()
+    assert stats["session"]["hits"] == 100 and stats["total"]["hits"] == 100
+    assert _db_counters(path)["misses"] == 1
+    cache.close()
+
+
+def test_lru_uses_deferred_recency(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_TOUCH_INTERVAL", 0.0)
+    cache = embedding_cache.EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("old", _faces(1.0))
+    cache.put("new", _faces(2.0))
+    assert cache.get("old") is not None  # "old" baru dipakai: "new" yang dibuang
+    cache.put("third", _faces(3.0))
+    assert cache.get("old") is not None
+    assert cache.get("new") is None
+    assert cache.stats()["total"]["evictions"] == 1
+    cache.close()
+
+
+def test_close_flushes_pending_counters(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = embedding_cache.EmbeddingCache(path)
+    cache.put("a", _faces(1.0))
+    cache.get("a")
+    cache.get("b")
+    cache.close()
+    assert os.path.exists(path)
+    counters = _db_counters(path)
+    assert counters["hits"] == 1 and counters["misses"] == 1 and counters["puts"] == 1
+
+
+def test_get_cache_closes_previous_cache(tmp_path, monkeypatch):
+    import config
+
+    registered = []
+    monkeypatch.setattr(embedding_cache.atexit, "register", registered.append)
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    monkeypatch.setattr(config, "EMBED_CACHE_ENABLED", True)
+    first_path = str(tmp_path / "first.sqlite")
+    monkeypatch.setattr(config, "EMBED_CACHE_FILE", first_path)
+    first = embedding_cache.get_cache()
+    assert embedding_cache.get_cache() is first
+    first.put("a", _faces(1.0))
+    first.get("a")
+
+    monkeypatch.setattr(config, "EMBED_CACHE_FILE", str(tmp_path / "second.sqlite"))
+    second = embedding_cache.get_cache()
+    assert second is not first
+    # Koneksi lama tertutup dan counter tertundanya sudah tersimpan
+    with pytest.raises(sqlite3.ProgrammingError):
+        first._conn.execute("SELECT 1")
+    assert _db_counters(first_path)["hits"] == 1
+    assert registered == []
+
+    embedding_cache._close_cache()
+    with pytest.raises(sqlite3.ProgrammingError):
+        second._conn.execute("SELECT 1")
@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+
+import config
+import face_db
+
+THRESHOLD = 0.5
+
+
+def _baseline_find_closest(records, embedding, strategy, th=THRESHOLD):
+    """
+    Pencocokan versi awal (baseline 156a0d6: loop per record di atas pickle), disalin apa adanya
+    sebagai acuan: indeks galeri, batch query, dan store memmap harus memberi hasil yang sama.
+    """
+    def norm(v):
+        v = np.array(v, dtype=np.float32).flatten()
+        return v / (np.linalg.norm(v) + 1e-8)
+
+    def sim(a, b):
+        return min(1.0, max(0.0, float(np.dot(a, b))))
+
+    q = norm(embedding)
+    if strategy == "centroid":
+        by_identity = {}
+        for r in records:
+            by_identity.setdefault(r["identity"], []).append(np.array(r["embedding"], dtype=np.float32).flatten())
+        scores = {i: sim(q, norm(np.mean(np.stack(e), axis=0))) for i, e in by_identity.items()}
+    elif strategy == "voting":
+        scores = {}
+        for r in records:
+            scores[r["identity"]] = max(scores.get(r["identity"], 0), sim(q, norm(r["embedding"])))
+    else:
+        best_identity, best = None, 0.0
+        for r in records:
+            s = sim(q, norm(r["embedding"]))
+            if s > best:
+                best_identity, best = r["identity"], s
+        return (best_identity if best >= th else None), best
+    best_identity = max(scores, key=scores.get)
+    best = scores[best_identity]
+    return (best_identity if best >= th else None), best
+
+
+def _records(n_identities: int = 30, per_identity: int = 5, dim: int = 128, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(n_identities, dim))
+    return [
+        {
+            "identity": f"id{i}",
+            "embedding": (base[i] + 0.6 * rng.normal(size=dim)).astype(np.float32) * rng.uniform(0.5, 3.0),
+            "image_path": f"/foto/id{i}/{j}.jpg",
+        }
+        for j in range(per_identity) for i in range(n_identities)
+    ]
+
+
+def _queries(records, n: int = 40, seed: int = 2):
+    """Separuh query dekat embedding galeri (cocok), separuh acak (di bawah threshold)."""
+    rng = np.random.default_rng(seed)
+    dim = len(records[0]["embedding"])
+    near = [records[i]["embedding"] + rng.normal(size=dim).astype(np.float32) for i in range(0, n, 2)]
+    far = [rng.normal(size=dim).astype(np.float32) for _ in range(n // 2)]
+    return near + far
+
+
+def _assert_matches_baseline(records, queries, strategy, tol):
+    for q in queries:
+        expected = _baseline_find_closest(records, q, strategy)
+        got = face_db.find_closest(q, threshold=THRESHOLD)
+        assert got[0] == expected[0]
+        assert abs(got[1] - expected[1]) <= tol
+
+
+def _gallery(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    identities = [f"p{i}" for i in range(50) for _ in range(6)]
+    # Norma embedding bervariasi: centroid harus rata-rata embedding mentah, bukan baris ter-normalisasi
+    embs = (rng.normal(size=(300, 128)) * rng.uniform(0.2, 5.0, size=(300, 1))).astype(np.float32)
+    queries = face_db.normalize_rows(rng.normal(size=(50, 128)).astype(np.float32) + embs[::6])
+    return identities, embs, queries
+
+
+@pytest.mark.parametrize("precision, tol", [("float16", 2e-4), ("int8", 3e-3)])
+def test_quantized_centroids_match_float32(precision, tol):
+    identities, embs, queries = _gallery()
+    ref = face_db.GalleryIndex(identities, embs, "float32").centroids @ queries.T
+    index = face_db.GalleryIndex(identities[:200], embs[:200], precision)
+    index.append(identities[200:], embs[200:])
+    assert np.abs(index.centroids @ queries.T - ref).max() < tol
+    index.remove_identity("p3")
+    ref_removed = np.delete(ref, 3, axis=0)
+    assert np.abs(index.centroids @ queries.T - ref_removed).max() < tol
+
+
+def test_ivf_attached_when_incremental_adds_cross_threshold(temp_db, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "SEARCH_MODE", "ivf")
+    monkeypatch.setattr(config, "ANN_MIN_GALLERY_SIZE", 50)
+    identities, embs, queries = _gallery()
+    face_db.add_faces([{"identity": i, "embedding": e} for i, e in zip(identities[:40], embs[:40])])
+    assert face_db.get_index().ann is None
+    face_db.add_faces([{"identity": i, "embedding": e} for i, e in zip(identities[40:60], embs[40:60])])
+    index = face_db._index
+    assert len(index) == 60 and index.ann is not None
+    assert face_db.get_index() is index
+
+
+@pytest.mark.parametrize("strategy", ["closest", "voting", "centroid"])
+@pytest.mark.parametrize("precision, tol", [("float32", 1e-5), ("float16", 2e-3)])
+def test_find_closest_matches_baseline(temp_db, monkeypatch, strategy, precision, tol):
+    monkeypatch.setattr(config, "MATCH_STRATEGY", strategy)
+    monkeypatch.setattr(config, "EMBEDDING_PRECISION", precision)
+    monkeypatch.setattr(config, "RERANK_TOP_N", 0)
+    records = _records()
+    face_db.add_faces(records[:100])
+    face_db.add_faces(records[100:])
+    _assert_matches_baseline(records, _queries(records), strategy, tol)
+
+
+@pytest.mark.parametrize("strategy", ["closest", "voting", "centroid"])
+def test_batch_matches_baseline_per_query(temp_db, monkeypatch, strategy):
+    monkeypatch.setattr(config, "MATCH_STRATEGY", strategy)
+    records = _records()
+    face_db.add_faces(records)
+    queries = _queries(records)
+    batch = face_db.find_closest_batch(np.stack(queries), threshold=THRESHOLD, top_k=3)
+    assert len(batch) == len(queries)
+    for q, candidates in zip(queries, batch):
+        expected = _baseline_find_closest(records, q, strategy)
+        assert candidates[0][0] == expected[0]
+        assert abs(candidates[0][1] - expected[1]) <= 1e-5
+        sims = [sim for _, sim in candidates]
+        assert len(candidates) == 3 and sims == sorted(sims, reverse=True)
+    # Input list embedding dan query tunggal memberi hasil yang sama dengan matriks
+    for got, ref in zip(face_db.find_closest_batch(queries[:2], threshold=THRESHOLD), batch[:2]):
+        assert len(got) == 1 and got[0][0] == ref[0][0] and abs(got[0][1] - ref[0][1]) <= 1e-5
+    assert face_db.find_closest_batch([]) == []
+
+
+@pytest.mark.parametrize("strategy", ["closest", "voting", "centroid"])
+def test_pickle_migration_then_append_and_remove(temp_db, monkeypatch, strategy):
+    import os
+    import pickle
+
+    monkeypatch.setattr(config, "MATCH_STRATEGY", strategy)
+    records = _records(n_identities=6, per_identity=3)
+    dim = len(records[0]["embedding"])
+    with open(config.FACE_DB_FILE, "wb") as f:
+        pickle.dump(records, f)  # format baseline: list record dengan embedding np.float32
+
+    # Pembacaan pertama memigrasi pickle ke store memmap; pickle lama tidak dihapus
+    assert face_db.count_faces() == len(records)
+    assert os.path.exists(config.FACE_DB_RECORDS_FILE) and os.path.exists(config.FACE_DB_EMBEDDINGS_FILE)
+    assert os.path.exists(config.FACE_DB_FILE)
+    migrated = face_db.get_all()
+    assert [(r["identity"], r["image_path"]) for r in migrated] == [(r["identity"], r["image_path"]) for r in records]
+    np.testing.assert_array_equal(np.stack([r["embedding"] for r in migrated]), np.stack([r["embedding"] for r in records]))
+    queries = _queries(records, n=12)
+    _assert_matches_baseline(records, queries, strategy, 1e-5)
+
+    # Append menambah baris di akhir file embedding tanpa menulis ulang isi lama
+    size = os.path.getsize(config.FACE_DB_EMBEDDINGS_FILE)
+    new = {"identity": "baru", "embedding": queries[-1] * 2.0, "image_path": "/foto/baru.jpg"}
+    face_db.add_face(new["identity"], new["embedding"], new["image_path"])
+    records.append(new)
+    assert os.path.getsize(config.FACE_DB_EMBEDDINGS_FILE) == size + 4 * dim
+    assert face_db.get_count_by_identity()["baru"] == 1
+    _assert_matches_baseline(records, queries, strategy, 1e-5)
+
+    assert face_db.remove_identity("id2") == 3
+    assert face_db.remove_identity("tidak-ada") == 0
+    records = [r for r in records if r["identity"] != "id2"]
+    assert face_db.get_identities() == sorted({r["identity"] for r in records})
+    _assert_matches_baseline(records, queries, strategy, 1e-5)
+    # Store dibaca ulang dari disk (seperti proses baru) memberi hasil yang sama
+    face_db._invalidate_index()
+    _assert_matches_baseline(records, queries, strategy, 1e-5)
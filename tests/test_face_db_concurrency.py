@@ -0,0 +1,151 @@
+"""
+Kontrak kunci face_db lintas proses: penulis (add_faces, remove_identity) saling menunggu lewat kunci file,
+penulisan ulang atomik (rename), pembaca memakai snapshot konsisten tanpa error.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import config
+import face_db
+
+DIM = 16
+WRITERS = 4
+READERS = 2
+ROUNDS = 25
+
+
+def _use_db(db_dir: str) -> None:
+    config.FACE_DB_PATH = db_dir
+    config.FACE_DB_EMBEDDINGS_FILE = os.path.join(db_dir, "embeddings.f32")
+    config.FACE_DB_RECORDS_FILE = os.path.join(db_dir, "records.jsonl")
+    config.FACE_DB_FILE = os.path.join(db_dir, "representations.pkl")
+    config.ANN_INDEX_FILE = os.path.join(db_dir, "ann_ivf.npz")
+    face_db._invalidate_index()
+
+
+def _embedding(writer: int, i: int) -> list:
+    vec = np.zeros(DIM, dtype=np.float32)
+    vec[writer] = 1.0
+    vec[WRITERS + i % (DIM - WRITERS)] = 0.1
+    return vec.tolist()
+
+
+def _writer(db_dir: str, writer: int, errors) -> None:
+    try:
+        _use_db(db_dir)
+        for i in range(ROUNDS):
+            face_db.add_faces([{"identity": f"w{writer}", "embedding": _embedding(writer, i)}])
+            # Identitas sementara: ditambah lalu dihapus (penulisan ulang database) di sela penulis lain
+            face_db.add_faces([{"identity": f"tmp{writer}", "embedding": _embedding(writer, i)}] * 2)
+            if i % 5 == 4:
+                assert face_db.remove_identity(f"tmp{writer}") >= 2
+    except BaseException as e:  # noqa: BLE001 - dilaporkan ke proses test
+        errors.put(f"writer {writer}: {type(e).__name__}: {e}")
+
+
+def _reader(db_dir: str, stop, errors) -> None:
+    try:
+        _use_db(db_dir)
+        queries = np.eye(DIM, dtype=np.float32)[:WRITERS]
+        while not stop.is_set():
+            index = face_db.get_index()
+            # Snapshot konsisten: jumlah baris indeks = jumlah label, identitas unik
+            assert len(index.labels) == len(index)
+            assert len(set(index.identities)) == len(index.identities)
+            for w, candidates in enumerate(face_db.find_closest_batch(queries)):
+                identity, sim = candidates[0]
+                assert identity in (None, f"w{w}", f"tmp{w}"), identity
+            counts = face_db.get_count_by_identity()
+            assert all(n > 0 for n in counts.values())
+    except BaseException as e:  # noqa: BLE001
+        errors.put(f"reader: {type(e).__name__}: {e}")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="butuh start method fork")
+def test_concurrent_writers_and_readers(temp_db):
+    ctx = multiprocessing.get_context("fork")
+    db_dir = str(temp_db)
+    errors = ctx.Queue()
+    stop = ctx.Event()
+    readers = [ctx.Process(target=_reader, args=(db_dir, stop, errors)) for _ in range(READERS)]
+    writers = [ctx.Process(target=_writer, args=(db_dir, w, errors)) for w in range(WRITERS)]
+    for p in readers + writers:
+        p.start()
+    for p in writers:
+        p.join(120)
+    stop.set()
+    for p in readers:
+        p.join(30)
+    messages = []
+    while not errors.empty():
+        messages.append(errors.get())
+    assert not messages, messages
+    assert all(p.exitcode == 0 for p in readers + writers)
+
+    # Tidak ada tulisan yang hilang: tiap penulis punya tepat ROUNDS embedding
+    face_db._invalidate_index()
+    counts = face_db.get_count_by_identity()
+    for w in range(WRITERS):
+        assert counts[f"w{w}"] == ROUNDS
+        assert f"tmp{w}" not in counts  # ROUNDS kelipatan 5: dihapus di putaran terakhir
+    assert len(face_db.get_metadata()) == WRITERS * ROUNDS
+    assert len(face_db.get_index()) == WRITERS * ROUNDS
+    # Penulisan ulang atomik: tidak ada file sementara yang tertinggal
+    leftovers = [f for f in os.listdir(db_dir) if ".tmp" in f]
+    assert not leftovers, leftovers
+
+
+@pytest.mark.parametrize("strategy", ["closest", "voting", "centroid"])
+def test_search_during_incremental_updates_in_process(temp_db, monkeypatch, strategy):
+    # Pencarian di thread lain selama add_faces/remove_identity melihat indeks lama atau baru yang utuh
+    import threading
+
+    monkeypatch.setattr(config, "MATCH_STRATEGY", strategy)
+    rng = np.random.default_rng(0)
+    face_db.add_faces([{"identity": f"base{i}", "embedding": rng.normal(size=DIM).tolist()} for i in range(8)])
+    queries = rng.normal(size=(16, DIM)).astype(np.float32)
+    face_db.find_closest_batch(queries)
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for candidates in face_db.find_closest_batch(queries, top_k=3):
+                    assert len(candidates) == 3
+            except Exception as e:  # pragma: no cover - dilaporkan lewat assert di bawah
+                errors.append(repr(e))
+                return
+
+    reader = threading.Thread(target=search)
+    reader.start()
+    try:
+        for i in range(150):
+            face_db.add_faces([
+                {"identity": f"tmp{i}", "embedding": rng.normal(size=DIM).tolist()} for _ in range(3)
+            ])
+            if i % 2:
+                face_db.remove_identity(f"tmp{i - 1}")
+    finally:
+        stop.set()
+        reader.join()
+    assert errors == []
+
+
+@pytest.mark.parametrize("reader", ["count_faces", "get_identities", "get_count_by_identity"])
+def test_metadata_readers_wait_for_writer(temp_db, reader):
+    # Pembaca metadata memakai kunci bersama seperti snapshot_metadata: tidak membaca sidecar di tengah penulisan
+    import threading
+
+    face_db.add_faces([{"identity": "A", "embedding": _embedding(0, 0)}])
+    done = threading.Event()
+    result = []
+    with face_db.write_lock():
+        thread = threading.Thread(target=lambda: (result.append(getattr(face_db, reader)()), done.set()))
+        thread.start()
+        assert not done.wait(0.3)
+    thread.join(5)
+    assert done.is_set() and result[0] in (1, ["A"], {"A": 1})
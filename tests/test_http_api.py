@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+
+import face_db
+import http_api
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_database_reads_do_not_block_event_loop(temp_db, monkeypatch):
+    # Pembacaan database yang menunggu kunci penulis tidak boleh menahan request lain
+    monkeypatch.setattr(face_db, "count_faces", lambda: time.sleep(0.3) or 7)
+    api = http_api.RecognitionAPI(workers=2)
+
+    async def scenario():
+        t0 = time.perf_counter()
+        health = asyncio.ensure_future(api.dispatch("GET", "/health", {}, b""))
+        await asyncio.sleep(0.01)
+        status, _ = await api.dispatch("GET", "/stats", {}, b"")
+        stats_seconds = time.perf_counter() - t0
+        return await health, status, stats_seconds
+
+    try:
+        (status, payload), stats_status, stats_seconds = _run(scenario())
+    finally:
+        api.close()
+    assert status == 200 and payload == {"status": "ok", "gallery_size": 7}
+    assert stats_status == 200
+    assert stats_seconds < 0.2
+
+
+def test_identities(temp_db):
+    face_db.add_faces([
+        {"identity": "A", "embedding": [1.0, 0.0, 0.0]},
+        {"identity": "A", "embedding": [0.9, 0.1, 0.0]},
+        {"identity": "B", "embedding": [0.0, 1.0, 0.0]},
+    ])
+    api = http_api.RecognitionAPI(workers=1)
+    try:
+        status, payload = _run(api.dispatch("GET", "/identities", {}, b""))
+    finally:
+        api.close()
+    assert status == 200
+    assert json.loads(json.dumps(payload)) == {"identities": {"A": 2, "B": 1}, "total_embeddings": 3}
+
+
+def _register(api, image_bytes: bytes, identity: str):
+    return _run(api.dispatch("POST", f"/register?identity={identity}", {}, image_bytes))
+
+
+def test_register_uses_enroll_quality_gate(temp_db, fake_models, tmp_path):
+    import recognition_engine as engine
+    from batching import MicroBatcher
+    from conftest import write_face_image
+
+    # Wajah 50 px: lolos ambang "image" (24) tetapi ditolak ambang registrasi (60)
+    small = write_face_image(tmp_path / "small.jpg", 1, size=100)
+    good = write_face_image(tmp_path / "good.jpg", 2)
+    assert engine.register_face(small, "CLI") == 0
+    assert engine.recognize(small)  # jalur pengenalan tetap menerima wajah ini
+
+    api = http_api.RecognitionAPI(workers=1)
+    api.batcher = MicroBatcher(api._embed_and_match, 8, 1.0, name="test-batcher")
+    try:
+        with open(small, "rb") as f:
+            status, payload = _register(api, f.read(), "Budi")
+        assert status == 200
+        assert payload == {"identity": "Budi", "registered": 0, "rejected": ["small"]}
+        with open(good, "rb") as f:
+            status, payload = _register(api, f.read(), "Budi")
+        assert status == 200 and payload["registered"] == 1
+    finally:
+        api.close()
+    assert face_db.get_count_by_identity() == {"Budi": 1}
+
+
+def _raw_request(api, request: bytes) -> bytes:
+    async def scenario():
+        server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return response
+
+    return _run(scenario())
+
+
+def test_invalid_content_length_is_rejected(temp_db):
+    api = http_api.RecognitionAPI(workers=1)
+    api.max_body = 1024
+    try:
+        for value, status in (("abc", 400), ("-5", 400), ("2048", 413)):
+            response = _raw_request(api, f"POST /recognize HTTP/1.1\r\nContent-Length: {value}\r\n\r\n".encode())
+            head, _, body = response.partition(b"\r\n\r\n")
+            assert head.startswith(f"HTTP/1.1 {status} ".encode()), (value, head)
+            assert "error" in json.loads(body)
+    finally:
+        api.close()
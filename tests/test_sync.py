@@ -0,0 +1,43 @@
+import os
+
+import face_db
+import recognition_engine as engine
+from conftest import write_face_image
+
+
+def _sync(root):
+    return engine.sync_tree(str(root), workers=0, augment=False)
+
+
+def test_sync_is_incremental(temp_db, fake_models, tmp_path):
+    root = tmp_path / "known_faces"
+    write_face_image(root / "A" / "1.jpg", 1)
+    write_face_image(root / "A" / "2.jpg", 2)
+    write_face_image(root / "B" / "1.jpg", 3)
+
+    stats = _sync(root)
+    assert (stats["new"], stats["records_added"]) == (3, 3)
+    assert fake_models["embedded"] == 3
+    assert face_db.get_count_by_identity() == {"A": 2, "B": 1}
+
+    # Tree tidak berubah: tidak ada yang dideteksi / di-embed ulang
+    stats = _sync(root)
+    assert stats["unchanged"] == 3
+    assert stats["new"] == stats["changed"] == stats["deleted"] == stats["records_added"] == 0
+    assert fake_models["embedded"] == 3
+
+    # Hapus, ubah isi, dan rename file
+    os.remove(root / "B" / "1.jpg")
+    changed = write_face_image(root / "A" / "2.jpg", 20)
+    st = os.stat(changed)
+    os.utime(changed, (st.st_atime, st.st_mtime + 10))
+    os.rename(root / "A" / "1.jpg", root / "A" / "1b.jpg")
+    stats = _sync(root)
+    assert (stats["deleted"], stats["changed"], stats["moved"]) == (1, 1, 1)
+    assert fake_models["embedded"] == 4  # hanya file yang isinya berubah
+    assert face_db.get_count_by_identity() == {"A": 2}
+    paths = sorted(os.path.basename(m["image_path"]) for m in face_db.get_metadata())
+    assert paths == ["1b.jpg", "2.jpg"]
+
+    stats = _sync(root)
+    assert stats["unchanged"] == 2 and fake_models["embedded"] == 4
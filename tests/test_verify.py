@@ -0,0 +1,19 @@
+import config
+import recognition_engine as engine
+from conftest import write_face_image
+
+
+def test_verify_reports_backend_used_by_cascade(temp_db, fake_models, tmp_path, monkeypatch):
+    # opencv ditolak (confidence 0.99 < 1.0), wajah ditemukan tingkat berikutnya
+    monkeypatch.setattr(config, "DETECTOR_BACKEND", "retinaface")
+    monkeypatch.setattr(config, "DETECTOR_CASCADE", {"image": ["opencv", "mtcnn"]})
+    monkeypatch.setattr(config, "DETECTOR_CASCADE_MIN_CONFIDENCE", {"opencv": 1.0, "default": 0.0})
+    a = write_face_image(tmp_path / "a.jpg", 1)
+    b = write_face_image(tmp_path / "b.jpg", 2)
+    first = engine.verify_two_faces(a, b)
+    assert first["detector_backend"] == "mtcnn"
+    # Hasil dari cache embedding tetap melaporkan backend yang sama
+    embedded = fake_models["embedded"]
+    assert engine.verify_two_faces(a, b)["detector_backend"] == "mtcnn"
+    assert fake_models["embedded"] == embedded
+    assert engine.verify_pairs([(a, b)])[0]["detectors"] == {"img1": "mtcnn", "img2": "mtcnn"}
@@ -0,0 +1,35 @@
+import numpy as np
+
+import video
+
+
+def _moving_face(frame_index: int, speed: float = 10.0) -> list:
+    return [{
+        "identity": "A",
+        "similarity": 0.9,
+        "facial_area": {"x": 100 + speed * frame_index, "y": 100, "w": 80, "h": 80},
+    }]
+
+
+def test_track_velocity_constant_motion_with_frame_skipping():
+    frame = np.zeros((480, 1280, 3), dtype=np.uint8)
+    pos = [0]
+    tracker = video.TrackingRecognizer(detect_every=5, recognize=lambda f: _moving_face(pos[0]))
+    for i in range(40):
+        pos[0] = i
+        results = tracker.process(frame)
+        if i >= 5:
+            # Setelah dua deteksi kecepatan = 10 px/frame, prediksi antar deteksi tidak bergeser
+            assert tracker.tracker.tracks[0].velocity == (10.0, 0.0)
+            assert abs(results[0]["facial_area"]["x"] - (100 + 10 * i)) <= 1
+    assert len(tracker.tracker.tracks) == 1
+    assert tracker.detections == 8
+
+
+def test_track_velocity_counts_missed_detection_frames():
+    track = video.Track(1, (0.0, 0.0, 10.0, 10.0), history=5)
+    for _ in range(4):
+        track.predict()
+    track.frames_since_detect += 1  # frame deteksi tanpa pasangan (FaceTracker.update)
+    track.observe((60.0, 0.0, 10.0, 10.0), "A", 0.9)
+    assert track.velocity == (10.0, 0.0)
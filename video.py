@@ -0,0 +1,531 @@
+"""
+Mode video dengan tracking wajah.
+Deteksi + pengenalan (engine.recognize) hanya dijalankan tiap N frame atau saat ada track yang hilang;
+di antara frame tersebut posisi wajah diteruskan oleh tracker ringan (asosiasi IoU + prediksi gerak,
+atau tracker OpenCV). Identitas per track di-cache dan dihaluskan dari beberapa hasil terakhir.
+VideoPipeline menjalankan capture, inferensi, dan output di thread terpisah dengan antrian terbatas.
+"""
+import json
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Callable, Dict, List, Optional, TextIO, Tuple, Union
+import numpy as np
+import cv2
+import config
+
+Box = Tuple[float, float, float, float]  # x, y, w, h
+
+
+def iou(a: Box, b: Box) -> float:
+    """Intersection over union dua box (x, y, w, h)."""
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0.0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0.0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _center_score(a: Box, b: Box) -> float:
+    """1 - jarak pusat dua box dibagi sisi terpanjang box (1 = pusat sama, <= 0 = jauh)."""
+    dx = (a[0] + a[2] / 2) - (b[0] + b[2] / 2)
+    dy = (a[1] + a[3] / 2) - (b[1] + b[3] / 2)
+    size = max(a[2], a[3], b[2], b[3], 1.0)
+    return 1.0 - float(np.hypot(dx, dy)) / size
+
+
+def area_to_box(area: dict) -> Box:
+    """facial_area ({"x", "y", "w", "h"}) hasil deteksi -> Box (x, y, w, h) float."""
+    return (float(area.get("x", 0)), float(area.get("y", 0)), float(area.get("w", 0)), float(area.get("h", 0)))
+
+
+def _create_cv_tracker(kind: str):
+    """Tracker OpenCV ("mil", "kcf", "csrt") jika tersedia di build OpenCV ini, selain itu None."""
+    name = f"Tracker{kind.upper()}_create"
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, name, None) if module is not None else None
+        if factory is not None:
+            return factory()
+    return None
+
+
+class Track:
+    """Satu wajah yang diikuti antar frame."""
+
+    def __init__(self, track_id: int, box: Box, history: int):
+        self.id = track_id
+        self.box = box
+        self.velocity = (0.0, 0.0)
+        # Pusat box pada deteksi terakhir (bukan box hasil prediksi) untuk estimasi kecepatan
+        self.detected_center = (box[0] + box[2] / 2, box[1] + box[3] / 2)
+        self.missed = 0  # jumlah deteksi berturut-turut tanpa pasangan
+        self.frames_since_detect = 0  # frame yang sudah lewat sejak deteksi terakhir (tidak termasuk frame itu)
+        self.history: deque = deque(maxlen=history)
+        self.cv_tracker = None
+
+    def observe(self, box: Box, identity: Optional[str], similarity: float) -> None:
+        """Perbarui dengan hasil deteksi + pengenalan."""
+        # Kecepatan = perpindahan dari deteksi terakhir / jumlah frame sejak deteksi itu (termasuk frame ini)
+        frames = self.frames_since_detect + 1
+        cx, cy = self.detected_center
+        nx, ny = box[0] + box[2] / 2, box[1] + box[3] / 2
+        self.velocity = ((nx - cx) / frames, (ny - cy) / frames)
+        self.detected_center = (nx, ny)
+        self.box = box
+        self.missed = 0
+        self.frames_since_detect = 0
+        self.history.append((identity, similarity))
+
+    def predict(self) -> None:
+        """Geser box sesuai kecepatan terakhir (frame tanpa deteksi)."""
+        x, y, w, h = self.box
+        self.box = (x + self.velocity[0], y + self.velocity[1], w, h)
+        self.frames_since_detect += 1
+
+    def identity(self) -> Tuple[Optional[str], float]:
+        """
+        Identitas hasil penghalusan: voting berbobot similarity atas riwayat pengenalan.
+        Hasil "Unknown" ikut memilih dengan bobot MIN_SIMILARITY_THRESHOLD.
+        Returns: (identity atau None, rata-rata similarity untuk pilihan tsb).
+        """
+        if not self.history:
+            return None, 0.0
+        unknown_weight = config.MIN_SIMILARITY_THRESHOLD
+        scores: Dict[Optional[str], float] = {}
+        sims: Dict[Optional[str], List[float]] = {}
+        for identity, sim in self.history:
+            scores[identity] = scores.get(identity, 0.0) + (sim if identity else unknown_weight)
+            sims.setdefault(identity, []).append(sim)
+        best = max(scores, key=scores.get)
+        return best, float(np.mean(sims[best]))
+
+
+class FaceTracker:
+    """
+    Tracker multi-wajah: asosiasi greedy berbasis IoU (lalu jarak pusat) pada frame deteksi,
+    prediksi gerak (atau tracker OpenCV) pada frame lain.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: Optional[float] = None,
+        max_missed: Optional[int] = None,
+        history: Optional[int] = None,
+        tracker_type: Optional[str] = None,
+        max_center_dist: Optional[float] = None,
+    ):
+        self.iou_threshold = iou_threshold if iou_threshold is not None else getattr(config, "TRACK_IOU_THRESHOLD", 0.3)
+        self.max_center_dist = (
+            max_center_dist if max_center_dist is not None else getattr(config, "TRACK_MAX_CENTER_DIST", 1.0)
+        )
+        self.max_missed = max_missed if max_missed is not None else getattr(config, "TRACK_MAX_MISSED", 2)
+        self.history = history or getattr(config, "TRACK_HISTORY", 10)
+        self.tracker_type = (tracker_type or getattr(config, "VIDEO_TRACKER", "iou")).lower()
+        self.tracks: List[Track] = []
+        self._next_id = 1
+        # True jika ada track yang hilang sejak deteksi terakhir (memicu deteksi di frame berikutnya)
+        self.lost = False
+
+    def update(self, frame: np.ndarray, recognitions: List[dict]) -> None:
+        """Frame deteksi: pasangkan hasil engine.recognize ke track yang ada, buat track baru jika perlu."""
+        boxes = [area_to_box(r.get("facial_area") or {}) for r in recognitions]
+        used_t, used_d = set(), set()
+        # Tahap 1: IoU; tahap 2 (wajah bergerak cepat antar deteksi): jarak pusat relatif ukuran box
+        for score_fn, min_score in (
+            (iou, self.iou_threshold),
+            (_center_score, 1.0 - self.max_center_dist),
+        ):
+            pairs = sorted(
+                (
+                    (score_fn(t.box, b), ti, di)
+                    for ti, t in enumerate(self.tracks) if ti not in used_t
+                    for di, b in enumerate(boxes) if di not in used_d
+                ),
+                reverse=True,
+            )
+            for score, ti, di in pairs:
+                if score < min_score:
+                    break
+                if ti in used_t or di in used_d:
+                    continue
+                used_t.add(ti)
+                used_d.add(di)
+                r = recognitions[di]
+                self.tracks[ti].observe(boxes[di], r.get("identity"), float(r.get("similarity", 0.0)))
+        for ti, t in enumerate(self.tracks):
+            if ti not in used_t:
+                t.missed += 1
+                t.frames_since_detect += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        for di, r in enumerate(recognitions):
+            if di in used_d:
+                continue
+            t = Track(self._next_id, boxes[di], self.history)
+            self._next_id += 1
+            t.history.append((r.get("identity"), float(r.get("similarity", 0.0))))
+            self.tracks.append(t)
+        if self.tracker_type != "iou":
+            for t in self.tracks:
+                if t.missed == 0:
+                    t.cv_tracker = _create_cv_tracker(self.tracker_type)
+                    if t.cv_tracker is not None:
+                        t.cv_tracker.init(frame, tuple(int(v) for v in t.box))
+        # Track yang tidak terdeteksi dikonfirmasi lagi di frame berikutnya, bukan menunggu N frame
+        self.lost = any(t.missed for t in self.tracks)
+
+    def predict(self, frame: np.ndarray) -> None:
+        """Frame tanpa deteksi: teruskan posisi track; tandai lost jika track keluar frame / tracker gagal."""
+        h, w = frame.shape[:2]
+        for t in self.tracks:
+            if t.missed:
+                t.frames_since_detect += 1
+                continue
+            if t.cv_tracker is not None:
+                ok, box = t.cv_tracker.update(frame)
+                t.frames_since_detect += 1
+                if ok:
+                    t.box = tuple(float(v) for v in box)
+                else:
+                    self.lost = True
+            else:
+                t.predict()
+            x, y, bw, bh = t.box
+            if x + bw <= 0 or y + bh <= 0 or x >= w or y >= h:
+                self.lost = True
+
+    def results(self) -> List[dict]:
+        """Track aktif dalam format hasil recognize (+ "track_id")."""
+        out = []
+        for t in self.tracks:
+            if t.missed:
+                continue
+            identity, sim = t.identity()
+            x, y, w, h = t.box
+            out.append({
+                "identity": identity,
+                "similarity": sim,
+                "facial_area": {"x": int(round(x)), "y": int(round(y)), "w": int(round(w)), "h": int(round(h))},
+                "track_id": t.id,
+            })
+        return out
+
+
+class TrackingRecognizer:
+    """
+    Pengenalan wajah untuk aliran frame: engine.recognize tiap `detect_every` frame
+    (atau lebih cepat jika ada track hilang), tracker di antaranya.
+    """
+
+    def __init__(
+        self,
+        detect_every: Optional[int] = None,
+        recognize: Optional[Callable[[np.ndarray], List[dict]]] = None,
+        tracker: Optional[FaceTracker] = None,
+    ):
+        self.detect_every = max(1, detect_every or getattr(config, "VIDEO_DETECT_EVERY", 5))
+        if recognize is None:
+            import identity_cache
+            import recognition_engine as engine
+            recognize = partial(engine.recognize, mode="video", identity_cache=identity_cache.create())
+        self._recognize = recognize
+        self.tracker = tracker or FaceTracker()
+        self.frames = 0
+        self.detections = 0
+        self._since_detect: Optional[int] = None
+
+    def process(self, frame: np.ndarray) -> List[dict]:
+        """Proses satu frame BGR. Returns: wajah ter-track (identity, similarity, facial_area, track_id)."""
+        if self._since_detect is None or self._since_detect >= self.detect_every or self.tracker.lost:
+            self.tracker.update(frame, self._recognize(frame))
+            self.detections += 1
+            self._since_detect = 0
+        else:
+            self.tracker.predict(frame)
+        self._since_detect += 1
+        self.frames += 1
+        return self.tracker.results()
+
+
+def parse_source(source) -> Union[int, str]:
+    """Sumber video: index webcam ("0" -> 0), path file, atau URL (rtsp://, http://)."""
+    if isinstance(source, int):
+        return source
+    s = str(source).strip()
+    return int(s) if s.isdigit() else s
+
+
+def is_live(source: Union[int, str]) -> bool:
+    """True untuk kamera (indeks) atau stream URL; False untuk file video."""
+    return isinstance(source, int) or "://" in source
+
+
+class FrameQueue:
+    """
+    Antrian terbatas dengan kebijakan drop-oldest: put() tidak pernah memblok; jika penuh,
+    item tertua dibuang (dihitung di `dropped`) sehingga latensi tetap terbatas.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, maxsize)
+        self.dropped = 0
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item) -> None:
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """Ambil item; None jika antrian ditutup dan kosong (atau timeout)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+
+    def close(self) -> None:
+        """Tandai tidak ada item baru; get() mengembalikan None setelah antrian habis."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Waktu per tahap pipeline (ms): count, mean, p50, p95, max dari sampel terakhir."""
+
+    def __init__(self, max_samples: int = 10000):
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self._max_samples)).append(seconds * 1000.0)
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for stage, samples in self._samples.items():
+                arr = np.asarray(samples)
+                out[stage] = {
+                    "count": int(len(arr)),
+                    "mean_ms": float(arr.mean()),
+                    "p50_ms": float(np.percentile(arr, 50)),
+                    "p95_ms": float(np.percentile(arr, 95)),
+                    "max_ms": float(arr.max()),
+                }
+            return out
+
+
+def face_events(recognitions: List[dict]) -> List[dict]:
+    """Ringkas hasil pengenalan untuk event JSON (identity, similarity, box, track_id)."""
+    out = []
+    for r in recognitions:
+        area = r.get("facial_area") or {}
+        event = {
+            "identity": r.get("identity"),
+            "similarity": round(float(r.get("similarity", 0.0)), 4),
+            "box": [int(area.get(k, 0)) for k in ("x", "y", "w", "h")],
+        }
+        if r.get("track_id") is not None:
+            event["track_id"] = r["track_id"]
+        out.append(event)
+    return out
+
+
+class VideoPipeline:
+    """
+    Pipeline video bertahap dengan antrian terbatas (drop-oldest) di antara tahap:
+    thread capture -> pool worker inferensi -> tahap output (tampilan, file video, event JSON lines).
+    Capture tidak pernah menunggu inferensi, sehingga kamera tidak menumpuk frame basi.
+    Tahap output berjalan di thread pemanggil run() (diperlukan untuk cv2.imshow).
+    """
+
+    def __init__(
+        self,
+        source,
+        workers: int = 1,
+        queue_size: int = 2,
+        display: bool = False,
+        output_path: Optional[str] = None,
+        events: Optional[TextIO] = None,
+        track: bool = False,
+        detect_every: Optional[int] = None,
+        pace: Optional[bool] = None,
+        max_frames: Optional[int] = None,
+    ):
+        """
+        - source: index webcam, path file video, atau URL stream (RTSP/HTTP)
+        - workers: jumlah thread inferensi (mode track selalu 1 karena tracker berurutan)
+        - queue_size: kapasitas antrian frame (kecil = latensi rendah, lebih banyak frame dibuang)
+        - events: file teks tujuan event JSON lines per frame yang berisi wajah (mis. sys.stdout)
+        - pace: baca file video sesuai FPS aslinya seperti kamera (default: ya untuk file)
+        - max_frames: berhenti setelah sejumlah frame ditangkap (None = sampai sumber habis)
+        """
+        self.source = parse_source(source)
+        self.track = track
+        self.workers = 1 if track else max(1, workers)
+        self.display = display
+        self.output_path = output_path
+        self.events = events
+        self.pace = (not is_live(self.source)) if pace is None else pace
+        self.max_frames = max_frames
+        self.detect_every = detect_every
+        self.stats = StageStats()
+        self.frames_in = FrameQueue(queue_size)
+        self.results = FrameQueue(max(queue_size, self.workers * 2))
+        self.counters = {"captured": 0, "processed": 0, "emitted": 0, "late": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def _capture(self, cap) -> None:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        interval = 1.0 / fps if self.pace and fps > 0 else 0.0
+        seq = 0
+        next_t = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.stats.add("capture", time.perf_counter() - t0)
+                self.frames_in.put((seq, time.perf_counter(), frame))
+                seq += 1
+                self._count("captured")
+                if self.max_frames and seq >= self.max_frames:
+                    break
+                if interval:
+                    next_t += interval
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            self.frames_in.close()
+
+    def _infer(self, recognize: Callable[[np.ndarray], List[dict]]) -> None:
+        while not self._stop.is_set():
+            item = self.frames_in.get()
+            if item is None:
+                break
+            seq, t_capture, frame = item
+            t0 = time.perf_counter()
+            self.stats.add("queue_wait", t0 - t_capture)
+            try:
+                recognitions = recognize(frame)
+            except Exception:
+                self._count("errors")
+                recognitions = []
+            self.stats.add("inference", time.perf_counter() - t0)
+            self._count("processed")
+            self.results.put((seq, t_capture, frame, recognitions))
+
+    def run(self) -> dict:
+        """
+        Jalankan pipeline sampai sumber habis, max_frames tercapai, 'q' ditekan, atau stop() dipanggil.
+        Returns: {"counters", "dropped", "stages", "detectors", "quality", "identity_cache", "seconds", "fps"}.
+        """
+        import identity_cache
+        import quality
+        import recognition_engine as engine
+
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise ValueError(f"Tidak dapat membuka sumber video: {self.source}")
+        if isinstance(self.source, int):
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
+        if self.track:
+            recognize = TrackingRecognizer(self.detect_every).process
+        else:
+            recognize = partial(engine.recognize, mode="video", identity_cache=identity_cache.create())
+
+        t_start = time.perf_counter()
+        capture = threading.Thread(target=self._capture, args=(cap,), name="capture", daemon=True)
+        workers = [
+            threading.Thread(target=self._infer, args=(recognize,), name=f"infer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        capture.start()
+        for w in workers:
+            w.start()
+
+        def close_results():
+            for w in workers:
+                w.join()
+            self.results.close()
+
+        threading.Thread(target=close_results, name="infer-join", daemon=True).start()
+        writer = None
+        last_seq = -1
+        try:
+            while True:
+                item = self.results.get()
+                if item is None:
+                    break
+                seq, t_capture, frame, recognitions = item
+                if seq < last_seq:
+                    # Hasil worker lain yang lebih baru sudah ditampilkan
+                    self._count("late")
+                    continue
+                last_seq = seq
+                t0 = time.perf_counter()
+                if self.display or self.output_path:
+                    annotated = engine.draw_results(frame, recognitions)
+                    if self.output_path:
+                        if writer is None:
+                            fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+                            h, w = annotated.shape[:2]
+                            writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+                        writer.write(annotated)
+                    if self.display:
+                        cv2.imshow("Face Recognition", annotated)
+                        if cv2.waitKey(1) & 0xFF == ord("q"):
+                            self.stop()
+                if self.events is not None and recognitions:
+                    self.events.write(json.dumps({
+                        "ts": time.time(),
+                        "source": str(self.source),
+                        "frame": seq,
+                        "faces": face_events(recognitions),
+                    }) + "\n")
+                    self.events.flush()
+                now = time.perf_counter()
+                self.stats.add("output", now - t0)
+                self.stats.add("end_to_end", now - t_capture)
+                self._count("emitted")
+        finally:
+            self.stop()
+            capture.join()
+            cap.release()
+            if writer is not None:
+                writer.release()
+            if self.display:
+                cv2.destroyAllWindows()
+        seconds = time.perf_counter() - t_start
+        return {
+            "counters": dict(self.counters),
+            "dropped": {"frames": self.frames_in.dropped, "results": self.results.dropped},
+            "stages": self.stats.summary(),
+            "detectors": engine.detector_stats(),
+            "quality": quality.stats(),
+            "identity_cache": identity_cache.stats(),
+            "seconds": seconds,
+            "fps": self.counters["emitted"] / max(seconds, 1e-9),
+        }
+
+    def stop(self) -> None:
+        """Hentikan capture dan worker (frame yang sedang diproses diselesaikan)."""
+        self._stop.set()
+        self.frames_in.close()